@@ -1,17 +1,40 @@
+import datetime
 import json
 import os
-import shutil
 import subprocess
 import typing
 
 import progressbar
 from absl import app, flags
 
-from plotter.model.src.repo_history import RepoHistory, parse_repo_history
-from plotter.plot import Plotter
-
-from .model.src.commit import Commit
-from .utilities import get_cloc_data
+from plotter.model.src.repo_history import (RepoHistory, parse_repo_history,
+                                            parse_sqlite_repo_history,
+                                            parse_streamed_repo_history)
+from plotter.plot import FIELD_LABELS, Plotter, get_safe_file_name
+
+from .async_collector import iterate_commits_data_async
+from .branches import list_branches, split_branches
+from .cache import BlobCache
+from .collector import (collect_commits_data,
+                        collect_commits_data_incrementally,
+                        iterate_commits_data,
+                        iterate_commits_data_incrementally)
+from .directories import DirectoryCounter
+from .downsample import METHODS
+from .git_reader import close_git_readers
+from .live import collect_commits_data_live
+from .model.src.commit import GIT_DATE_OPTION, Commit, get_git_log_env
+from .model.src.resample import AGGREGATIONS, is_valid_bucket
+from .model.src.sqlite_history import SqliteHistoryWriter
+from .mirror import resolve_branch, update_mirror
+from .numstat import get_numstat_commits
+from .profiler import PROFILER
+from .render import render_plots
+from .sampling import collect_commits_data_sampled
+from .shards import (is_valid_commit_range, is_valid_shard, parse_commit_range,
+                     parse_shard, select_shard, write_shard)
+from .store import CommitStore, JsonLinesWriter
+from .utilities import COUNTERS, get_cloc_data, get_counter
 
 FLAGS = flags.FLAGS
 
@@ -21,16 +44,134 @@ flags.DEFINE_string(
     'input_file', None, "Specifies a custom json file to feed the script. It must has been generated during an old execution")
 flags.DEFINE_string(
     'branch', None, 'Select a custom branch of the repository')
+flags.DEFINE_list('branches', None,
+                  'Analyses the comma-separated branches together, counting once the commits they share, and plots them on the same chart')
+flags.DEFINE_bool('all_branches', False,
+                  'Like `--branches`, with all the local and remote branches of the repository')
 flags.DEFINE_bool('no_preprocessing', False,
                   'Doesn\'t preprocess data. The script will plot all the commits')
+flags.DEFINE_string('bucket', 'day',
+                    'Specifies how the commits are grouped by the preprocessing: `hour`, `day`, `week`, `month` or a number of consecutive commits')
+flags.DEFINE_enum('aggregation', 'last', AGGREGATIONS,
+                  'Specifies how the commits of a bucket are combined by the preprocessing: `last`, `max`, `mean` or `min`')
+flags.DEFINE_bool('render', False,
+                  'Renders the plots to image files instead of showing them, without asking anything')
+flags.DEFINE_list('render_languages', None,
+                  'Specifies the comma-separated languages rendered with `--render`, `All` is the sum of all them. Defaults to every language and `All`')
+flags.DEFINE_list('render_fields', ['code'],
+                  'Specifies the comma-separated fields rendered with `--render`: `code`, `nFiles`, `blank` or `comment`')
+flags.DEFINE_string('render_dir', 'plots',
+                    'Specifies the folder where `--render` writes the images')
+flags.DEFINE_enum('render_format', 'png', ['png', 'svg'],
+                  'Specifies the format of the images written by `--render`')
+flags.DEFINE_integer('plot_points', 1000,
+                     'Specifies about how many points of each series are drawn, the others are dropped keeping the shape of the series. 0 draws all of them', lower_bound=0)
+flags.DEFINE_enum('downsampling', 'lttb', METHODS,
+                  'Specifies how the points drawn are picked when a series is longer than `--plot_points`: `lttb` (largest triangle three buckets) or `minmax` (the minimum and the maximum of each column)')
+flags.DEFINE_bool('profile', False,
+                  'Measures the time spent in each stage and on each commit, printing a summary before plotting')
+flags.DEFINE_string('profile_trace', None,
+                    'Specifies the file where `--profile` writes the trace of every measured stage, in the Trace Event Format. No trace is written if it\'s not defined')
+flags.DEFINE_integer('profile_slowest', 10,
+                     'Specifies how many of the slowest commits are listed by `--profile`', lower_bound=0)
+flags.register_validator('render_fields', lambda fields: all(field in FIELD_LABELS for field in fields),
+                         message='--render_fields can only contain `code`, `nFiles`, `blank` and `comment`')
+flags.register_validator('bucket', is_valid_bucket,
+                         message='--bucket must be `hour`, `day`, `week`, `month` or a positive number of commits')
 flags.DEFINE_bool('offline', False,
                   'Specify if it should use the current repository in the folder defined with `--dir` of it has to clone a new repository')
 flags.DEFINE_bool('write_output', False,
                   'Specifies wether the script has to write the intermediate results to output')
 flags.DEFINE_string('output_folder', None,
                     'Specifies the folder where the script has to write the output files')
+flags.DEFINE_enum('output_format', 'json', ['json', 'jsonl', 'binary', 'sqlite'],
+                  'Specifies the format of the output files: `json`, `jsonl` (one commit per line, written as soon as each commit is analysed), `binary` (compact and memory-mapped when read back with `--input_file`) or `sqlite` (every history in `histories.sqlite`, indexed by date and language)')
+flags.DEFINE_string('repo_name', None,
+                    'Specifies the repository read from a sqlite `--input_file`, needed only if it contains more than one')
+flags.DEFINE_string('since', None,
+                    'Reads only the commits done since this ISO date from a sqlite `--input_file`')
+flags.DEFINE_string('until', None,
+                    'Reads only the commits done until this ISO date (the whole day, if it has no time) from a sqlite `--input_file`')
+flags.DEFINE_list('input_languages', None,
+                  'Reads only the comma-separated languages from a sqlite `--input_file`')
+flags.register_validator('since', lambda value: value is None or is_iso_date(value),
+                         message='--since must be an ISO date, e.g. `2020-07-01`')
+flags.register_validator('until', lambda value: value is None or is_iso_date(value),
+                         message='--until must be an ISO date, e.g. `2020-09-30`')
 flags.DEFINE_string(
-    'dir', '.repo', 'Specifies the temporary directory to use to store the repository defined with the flag --repository')
+    'dir', '.repo', 'Specifies the directory of the repository analysed with `--offline`')
+flags.DEFINE_string('mirror_dir', os.path.join('~', '.cache', 'repo_plotter', 'mirrors'),
+                    'Specifies the directory that keeps a bare mirror of each repository defined with the flag --repository, updated at every run')
+flags.DEFINE_string('shard', None,
+                    'Analyses only the shard `k/N` of the commits (every N-th commit starting from the k-th) and writes it to `--output_folder`, to be merged with `python -m plotter.merge`')
+flags.DEFINE_string('commit_range', None,
+                    'Analyses only the commits in the range `start..end` (both optional, the start is excluded) and writes them to `--output_folder`, to be merged with `python -m plotter.merge`')
+flags.register_validator('shard', is_valid_shard,
+                         message='--shard must be `k/N`, with `k` between 1 and `N`')
+flags.register_validator('commit_range', is_valid_commit_range,
+                         message='--commit_range must be `start..end`, where both are optional')
+flags.DEFINE_integer('jobs', 1,
+                     'Specifies how many commits have to be analysed (or plots rendered with `--render`) in parallel', lower_bound=1)
+flags.DEFINE_bool('asyncio', False,
+                  'Analyses the commits with an asyncio pipeline that starts counting them while `git log` is still running, with at most `--jobs` counters at the same time. Ignored with `--incremental`, `--sampling` and `--live`')
+flags.DEFINE_bool('incremental', False,
+                  'Counts only the files changed between consecutive commits instead of the whole tree at each commit')
+flags.DEFINE_bool('fast', False,
+                  'Builds the history from a single `git log --numstat` pass instead of counting every commit. The lines are always counted like `--counter native` does and only the lines of code change after the root commit, see the README for the differences')
+flags.DEFINE_bool('sampling', False,
+                  'Counts only the commits needed to draw the history, bisecting the intervals where the lines of code change more than `--sampling_tolerance`. The other commits are interpolated')
+flags.DEFINE_bool('live', False,
+                  'Opens the chart of the lines of code immediately and refines it while the commits are counted from coarse to fine (the oldest and newest commits, then the middle one, then the quarter ones and so on). Press `q` or close the window to stop counting, the commits not counted are interpolated')
+flags.DEFINE_integer('sampling_points', 50,
+                     'Specifies how many evenly spaced commits are counted before bisecting, used with `--sampling`', lower_bound=2)
+flags.DEFINE_float('sampling_tolerance', 0.01,
+                   'Specifies the maximum difference of lines of code between two counted commits, as a fraction of the total, used with `--sampling`', lower_bound=0)
+flags.DEFINE_enum('counter', 'cloc', list(COUNTERS.keys()),
+                  'Specifies the backend that counts the lines: `cloc` runs the `cloc` utility, `native` counts them without leaving python')
+flags.DEFINE_list('directories', None,
+                  'Counts also the comma-separated directories matching these patterns (e.g. `services/*`, where `*` matches a single directory) at each commit, and plots each directory instead of each language')
+flags.DEFINE_bool('no_cache', False,
+                  'Doesn\'t use the cache of the files already counted. Every file of every commit will be counted by `cloc`')
+flags.DEFINE_string('cache_file', os.path.join('~', '.cache', 'repo_plotter', 'blobs.sqlite'),
+                    'Specifies the file that stores the data of the files already counted, shared by all the runs')
+flags.DEFINE_integer('cache_size', 1000000,
+                     'Specifies the maximum number of files kept in the cache, the least recently used are removed first', lower_bound=1)
+flags.DEFINE_bool('update', False,
+                  'Used with `--offline`, pulls the new commits of the repository in `--dir` before analysing it')
+flags.DEFINE_bool('no_resume', False,
+                  'Doesn\'t reuse the commits already analysed in a previous run on `--dir`. Every commit will be analysed again')
+flags.DEFINE_string('commit_store', None,
+                    'Specifies the file that remembers the data of the analysed commits. Defaults to a file inside the `.git` folder of `--dir`')
+
+
+def is_iso_date(value: str) -> bool:
+    """
+        Checks if `value` is a date or a date and time in ISO format
+    """
+    try:
+        datetime.datetime.fromisoformat(value)
+        return True
+    except ValueError:
+        return False
+
+
+def parse_iso_date(value: str, end_of_day=False) -> datetime.datetime:
+    """
+        Parses the ISO date `value`, which can be `None`
+
+        If `value` is a date without time and `end_of_day` is `True`, the last second of that day
+        is returned instead of its start, so that a range ending on that date includes all of it
+    """
+    if value is None:
+        return None
+    try:
+        date = datetime.date.fromisoformat(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value)
+    start = datetime.datetime(date.year, date.month, date.day)
+    if not end_of_day:
+        return start
+    return start + datetime.timedelta(days=1, seconds=-1)
 
 
 def command_exists(command_name: str) -> bool:
@@ -41,32 +182,222 @@ def command_exists(command_name: str) -> bool:
     return which(command_name) is not None
 
 
-def get_commits(folder: str) -> typing.List[str]:
+def get_default_store_path(counter) -> str:
     """
-        Gets all the commits done on the repository's branch `FLAGS.branch` contained in `folder`
+        Returns the path of the commit store of the repository in the current directory
 
-        At each commit it runs the `cloc` utility to retrieve all data
+        The store is kept inside the `.git` folder and it depends on the version of `counter`,
+        since different counters may count the same commit differently
     """
-    os.chdir(folder)
-    command = r'git.--no-pager.log.--pretty=format:"%H %ad".--date=format:"%F %H:%m:%S"'
-    p = subprocess.Popen(command.split("."),
+    p = subprocess.Popen(['git', 'rev-parse', '--absolute-git-dir'],
                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, _ = p.communicate()
+    version = ''.join(
+        c if c.isalnum() or c in '.-' else '_' for c in counter.get_version())
+    return os.path.join(output.decode('utf-8').strip(), 'repo_plotter', f'commits-{version}.jsonl')
+
+
+def open_cache(counter):
+    """
+        Opens the cache of the files counted by `counter` in `FLAGS.cache_file`, or returns `None`
+        if `FLAGS.no_cache` is set
+    """
+    if FLAGS.no_cache:
+        return None
+    return BlobCache(os.path.abspath(os.path.expanduser(FLAGS.cache_file)),
+                     counter.get_version(), max_entries=FLAGS.cache_size)
+
+
+def get_git_log_command(branch: typing.Union[str, typing.List[str]] = None) -> typing.List[str]:
+    """
+        Returns the `git log` command that prints a line for each commit of `branch` (the current one by default),
+        that can be passed to `Commit`. It must run with the environment of `get_git_log_env`
+
+        `branch` can also be a list of branches: the commits reachable from more than one of them are printed once
+    """
+    command = ['git', '--no-pager', 'log', '--pretty=format:"%H %ad"', GIT_DATE_OPTION]
+    if isinstance(branch, list):
+        command += branch + ['--']
+    elif branch is not None:
+        command += [branch, '--']
+    return command
 
-    lines = p.stdout.readlines()
-    commits = []
-    for index in progressbar.progressbar(range(len(lines))):
-        line = lines[index]
-        commit = Commit(line.decode('utf-8').strip())
-        commit.checkout_and_get_data()
-        commits.append(commit)
 
-    os.chdir("..")
-    return commits
+def read_git_log(branch: typing.Union[str, typing.List[str]] = None) -> typing.List[str]:
+    """
+        Returns the lines printed by `git log` for `branch` (the current one by default, or a list of branches)
+        of the repository in the current directory, see `get_git_log_command`
+    """
+    with PROFILER.stage('git_log'):
+        p = subprocess.Popen(get_git_log_command(branch), env=get_git_log_env(),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return [line.decode('utf-8').strip() for line in p.stdout.readlines()]
 
 
-def generate_repo_history(temporary_dir: str) -> RepoHistory:
+def iterate_commits(folder: str, revision: str = None) -> typing.Iterator[typing.Tuple[int, Commit]]:
     """
-        Generates a `RepoHistory` object if `FLAGS.input_file` is not specified
+        Gets all the commits reachable from `revision` (the current branch by default) of the repository
+        contained in `folder`, yielding `(index, commit)` pairs as soon as the data of each commit is ready, where `index`
+        is the position of the commit in `git log`
+
+        At each commit it runs the `FLAGS.counter` backend to retrieve all data, using `FLAGS.jobs` workers.
+        If `FLAGS.incremental` is set, only the files changed by each commit are counted again.
+        If `FLAGS.sampling` is set, only the commits needed to draw the history are counted.
+        If `FLAGS.live` is set, the commits are counted from coarse to fine while their chart is drawn,
+        until the user stops it (see `collect_commits_data_live`).
+        Otherwise, if `FLAGS.asyncio` is set, the commits are counted by the pipeline of
+        `iterate_commits_data_async` while `git log` is still running.
+        Unless `FLAGS.no_cache` is set, the files already counted are taken from `FLAGS.cache_file`.
+        Unless `FLAGS.no_resume` is set, the commits analysed by a previous run are taken from the
+        commit store and only the new ones are analysed.
+
+        If `FLAGS.directories` is set, the directories matching it are also counted at each commit
+        (see `DirectoryCounter`).
+
+        Only the commits being analysed are kept in memory, except with `FLAGS.sampling` and `FLAGS.live`
+        that need all of them
+    """
+    counter = get_counter(FLAGS.counter)
+    cache = open_cache(counter)
+    directory_counter = None
+    if FLAGS.directories is not None:
+        directory_counter = DirectoryCounter(
+            FLAGS.directories, cache=cache, counter=counter)
+    try:
+        for index, commit in iterate_counted_commits(folder, revision, counter, cache):
+            if directory_counter is not None and commit.directoryData is None:
+                # `iterate_counted_commits` stays inside `folder` until it ends
+                commit.__set_directory_data__(
+                    directory_counter.count(commit.commitHash))
+            yield (index, commit)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def iterate_counted_commits(folder: str, revision: str, counter, cache=None) -> typing.Iterator[typing.Tuple[int, Commit]]:
+    """
+        Implements `iterate_commits`, counting the files with `counter` through `cache`
+    """
+    store_path = None
+    if FLAGS.commit_store is not None:
+        store_path = os.path.abspath(FLAGS.commit_store)
+
+    working_dir = os.getcwd()
+    os.chdir(folder)
+    store = None
+    if not FLAGS.no_resume:
+        if store_path is None:
+            store_path = get_default_store_path(counter)
+        with PROFILER.stage('store_load'):
+            store = CommitStore(store_path)
+
+    try:
+        if FLAGS.asyncio and not FLAGS.incremental and not FLAGS.sampling and not FLAGS.live and FLAGS.shard is None:
+            for index, commit in iterate_commits_data_async(get_git_log_command(revision), jobs=FLAGS.jobs,
+                                                            cache=cache, counter=counter, store=store):
+                if store is not None and commit.commitHash not in store:
+                    store.add(commit)
+                yield (index, commit)
+            return
+
+        lines = read_git_log(revision)
+        indexes = {line.split(" ")[0].replace('"', ''): index for index, line in enumerate(lines)}
+        if FLAGS.shard is not None:
+            index, count = parse_shard(FLAGS.shard)
+            lines = select_shard(lines, index, count)
+        if FLAGS.sampling:
+            commits = [Commit(line) for line in lines]
+            if store is not None:
+                commits = [store.get(commit.commitHash, date=commit.date) or commit for commit in commits]
+
+            def measure(commits_to_measure: typing.List[Commit]):
+                on_commit_done = None if store is None else store.add
+                if FLAGS.incremental:
+                    collect_commits_data_incrementally(
+                        commits_to_measure, cache=cache, counter=counter, on_commit_done=on_commit_done)
+                else:
+                    collect_commits_data(commits_to_measure, jobs=FLAGS.jobs, cache=cache,
+                                         counter=counter, on_commit_done=on_commit_done)
+
+            collect_commits_data_sampled(commits, measure, initial_points=FLAGS.sampling_points,
+                                         tolerance=FLAGS.sampling_tolerance)
+            yield from enumerate(commits)
+            return
+        if FLAGS.live:
+            commits = [Commit(line) for line in lines]
+            if store is not None:
+                commits = [store.get(commit.commitHash, date=commit.date) or commit for commit in commits]
+            with_data = collect_commits_data_live(commits, jobs=FLAGS.jobs, cache=cache, counter=counter,
+                                                  on_commit_done=None if store is None else store.add)
+            for index in with_data:
+                yield (index, commits[index])
+            return
+
+        to_analyse = lines
+        if store is not None:
+            to_analyse = [line for line in lines if Commit(
+                line).commitHash not in store]
+            print(
+                f"{len(lines) - len(to_analyse)} commits were already analysed, {len(to_analyse)} left")
+            for line in lines:
+                listed = Commit(line)
+                if listed.commitHash in store:
+                    yield (indexes[listed.commitHash], store.get(listed.commitHash, date=listed.date))
+
+        if FLAGS.incremental:
+            analysed = iterate_commits_data_incrementally((Commit(line) for line in reversed(to_analyse)),
+                                                          len(to_analyse), cache=cache, counter=counter)
+        else:
+            analysed = iterate_commits_data((Commit(line) for line in to_analyse), len(to_analyse),
+                                            jobs=FLAGS.jobs, cache=cache, counter=counter)
+        for commit in analysed:
+            if store is not None:
+                store.add(commit)
+            yield (indexes[commit.commitHash], commit)
+    finally:
+        close_git_readers()
+        if store is not None:
+            store.close()
+        os.chdir(working_dir)
+
+
+def get_commits(folder: str, revision: str = None) -> typing.List[Commit]:
+    """
+        Gets all the commits reachable from `revision` of the repository contained in `folder`,
+        in `git log` order, with their data (see `iterate_commits`)
+    """
+    return [commit for _, commit in sorted(iterate_commits(folder, revision=revision), key=lambda item: item[0])]
+
+
+def add_directory_data(commits: typing.List[Commit], counter):
+    """
+        Counts the directories matching `FLAGS.directories` of each commit in `commits`, in the repository
+        in the current directory (see `DirectoryCounter`)
+    """
+    cache = open_cache(counter)
+    directory_counter = DirectoryCounter(
+        FLAGS.directories, cache=cache, counter=counter)
+    bar = progressbar.ProgressBar(maxval=max(len(commits), 1)).start()
+    try:
+        for index, commit in enumerate(commits):
+            commit.__set_directory_data__(
+                directory_counter.count(commit.commitHash))
+            bar.update(index + 1)
+    finally:
+        if cache is not None:
+            cache.close()
+    bar.finish()
+
+
+def get_repository(temporary_dir: str) -> typing.Tuple[str, str]:
+    """
+        Returns the folder of the repository to analyse and the hash of the commit of `FLAGS.branch`
+        (`None` for the current branch)
+
+        Unless `FLAGS.offline` is set, the repository is analysed in its mirror inside `FLAGS.mirror_dir`
+        (see `update_mirror`), otherwise in the clone in `temporary_dir`. The branch `FLAGS.branch`
+        is resolved in the repository, without checking it out
     """
     if not FLAGS.offline:
         repository = FLAGS.repository
@@ -74,40 +405,149 @@ def generate_repo_history(temporary_dir: str) -> RepoHistory:
             print("Missing `--repository` flag")
             print("Run `python3 main.py --help` to get a list of flags")
             exit(-1)
-        if os.path.exists(temporary_dir) and os.path.isdir(temporary_dir):
-            shutil.rmtree(temporary_dir)
-
-        os.mkdir(temporary_dir)
-        try:
-            print("Cloning repository...")
-            subprocess.call(['git', 'clone', repository,
-                            temporary_dir, '--quiet'])
-        except:
+        with PROFILER.stage('git_clone'):
+            folder = update_mirror(repository, FLAGS.mirror_dir)
+        if folder is None:
             print("Failed to clone repository")
             exit(-2)
     else:
         if not os.path.exists(temporary_dir):
             print("You can't use --offline flag on a non-existent --dir directory")
             exit(-1)
+        folder = os.path.abspath(temporary_dir)
+        if FLAGS.update:
+            print("Updating repository...")
+            if subprocess.call(['git', 'pull', '--ff-only', '--quiet'], cwd=folder) != 0:
+                print("Failed to update repository, continuing with the local commits")
 
+    revision = None
     if FLAGS.branch is not None:
-        os.chdir(temporary_dir)
-        p = subprocess.Popen(['git', 'checkout', FLAGS.branch],
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        error = list(p.stderr.readlines())
-        if len(error) > 0:
-            print("ERROR:", error[0].decode('utf-8').strip())
+        revision = resolve_branch(FLAGS.branch, folder)
+        if revision is None:
+            print(f"ERROR: branch {FLAGS.branch} not found")
             print("Continuing anyway...")
         else:
-            print(f"Changed branch to {FLAGS.branch}")
-        os.chdir('..')
+            print(f"Using branch {FLAGS.branch}")
+
+    return (folder, revision)
+
+
+def generate_repo_history(temporary_dir: str, stream_file: str = None) -> RepoHistory:
+    """
+        Generates a `RepoHistory` object if `FLAGS.input_file` is not specified, analysing the
+        repository returned by `get_repository`
+
+        If `stream_file` is defined, each commit is appended to it as soon as it's analysed and
+        the history is read back from it at the end, so the commits are never all in memory.
+        A `.sqlite` `stream_file` is written with `SqliteHistoryWriter`, as the repository `repo_history`
+    """
+    folder, revision = get_repository(temporary_dir)
+
+    print("Getting commit data")
+    if FLAGS.fast:
+        working_dir = os.getcwd()
+        os.chdir(folder)
+        try:
+            counter = get_counter(FLAGS.counter)
+            with PROFILER.stage('numstat'):
+                commits = get_numstat_commits(branch=revision)
+            if FLAGS.directories is not None:
+                add_directory_data(commits, counter)
+        finally:
+            close_git_readers()
+            os.chdir(working_dir)
+        print(f"Read {len(commits)} commits")
+        return RepoHistory(commits)
+
+    if stream_file is None:
+        commits = get_commits(folder, revision=revision)
+        return RepoHistory(commits)
+
+    if stream_file.endswith('.sqlite'):
+        writer = SqliteHistoryWriter(stream_file, 'repo_history', append=False)
+    else:
+        writer = JsonLinesWriter(stream_file, append=False)
+    try:
+        for _, commit in iterate_commits(folder, revision=revision):
+            writer.write(commit.as_map())
+    finally:
+        writer.close()
+    if stream_file.endswith('.sqlite'):
+        return parse_sqlite_repo_history(stream_file, repository='repo_history')
+    return parse_streamed_repo_history(stream_file, directories=FLAGS.directories is not None)
+
+
+def get_branch_revisions(folder: str) -> typing.Dict[str, str]:
+    """
+        Returns the hash of the commit of each branch in `FLAGS.branches`, or of every branch of the
+        repository in `folder` if `FLAGS.all_branches` is set (see `list_branches`)
+    """
+    branches = list_branches(folder) if FLAGS.all_branches else FLAGS.branches
+    revisions = {}
+    for branch in branches:
+        revisions[branch] = resolve_branch(branch, folder)
+        if revisions[branch] is None:
+            print(f"ERROR: branch {branch} not found")
+            exit(-1)
+    return revisions
+
 
+def generate_branch_histories(temporary_dir: str) -> typing.Tuple[RepoHistory, typing.Dict[str, RepoHistory]]:
+    """
+        Analyses the branches returned by `get_branch_revisions` of the repository returned by `get_repository`
+
+        The commits reachable from any of the branches are listed by a single `git log` and each one is
+        analysed once, even if it belongs to many branches (see `iterate_commits`), then they are split
+        among the branches by `split_branches`. Returns the history of all the commits and the history of
+        each branch
+    """
+    folder, _ = get_repository(temporary_dir)
+    revisions = get_branch_revisions(folder)
+    print(f"Using branches {', '.join(revisions)}")
     print("Getting commit data")
-    commits = get_commits(temporary_dir)
-    return RepoHistory(commits)
+    commits = get_commits(folder, revision=sorted(set(revisions.values())))
+    return (RepoHistory(commits), split_branches(commits, revisions, folder))
+
+
+def generate_shard(temporary_dir: str, output_folder: str) -> str:
+    """
+        Analyses only the commits of the shard `FLAGS.shard` of the range `FLAGS.commit_range` of the
+        repository returned by `get_repository`, writing them to `output_folder` (see `write_shard`)
+
+        The range ends at `FLAGS.branch` (the current branch by default) unless its end is given,
+        and it starts at the root commit unless its start is given. Returns the path of the shard
+    """
+    folder, revision = get_repository(temporary_dir)
+    start, end = None, None
+    if FLAGS.commit_range is not None:
+        start, end = parse_commit_range(FLAGS.commit_range)
+    if end is None:
+        end = revision or 'HEAD'
+    start_hash = None if start is None else resolve_branch(start, folder)
+    end_hash = resolve_branch(end, folder)
+    for name, commit_hash in [(start, start_hash), (end, end_hash)]:
+        if name is not None and commit_hash is None:
+            print(f"ERROR: revision {name} not found")
+            exit(-1)
+    range_revision = end_hash if start_hash is None else f"{start_hash}..{end_hash}"
+
+    working_dir = os.getcwd()
+    os.chdir(folder)
+    try:
+        lines = read_git_log(range_revision)
+    finally:
+        os.chdir(working_dir)
+    index, count = parse_shard(FLAGS.shard)
+    print(f"Getting commit data of shard {index}/{count} of {len(lines)} commits")
+    commits = get_commits(folder, revision=range_revision)
+    return write_shard(commits, lines, start_hash, end_hash, index, count, output_folder)
 
 
-def plot_data(repo_history: RepoHistory):
+def plot_data(repo_history: RepoHistory, branch_histories: typing.Dict[str, RepoHistory] = {}):
+    """
+        Asks which languages of `repo_history` to plot, and plots them. If `branch_histories` is not empty,
+        the languages of each branch in it are plotted on the same chart instead
+    """
     continue_plotting = True
     while continue_plotting:
         languages = repo_history.languages
@@ -139,18 +579,76 @@ def plot_data(repo_history: RepoHistory):
 
         print(f"Should plot {[langs[index] for index in  languages_to_plot]}")
 
-        plotter = Plotter(repo_history)
+        plotter = Plotter(branch_histories or repo_history,
+                          points=FLAGS.plot_points, method=FLAGS.downsampling)
         plotter.plot([langs[index] for index in languages_to_plot])
         should_plot = input("Plot again? Y/n: ")
         if should_plot.strip() == 'n':
             exit(1)
 
 
+def write_repo_history(repo_history: RepoHistory, output_folder: str, name: str):
+    """
+        Writes `repo_history` in `output_folder` using the format `FLAGS.output_format`
+    """
+    if FLAGS.output_format == 'binary':
+        repo_history.write_binary(f'{output_folder}/{name}.rph')
+    elif FLAGS.output_format == 'sqlite':
+        repo_history.write_sqlite(f'{output_folder}/histories.sqlite', name)
+    elif FLAGS.output_format == 'jsonl':
+        writer = JsonLinesWriter(f'{output_folder}/{name}.jsonl', append=False)
+        for commit in repo_history.commits:
+            writer.write(commit.as_map())
+        writer.close()
+    else:
+        with open(f'{output_folder}/{name}.json', 'w+') as f:
+            json.dump(repo_history.as_map(), f)
+
+
+def report_profile():
+    """
+        Prints the summary of the stages measured with `--profile` and writes their trace to `FLAGS.profile_trace`,
+        if it's defined
+    """
+    if not FLAGS.profile:
+        return
+    print(PROFILER.get_summary(slowest=FLAGS.profile_slowest))
+    if FLAGS.profile_trace is None:
+        return
+    PROFILER.write_trace(FLAGS.profile_trace)
+    print(f"Trace written to {FLAGS.profile_trace}")
+
+
 def main(args):
+    if FLAGS.profile:
+        PROFILER.enable()
+    if FLAGS.input_file is None and FLAGS.counter == 'cloc' and not command_exists('cloc'):
+        print("Missing `cloc` utility")
+        exit(-1)
+
     temporary_dir = FLAGS.dir
     write_output = FLAGS.write_output
     output_folder = None
 
+    if FLAGS.shard is not None or FLAGS.commit_range is not None:
+        if FLAGS.input_file is not None or FLAGS.fast or FLAGS.sampling or FLAGS.live or FLAGS.branches is not None or FLAGS.all_branches:
+            print("--shard and --commit_range can't be used with --input_file, --fast, --sampling, --live, --branches or --all_branches")
+            exit(-1)
+        if FLAGS.output_folder is None:
+            print("The shards are written to the folder defined with --output_folder flag")
+            exit(-1)
+        if not os.path.exists(FLAGS.output_folder):
+            os.makedirs(FLAGS.output_folder)
+        path = generate_shard(temporary_dir, FLAGS.output_folder)
+        print(f"Shard written to {path}")
+        report_profile()
+        return
+
+    if FLAGS.live and (FLAGS.input_file is not None or FLAGS.fast or FLAGS.sampling or FLAGS.incremental
+                       or FLAGS.branches is not None or FLAGS.all_branches):
+        print("--live can't be used with --input_file, --fast, --sampling, --incremental, --branches or --all_branches")
+        exit(-1)
+
     if write_output:
         if FLAGS.output_folder is None:
             print(
@@ -160,21 +658,82 @@ def main(args):
         if not os.path.exists(output_folder):
             os.mkdir(output_folder)
 
+    by_directory = FLAGS.directories is not None
+    # the history of each branch analysed with `--branches`, plotted instead of `repo_history`
+    branch_histories = {}
     if FLAGS.input_file is not None:
-        repo_history = parse_repo_history(FLAGS.input_file)
+        with PROFILER.stage('parse_input'):
+            repo_history = parse_repo_history(
+                FLAGS.input_file, directories=by_directory, repository=FLAGS.repo_name,
+                start=parse_iso_date(FLAGS.since), end=parse_iso_date(FLAGS.until, end_of_day=True),
+                languages=FLAGS.input_languages)
+        columnar = repo_history.get_columnar()
+        if len(columnar) == 0 or (FLAGS.input_languages is not None and len(columnar.languages) == 0):
+            print(f"No commit of {FLAGS.input_file} matches --repo_name, --since, --until and --input_languages")
+            exit(-1)
+    elif FLAGS.branches is not None or FLAGS.all_branches:
+        if FLAGS.fast or FLAGS.sampling:
+            print("--branches and --all_branches can't be used with --fast or --sampling")
+            exit(-1)
+        repo_history, branch_histories = generate_branch_histories(
+            temporary_dir)
+        if write_output:
+            with PROFILER.stage('write_output'):
+                write_repo_history(
+                    repo_history, output_folder, 'repo_history')
+                for branch in branch_histories:
+                    write_repo_history(branch_histories[branch], output_folder,
+                                       f'repo_history_{get_safe_file_name(branch)}')
+        if by_directory:
+            repo_history = repo_history.get_directory_history()
+            branch_histories = {branch: branch_histories[branch].get_directory_history()
+                                for branch in branch_histories}
+    elif write_output and FLAGS.output_format == 'jsonl':
+        repo_history = generate_repo_history(temporary_dir, stream_file=os.path.abspath(
+            f'{output_folder}/repo_history.jsonl'))
+    elif write_output and FLAGS.output_format == 'sqlite' and not by_directory:
+        repo_history = generate_repo_history(temporary_dir, stream_file=os.path.abspath(
+            f'{output_folder}/histories.sqlite'))
     else:
         repo_history = generate_repo_history(temporary_dir)
         if write_output:
-            with open(f'{output_folder}/repo_history.json', 'w+') as f:
-                json.dump(repo_history.as_map(), f)
+            with PROFILER.stage('write_output'):
+                write_repo_history(
+                    repo_history, output_folder, 'repo_history')
+        if by_directory:
+            repo_history = repo_history.get_directory_history()
+    if by_directory and len(repo_history.get_columnar().languages) == 0:
+        print("No commit has the data of the directories, the history must be generated with --directories")
+        exit(-1)
 
     print("Preprocessing repository's history")
-    repo_history.preprocess_commits(FLAGS.no_preprocessing)
+    with PROFILER.stage('preprocess'):
+        repo_history.preprocess_commits(
+            FLAGS.no_preprocessing, bucket=FLAGS.bucket, aggregation=FLAGS.aggregation)
+        for branch in branch_histories:
+            branch_histories[branch].preprocess_commits(
+                FLAGS.no_preprocessing, bucket=FLAGS.bucket, aggregation=FLAGS.aggregation)
     if write_output:
-        with open(f'{output_folder}/repo_history_preprocessed.json', 'w+') as f:
-            json.dump(repo_history.as_map(), f)
-
-    plot_data(repo_history)
+        with PROFILER.stage('write_output'):
+            write_repo_history(repo_history, output_folder,
+                               'repo_history_preprocessed')
+            for branch in branch_histories:
+                write_repo_history(branch_histories[branch], output_folder,
+                                   f'repo_history_preprocessed_{get_safe_file_name(branch)}')
+
+    if FLAGS.render:
+        languages = FLAGS.render_languages
+        if languages is None:
+            languages = repo_history.languages + ['All']
+        with PROFILER.stage('render'):
+            paths = render_plots(branch_histories or repo_history, languages, FLAGS.render_fields,
+                                 FLAGS.render_dir, image_format=FLAGS.render_format, jobs=FLAGS.jobs,
+                                 points=FLAGS.plot_points, method=FLAGS.downsampling)
+        print(f"Rendered {len(paths)} plots to {FLAGS.render_dir}")
+        report_profile()
+    else:
+        report_profile()
+        plot_data(repo_history, branch_histories)
 
 
 if __name__ == '__main__':
@@ -182,8 +741,4 @@ if __name__ == '__main__':
         print("Missing `git`")
         exit(-1)
 
-    if not command_exists('cloc'):
-        print("Missing `cloc` utility")
-        exit(-1)
-
     app.run(main)
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import typing
+
+import progressbar
+
+from .model.src.commit import Commit, get_git_log_env
+from .profiler import PROFILER
+from .utilities import ClocCounter, get_cloc_data_from_commit, parse_cloc_output
+
+
+async def count_commit(commit: Commit, scratch_dir: str, cache=None, counter=None):
+    """
+        Sets the data of `commit`, like `Commit.checkout_and_get_data` does
+
+        With `cloc` and without a cache the `cloc` process is awaited and its whole output is read at once,
+        otherwise the counting runs in a thread of the default executor, so it doesn't block the event loop
+    """
+    with PROFILER.commit(commit.commitHash) as details:
+        if cache is None and isinstance(counter, ClocCounter):
+            process = await asyncio.create_subprocess_exec('cloc', commit.commitHash, '--json',
+                                                           stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.DEVNULL,
+                                                           env=dict(os.environ, TMPDIR=scratch_dir))
+            output, _ = await process.communicate()
+            file_data, aggregated = parse_cloc_output(output)
+        else:
+            file_data, aggregated = await asyncio.get_running_loop().run_in_executor(
+                None, get_cloc_data_from_commit, commit.commitHash, scratch_dir, cache, counter)
+        commit.__set_file_data__(file_data)
+        commit.__set_aggregated_data__(aggregated)
+        details['files'] = aggregated.nFiles
+
+
+async def run_pipeline(git_log_command: typing.List[str], results: asyncio.Queue, jobs=1, cache=None, counter=None, store=None):
+    """
+        Streams the lines of `git_log_command` and counts each commit as soon as its line arrives,
+        putting the `(index, commit)` pairs in `results` when they are ready
+
+        At most `jobs` commits are counted at the same time: when all of them are busy the output
+        of `git log` is not read, and when `results` is full the counted commits wait before releasing
+        their slot, so the pipeline never runs ahead of the consumer.
+        The commits already in `store` are not counted again
+    """
+    semaphore = asyncio.Semaphore(jobs)
+    scratch_dirs = asyncio.Queue()
+    for _ in range(jobs):
+        scratch_dirs.put_nowait(tempfile.mkdtemp(prefix='repo_plotter_'))
+
+    async def analyse(index: int, commit: Commit):
+        scratch_dir = await scratch_dirs.get()
+        try:
+            await count_commit(commit, scratch_dir, cache=cache, counter=counter)
+        finally:
+            scratch_dirs.put_nowait(scratch_dir)
+        await results.put((index, commit))
+
+    async def analyse_and_release(index: int, commit: Commit):
+        try:
+            await analyse(index, commit)
+        finally:
+            semaphore.release()
+
+    tasks = []
+    try:
+        process = await asyncio.create_subprocess_exec(*git_log_command, env=get_git_log_env(), stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.DEVNULL)
+        index = 0
+        async for line in process.stdout:
+            commit = Commit(line.decode('utf-8').strip())
+            if store is not None and commit.commitHash in store:
+                await results.put((index, store.get(commit.commitHash, date=commit.date)))
+            else:
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(
+                    analyse_and_release(index, commit)))
+            index += 1
+        await process.wait()
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while not scratch_dirs.empty():
+            shutil.rmtree(scratch_dirs.get_nowait(), ignore_errors=True)
+
+
+async def get_next_result(results: asyncio.Queue, pipeline: asyncio.Task) -> typing.Tuple[int, Commit]:
+    """
+        Waits for the next item of `results`, or returns `None` if `pipeline` ended without adding any
+    """
+    next_result = asyncio.ensure_future(results.get())
+    await asyncio.wait([next_result, pipeline], return_when=asyncio.FIRST_COMPLETED)
+    if next_result.done():
+        return next_result.result()
+    next_result.cancel()
+    if not results.empty():
+        return results.get_nowait()
+    return None
+
+
+def iterate_commits_data_async(git_log_command: typing.List[str], jobs=1, cache=None, counter=None, store=None) -> typing.Iterator[typing.Tuple[int, Commit]]:
+    """
+        Counts the commits printed by `git_log_command` in the current directory with the asyncio
+        pipeline of `run_pipeline`, in a single thread (except for the counters that don't run `cloc`)
+
+        Yields the `(index, commit)` pairs as soon as each commit is ready, where `index` is the position
+        of the commit in `git log`. The other parameters have the same meaning of `collect_commits_data`
+    """
+    if counter is None:
+        counter = ClocCounter()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = asyncio.Queue(maxsize=2 * jobs)
+    pipeline = loop.create_task(run_pipeline(git_log_command, results, jobs=jobs, cache=cache,
+                                             counter=counter, store=store))
+    bar = progressbar.ProgressBar(maxval=progressbar.UnknownLength,
+                                  widgets=[progressbar.Counter(), ' commits ', progressbar.Timer()]).start()
+    try:
+        done = 0
+        while True:
+            # the pipeline runs only while the next result is awaited
+            item = loop.run_until_complete(get_next_result(results, pipeline))
+            if item is None:
+                break
+            done += 1
+            bar.update(done)
+            yield item
+        loop.run_until_complete(pipeline)
+        bar.finish()
+    finally:
+        if not pipeline.done():
+            pipeline.cancel()
+            loop.run_until_complete(asyncio.gather(
+                pipeline, return_exceptions=True))
+        asyncio.set_event_loop(None)
+        loop.close()
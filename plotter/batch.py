@@ -0,0 +1,246 @@
+import collections
+import concurrent.futures
+import json
+import os
+import typing
+
+import progressbar
+from absl import app, flags
+
+from .__main__ import (command_exists, get_default_store_path, read_git_log,
+                       write_repo_history)
+from .cache import BlobCache
+from .mirror import get_repository_name, resolve_branch, update_mirror
+from .model.src.commit import Commit
+from .model.src.repo_history import RepoHistory
+from .store import CommitStore
+from .utilities import get_counter
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('manifest', None,
+                    'The JSON file with the list of repositories to analyse, see the README')
+flags.DEFINE_integer('max_jobs_per_repo', 0,
+                     'Specifies how many commits of the same repository can be analysed at the same time, 0 means no limit. Can be overridden by the `jobs` of each repository in the manifest', lower_bound=0)
+flags.mark_flag_as_required('manifest')
+
+
+class RepositoryJob(object):
+    """
+        A repository of the manifest, with the commits that still have to be analysed
+
+        `folder` is the mirror of `repository` (set by `prepare_repository`), `branch` is the branch to
+        analyse (the default one if `None`) and `max_jobs` is the maximum number of its commits analysed
+        at the same time (0 means no limit)
+    """
+
+    def __init__(self, name: str, repository: str, branch: str = None, max_jobs=0):
+        self.name = name
+        self.repository = repository
+        self.folder = None
+        self.branch = branch
+        self.max_jobs = max_jobs
+        self.lines = []
+        self.pending = collections.deque()
+        self.running = 0
+        self.commits = {}
+        self.store = None
+
+    def can_start(self) -> bool:
+        """
+            Checks if another commit of this repository can be analysed now
+        """
+        return len(self.pending) > 0 and (self.max_jobs == 0 or self.running < self.max_jobs)
+
+    def get_repo_history(self) -> RepoHistory:
+        """
+            Returns the analysed commits in `git log` order
+        """
+        return RepoHistory([self.commits[Commit(line).commitHash] for line in self.lines])
+
+
+def parse_manifest(path: str) -> typing.List[RepositoryJob]:
+    """
+        Reads the manifest `path`, a JSON list of objects with the `repository` to analyse and optionally
+        its `name` (used for the output files), `branch` and `jobs`
+    """
+    if not os.path.exists(path):
+        print(f"File {path} doesn't exists")
+        exit(-1)
+    with open(path, 'r') as f:
+        entries = json.load(f)
+
+    jobs = []
+    names = set()
+    for entry in entries:
+        if 'repository' not in entry:
+            print(f"Missing `repository` in the manifest entry {entry}")
+            exit(-1)
+        name = entry.get('name', get_repository_name(entry['repository']))
+        if name in names:
+            print(f"The name {name} is used by more than one repository of the manifest")
+            exit(-1)
+        names.add(name)
+        jobs.append(RepositoryJob(name, entry['repository'], branch=entry.get('branch'),
+                                  max_jobs=entry.get('jobs', FLAGS.max_jobs_per_repo)))
+    return jobs
+
+
+def prepare_repository(job: RepositoryJob, stores: typing.Dict[str, CommitStore],
+                       owners: typing.Dict[typing.Tuple[str, str], typing.List[RepositoryJob]]):
+    """
+        Clones or updates the mirror of the repository of `job` (see `update_mirror`), then reads
+        the commits to analyse, skipping the ones already in its commit store
+
+        The repositories with the same URL (e.g. different branches) share the same mirror and
+        commit store, opened once in `stores` (keyed by its path). Their shared commits are
+        analysed once: `owners` maps each `(folder, hash)` to analyse to the jobs that need it,
+        and only the first of them has it pending
+    """
+    print(f"Preparing {job.name}")
+    job.folder = update_mirror(job.repository, FLAGS.mirror_dir)
+    if job.folder is None:
+        print(f"Failed to clone {job.repository}")
+        exit(-2)
+    revision = None
+    if job.branch is not None:
+        revision = resolve_branch(job.branch, job.folder)
+        if revision is None:
+            print(f"ERROR: branch {job.branch} of {job.name} not found")
+            exit(-1)
+
+    working_dir = os.getcwd()
+    os.chdir(job.folder)
+    try:
+        job.lines = read_git_log(revision)
+        if not FLAGS.no_resume:
+            store_path = get_default_store_path(get_counter(FLAGS.counter))
+            if store_path not in stores:
+                stores[store_path] = CommitStore(store_path)
+            job.store = stores[store_path]
+    finally:
+        os.chdir(working_dir)
+
+    for line in job.lines:
+        listed = Commit(line)
+        if job.store is not None and listed.commitHash in job.store:
+            job.commits[listed.commitHash] = job.store.get(listed.commitHash, date=listed.date)
+            continue
+        key = (job.folder, listed.commitHash)
+        if key not in owners:
+            owners[key] = []
+            job.pending.append(line)
+        owners[key].append(job)
+    print(f"{job.name}: {len(job.lines)} commits, {len(job.pending)} to analyse")
+
+
+# the caches opened by each worker process, keyed by their path
+worker_caches = {}
+
+
+def analyse_commit(folder: str, line: str, counter_name: str, cache_file: str = None, cache_size=1000000) -> Commit:
+    """
+        Analyses the commit of the `git log` line `line` of the repository in `folder`
+
+        It runs in the worker processes, so it can move into `folder` without affecting the other workers
+    """
+    os.chdir(folder)
+    counter = get_counter(counter_name)
+    cache = None
+    if cache_file is not None:
+        if cache_file not in worker_caches:
+            worker_caches[cache_file] = BlobCache(
+                cache_file, counter.get_version(), max_entries=cache_size)
+        cache = worker_caches[cache_file]
+    commit = Commit(line)
+    commit.checkout_and_get_data(cache=cache, counter=counter)
+    return commit
+
+
+def analyse_repositories(jobs: typing.List[RepositoryJob], workers: int,
+                         on_commit_done: typing.Callable[[RepositoryJob, Commit], None]):
+    """
+        Analyses the pending commits of all the `jobs` on a single pool of `workers` processes
+
+        The repositories take turns: at every round each repository that hasn't reached its `max_jobs`
+        submits one commit, so a big repository doesn't delay the others.
+        `on_commit_done` is called with the repository and the commit as soon as a commit is analysed
+    """
+    cache_file = None
+    if not FLAGS.no_cache:
+        cache_file = os.path.abspath(os.path.expanduser(FLAGS.cache_file))
+    total = sum(len(job.pending) for job in jobs)
+    bar = progressbar.ProgressBar(maxval=max(total, 1)).start()
+    done = 0
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        # index of the repository that submits the next commit
+        turn = 0
+        while True:
+            # keeps a few commits queued, so the workers never wait for the next one
+            while len(running) < workers * 2:
+                ready = [index % len(jobs) for index in range(turn, turn + len(jobs))
+                         if jobs[index % len(jobs)].can_start()]
+                if len(ready) == 0:
+                    break
+                job = jobs[ready[0]]
+                future = executor.submit(analyse_commit, job.folder, job.pending.popleft(),
+                                         FLAGS.counter, cache_file, FLAGS.cache_size)
+                running[future] = job
+                job.running += 1
+                turn = ready[0] + 1
+            if len(running) == 0:
+                break
+
+            finished, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                job = running.pop(future)
+                job.running -= 1
+                on_commit_done(job, future.result())
+                done += 1
+                bar.update(done)
+    bar.finish()
+
+
+def main(args):
+    if FLAGS.counter == 'cloc' and not command_exists('cloc'):
+        print("Missing `cloc` utility")
+        exit(-1)
+    if FLAGS.output_folder is None:
+        print("The batch mode needs the folder where it writes the histories, set it with --output_folder flag")
+        exit(-1)
+    if not os.path.exists(FLAGS.output_folder):
+        os.makedirs(FLAGS.output_folder)
+
+    jobs = parse_manifest(FLAGS.manifest)
+    stores = {}
+    owners = {}
+    try:
+        for job in jobs:
+            prepare_repository(job, stores, owners)
+
+        def on_commit_done(job: RepositoryJob, commit: Commit):
+            for owner in owners[(job.folder, commit.commitHash)]:
+                owner.commits[commit.commitHash] = commit
+            if job.store is not None:
+                job.store.add(commit)
+
+        analyse_repositories(jobs, FLAGS.jobs, on_commit_done)
+    finally:
+        for store in stores.values():
+            store.close()
+
+    for job in jobs:
+        write_repo_history(job.get_repo_history(),
+                           FLAGS.output_folder, job.name)
+        print(f"Wrote the history of {job.name}")
+
+
+if __name__ == '__main__':
+    if not command_exists('git'):
+        print("Missing `git`")
+        exit(-1)
+
+    app.run(main)
@@ -0,0 +1,162 @@
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+import typing
+
+from absl import app, flags
+
+from ..__main__ import command_exists, get_commits
+from ..model.src.repo_history import RepoHistory, parse_repo_history
+from ..render import render_plots
+from ..utilities import get_cloc_data_from_commit, get_counter
+from .generator import SyntheticRepository
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer('commits', 1000,
+                     'Specifies how many commits the synthetic repository has', lower_bound=1)
+flags.DEFINE_integer('files', 100,
+                     'Specifies how many files the first commit of the synthetic repository adds', lower_bound=1)
+flags.DEFINE_integer('languages', 3,
+                     'Specifies how many languages the files of the synthetic repository are written in', lower_bound=1)
+flags.DEFINE_integer('lines', 100,
+                     'Specifies the average number of lines of the files of the synthetic repository', lower_bound=1)
+flags.DEFINE_float('churn', 0.05,
+                   'Specifies the fraction of the files changed by each commit of the synthetic repository', lower_bound=0, upper_bound=1)
+flags.DEFINE_integer('seed', 0,
+                     'Specifies the seed of the synthetic repository, the same seed always generates the same repository')
+flags.DEFINE_integer('samples', 20,
+                     'Specifies how many commits are counted one by one to time `get_cloc_data_from_commit`', lower_bound=1)
+flags.DEFINE_string('results_file', None,
+                    'Specifies the JSON file where the results are written')
+flags.DEFINE_string('baseline', None,
+                    'Specifies the JSON results of an old run to compare with')
+
+
+def get_peak_rss() -> typing.Tuple[int, int]:
+    """
+        Returns the peak resident memory, in kilobytes, of this process and of its biggest child process
+    """
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def run_stage(results: map, name: str, items: int, function: typing.Callable):
+    """
+        Runs `function`, storing in `results` how long it took, its throughput over `items` and the peak memory
+
+        Returns the value returned by `function`
+    """
+    print(f"Running {name}")
+    start = time.perf_counter()
+    value = function()
+    seconds = time.perf_counter() - start
+    peak_rss, children_peak_rss = get_peak_rss()
+    results[name] = {
+        'seconds': seconds,
+        'items': items,
+        'items_per_second': items / seconds if seconds > 0 else None,
+        'peak_rss_kb': peak_rss,
+        'children_peak_rss_kb': children_peak_rss,
+    }
+    print(f"{name}: {seconds:.3f} s, {results[name]['items_per_second'] or 0:.1f} items/s")
+    return value
+
+
+def compare_results(results: map, baseline: map):
+    """
+        Prints how the time of each stage changed from `baseline`
+    """
+    print("Compared with the baseline:")
+    for name in results['stages']:
+        if name not in baseline['stages']:
+            continue
+        before = baseline['stages'][name]['seconds']
+        after = results['stages'][name]['seconds']
+        change = (after - before) / before * 100 if before > 0 else 0
+        print(f"- {name}: {before:.3f} s -> {after:.3f} s ({change:+.1f}%)")
+
+
+def run_benchmark(folder: str) -> map:
+    """
+        Generates the synthetic repository in `folder` and times each stage of the script on it
+    """
+    repository = SyntheticRepository(commits=FLAGS.commits, files=FLAGS.files, languages=FLAGS.languages,
+                                     lines=FLAGS.lines, churn=FLAGS.churn, seed=FLAGS.seed)
+    stages = {}
+    os.chdir(folder)
+    run_stage(stages, 'generate', FLAGS.commits,
+              lambda: repository.generate('repo'))
+
+    commits = run_stage(stages, 'get_commits', FLAGS.commits,
+                        lambda: get_commits('repo'))
+
+    samples = [commits[round(index * (len(commits) - 1) / max(FLAGS.samples - 1, 1))]
+               for index in range(min(FLAGS.samples, len(commits)))]
+    counter = get_counter(FLAGS.counter)
+    os.chdir('repo')
+    run_stage(stages, 'get_cloc_data_from_commit', len(samples),
+              lambda: [get_cloc_data_from_commit(commit.commitHash, counter=counter) for commit in samples])
+    os.chdir('..')
+
+    repo_history = RepoHistory(list(commits))
+    run_stage(stages, 'preprocess_commits', len(commits),
+              lambda: repo_history.preprocess_commits(FLAGS.no_preprocessing, bucket=FLAGS.bucket,
+                                                      aggregation=FLAGS.aggregation))
+
+    def save():
+        with open('repo_history.json', 'w') as f:
+            json.dump(RepoHistory(commits).as_map(), f)
+    run_stage(stages, 'json_save', len(commits), save)
+    run_stage(stages, 'json_load', len(commits),
+              lambda: parse_repo_history('repo_history.json'))
+
+    run_stage(stages, 'render', 1,
+              lambda: render_plots(repo_history, ['All'], ['code'], 'plots',
+                                   points=FLAGS.plot_points, method=FLAGS.downsampling))
+
+    return {
+        'repository': repository.as_map(),
+        'counter': FLAGS.counter,
+        'jobs': FLAGS.jobs,
+        'stages': stages,
+    }
+
+
+def main(args):
+    if FLAGS.counter == 'cloc' and not command_exists('cloc'):
+        print("Missing `cloc` utility")
+        exit(-1)
+
+    folder = tempfile.mkdtemp(prefix='repo_plotter_benchmark_')
+    if not FLAGS['cache_file'].present:
+        # every run starts with an empty cache, so the runs can be compared
+        FLAGS.cache_file = os.path.join(folder, 'blobs.sqlite')
+    working_dir = os.getcwd()
+    try:
+        results = run_benchmark(folder)
+    finally:
+        os.chdir(working_dir)
+        shutil.rmtree(folder)
+
+    if FLAGS.results_file is not None:
+        with open(FLAGS.results_file, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {FLAGS.results_file}")
+    else:
+        print(json.dumps(results, indent=2))
+
+    if FLAGS.baseline is not None:
+        with open(FLAGS.baseline, 'r') as f:
+            compare_results(results, json.load(f))
+
+
+if __name__ == '__main__':
+    if not command_exists('git'):
+        print("Missing `git`")
+        exit(-1)
+
+    app.run(main)
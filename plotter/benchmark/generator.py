@@ -0,0 +1,127 @@
+import datetime
+import random
+import subprocess
+import typing
+
+from ..languages import LANGUAGES
+
+# languages with single line comments, whose files are easy to generate
+GENERATED_LANGUAGES = [language for language in LANGUAGES
+                       if len(language.extensions) > 0 and len(language.line_comments) > 0]
+
+
+class SyntheticRepository(object):
+    """
+        Describes a git repository made of random files, that can be generated again identically from the same `seed`
+
+        The first commit adds `files` files, spread over `languages` languages and `lines` lines long on average.
+        Each of the other `commits - 1` commits changes a fraction `churn` of the files, replacing, adding
+        and removing some of their lines, and sometimes adds or deletes a file.
+        The commits are one hour apart, starting from the 1st of January 2020
+    """
+
+    def __init__(self, commits=1000, files=100, languages=3, lines=100, churn=0.05, seed=0):
+        self.commits = commits
+        self.files = files
+        self.languages = GENERATED_LANGUAGES[:languages]
+        self.lines = lines
+        self.churn = churn
+        self.seed = seed
+
+    def as_map(self) -> map:
+        return {
+            'commits': self.commits,
+            'files': self.files,
+            'languages': [language.name for language in self.languages],
+            'lines': self.lines,
+            'churn': self.churn,
+            'seed': self.seed,
+        }
+
+    def generate_line(self, rng: random.Random, language) -> str:
+        kind = rng.random()
+        if kind < 0.1:
+            return ''
+        if kind < 0.25:
+            return f"{language.line_comments[0]} comment {rng.getrandbits(32):08x}"
+        return f"value_{rng.getrandbits(32):08x} = {rng.randint(0, 1000)}"
+
+    def generate_file(self, rng: random.Random, index: int) -> typing.Tuple[str, object, typing.List[str]]:
+        language = self.languages[index % len(self.languages)]
+        path = f"src/dir{index % 10}/file{index}.{language.extensions[0]}"
+        lines = [self.generate_line(rng, language)
+                 for _ in range(rng.randint(self.lines // 2, self.lines * 3 // 2))]
+        return (path, language, lines)
+
+    def change_file(self, rng: random.Random, language, lines: typing.List[str]):
+        for _ in range(rng.randint(1, 5)):
+            action = rng.random()
+            position = rng.randint(0, len(lines))
+            if action < 0.4 or len(lines) == 0:
+                lines.insert(position, self.generate_line(rng, language))
+            elif action < 0.7:
+                lines[min(position, len(lines) - 1)] = self.generate_line(rng, language)
+            else:
+                del lines[min(position, len(lines) - 1)]
+
+    def get_fast_import_stream(self) -> typing.Iterator[bytes]:
+        """
+            Yields the commands that `git fast-import` needs to create the repository
+        """
+        rng = random.Random(self.seed)
+        files = {}
+        next_file = 0
+        date = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+        for commit in range(self.commits):
+            changed = []
+            deleted = []
+            if commit == 0:
+                for _ in range(self.files):
+                    path, language, lines = self.generate_file(rng, next_file)
+                    files[path] = (language, lines)
+                    changed.append(path)
+                    next_file += 1
+            else:
+                paths = sorted(files)
+                for path in rng.sample(paths, max(1, int(len(paths) * self.churn))):
+                    self.change_file(rng, *files[path])
+                    changed.append(path)
+                event = rng.random()
+                if event < 0.05:
+                    path, language, lines = self.generate_file(rng, next_file)
+                    files[path] = (language, lines)
+                    changed.append(path)
+                    next_file += 1
+                elif event < 0.08:
+                    # with a high churn every file may have been changed, then none is deleted
+                    candidates = [path for path in paths if path not in changed]
+                    if len(candidates) > 0:
+                        path = rng.choice(candidates)
+                        del files[path]
+                        deleted.append(path)
+
+            timestamp = int(date.timestamp()) + commit * 3600
+            message = f"Commit {commit}".encode('utf-8')
+            yield b"commit refs/heads/master\n"
+            yield f"committer Benchmark <benchmark@example.com> {timestamp} +0000\n".encode('utf-8')
+            yield f"data {len(message)}\n".encode('utf-8') + message + b"\n"
+            for path in deleted:
+                yield f"D {path}\n".encode('utf-8')
+            for path in changed:
+                content = '\n'.join(files[path][1]).encode('utf-8') + b'\n'
+                yield f"M 100644 inline {path}\ndata {len(content)}\n".encode('utf-8') + content + b"\n"
+
+    def generate(self, folder: str):
+        """
+            Creates the repository in `folder`, which must not exist
+        """
+        subprocess.run(['git', 'init', '-q', '-b', 'master', folder], check=True)
+        p = subprocess.Popen(['git', 'fast-import', '--quiet'], cwd=folder,
+                             stdin=subprocess.PIPE)
+        for chunk in self.get_fast_import_stream():
+            p.stdin.write(chunk)
+        p.stdin.close()
+        if p.wait() != 0:
+            raise Exception(f"git fast-import failed on {folder}")
+        subprocess.run(['git', 'checkout', '-q', 'master'], cwd=folder, check=True)
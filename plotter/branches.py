@@ -0,0 +1,53 @@
+import subprocess
+import typing
+
+from .model.src.commit import Commit
+from .model.src.repo_history import RepoHistory
+
+
+def list_branches(folder: str = None) -> typing.List[str]:
+    """
+        Returns the names of the local branches of the repository in `folder` (the current directory
+        by default), followed by the remote ones that don't have a local branch with the same name
+    """
+    p = subprocess.Popen(['git', 'for-each-ref', '--format=%(refname)', 'refs/heads', 'refs/remotes'], cwd=folder,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, _ = p.communicate()
+    refs = output.decode('utf-8').split()
+
+    local = [ref[len('refs/heads/'):]
+             for ref in refs if ref.startswith('refs/heads/')]
+    remote = []
+    for ref in refs:
+        if not ref.startswith('refs/remotes/') or ref.endswith('/HEAD'):
+            continue
+        name = ref[len('refs/remotes/'):]
+        if name.split('/', 1)[-1] not in local:
+            remote.append(name)
+    return local + remote
+
+
+def get_branch_commits(revision: str, folder: str = None) -> typing.Set[str]:
+    """
+        Returns the hashes of all the commits reachable from `revision`
+    """
+    p = subprocess.Popen(['git', 'rev-list', revision, '--'], cwd=folder,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, _ = p.communicate()
+    return set(output.decode('utf-8').split())
+
+
+def split_branches(commits: typing.List[Commit], revisions: typing.Dict[str, str], folder: str = None) -> typing.Dict[str, RepoHistory]:
+    """
+        Builds the history of each branch in `revisions` (which maps the name of each branch to its commit)
+        from `commits`, which must contain all the commits reachable from any of them
+
+        The histories share the `Commit` objects, so each commit is counted only once
+        however many branches contain it
+    """
+    histories = {}
+    for branch in revisions:
+        reachable = get_branch_commits(revisions[branch], folder)
+        histories[branch] = RepoHistory(
+            [commit for commit in commits if commit.commitHash in reachable])
+    return histories
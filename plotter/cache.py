@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+
+class BlobCache(object):
+    """
+        Persistent cache of the data calculated for single files
+
+        The entries are stored in a sqlite database and they are keyed by the counter that
+        calculated them (e.g. `cloc-1.90`), the hash of the git blob and the name of the file
+        (the language depends on it), so they can be shared across runs, branches and repositories.
+        When the cache holds more than `max_entries` items, the least recently used ones are evicted
+
+        The lookups are done with a query for each chunk of `lookup_chunk` keys. The time each entry
+        was last used is written with the next `put_many`, `evict` or `close`, or once `touch_every`
+        entries are waiting, so most lookups don't write to the database
+    """
+
+    def __init__(self, path: str, counter: str, max_entries=1000000, lookup_chunk=500, touch_every=10000):
+        folder = os.path.dirname(path)
+        if folder != '' and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.counter = counter
+        self.max_entries = max_entries
+        self.lookup_chunk = lookup_chunk
+        self.touch_every = touch_every
+        # (blob, name) -> time it was last read, not written yet
+        self.used = {}
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path, timeout=60, check_same_thread=False)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                counter TEXT NOT NULL,
+                blob TEXT NOT NULL,
+                name TEXT NOT NULL,
+                language TEXT,
+                blank INTEGER NOT NULL,
+                comment INTEGER NOT NULL,
+                code INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (counter, blob, name)
+            )''')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used)')
+        self.connection.commit()
+        self.entries = self.connection.execute(
+            'SELECT COUNT(*) FROM blobs').fetchone()[0]
+
+    def get_many(self, keys: typing.List[typing.Tuple[str, str]]) -> typing.Dict[typing.Tuple[str, str], map]:
+        """
+            Gets the cached data of the `(blob, name)` pairs in `keys`
+
+            Returns a map that contains only the pairs found in the cache. The value of a pair is `None`
+            if the file is not recognized by the counter, otherwise it's a map with its
+            `language`, `blank`, `comment` and `code` fields
+        """
+        found = {}
+        now = time.time()
+        unique_keys = list(set(keys))
+        with self.lock:
+            for index in range(0, len(unique_keys), self.lookup_chunk):
+                chunk = unique_keys[index:index + self.lookup_chunk]
+                blobs = list(set(blob for blob, _ in chunk))
+                names = {}
+                for blob, name in chunk:
+                    names.setdefault(blob, set()).add(name)
+                rows = self.connection.execute(
+                    'SELECT blob, name, language, blank, comment, code FROM blobs '
+                    f"WHERE counter = ? AND blob IN ({', '.join('?' * len(blobs))})",
+                    [self.counter] + blobs).fetchall()
+                for row in rows:
+                    if row[1] not in names[row[0]]:
+                        continue
+                    if row[2] is None:
+                        found[(row[0], row[1])] = None
+                    else:
+                        found[(row[0], row[1])] = {'language': row[2], 'blank': row[3],
+                                                   'comment': row[4], 'code': row[5]}
+            for key in found:
+                self.used[key] = now
+            if len(self.used) >= self.touch_every:
+                self.write_last_used()
+                self.connection.commit()
+        return found
+
+    def write_last_used(self):
+        """
+            Writes the time each entry read since the last call was used, without committing
+        """
+        if len(self.used) == 0:
+            return
+        self.connection.executemany(
+            'UPDATE blobs SET last_used = ? WHERE counter = ? AND blob = ? AND name = ?',
+            [(self.used[key], self.counter, key[0], key[1]) for key in self.used])
+        self.used = {}
+
+    def put_many(self, items: typing.Dict[typing.Tuple[str, str], map]):
+        """
+            Stores the data of the `(blob, name)` pairs in `items`, using `None` for the files
+            not recognized by the counter
+        """
+        if len(items) == 0:
+            return
+        now = time.time()
+        rows = []
+        for key in items:
+            data = items[key]
+            if data is None:
+                rows.append((self.counter, key[0], key[1],
+                            None, 0, 0, 0, now))
+            else:
+                rows.append((self.counter, key[0], key[1], data['language'],
+                            data['blank'], data['comment'], data['code'], now))
+        with self.lock:
+            self.write_last_used()
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            # `entries` is an upper bound, it's recalculated only when it exceeds the limit
+            self.entries += len(rows)
+            if self.entries > self.max_entries:
+                self.evict()
+            self.connection.commit()
+
+    def evict(self):
+        """
+            Removes the least recently used entries when the cache is bigger than `max_entries`,
+            leaving it 10% smaller than the limit
+        """
+        self.write_last_used()
+        self.entries = self.connection.execute(
+            'SELECT COUNT(*) FROM blobs').fetchone()[0]
+        if self.entries <= self.max_entries:
+            return
+        to_remove = self.entries - int(self.max_entries * 0.9)
+        self.connection.execute(
+            'DELETE FROM blobs WHERE rowid IN (SELECT rowid FROM blobs ORDER BY last_used LIMIT ?)', (to_remove,))
+        self.entries -= to_remove
+
+    def close(self):
+        with self.lock:
+            self.write_last_used()
+            self.connection.commit()
+            self.connection.close()
@@ -0,0 +1,193 @@
+import concurrent.futures
+import queue
+import shutil
+import tempfile
+import typing
+
+import progressbar
+
+from .model.src.aggregated import AggregatedData
+from .model.src.commit import Commit
+from .model.src.filedata import FileData
+from .profiler import PROFILER
+from .utilities import (get_changed_files, get_cloc_data_from_blobs,
+                        get_empty_tree_hash)
+
+
+def collect_commits_data(commits: typing.List[Commit], jobs=1, cache=None, counter=None, on_commit_done=None):
+    """
+        Runs `Commit.checkout_and_get_data` on every commit in `commits`
+
+        If `jobs` is greater than 1 the commits are analysed by a pool of `jobs` workers, each one
+        with its own scratch directory.
+        `cache` is the `BlobCache` shared by all the workers, if any, and `counter` is the backend
+        that counts the lines (`cloc` by default).
+        `on_commit_done`, if defined, is called with each commit as soon as its data is ready.
+        The commits are updated in place, so `commits` keeps its original order
+    """
+    for commit in iterate_commits_data(commits, len(commits), jobs=jobs, cache=cache, counter=counter):
+        if on_commit_done is not None:
+            on_commit_done(commit)
+
+
+def iterate_commits_data(commits: typing.Iterable[Commit], total: int, jobs=1, cache=None, counter=None) -> typing.Iterator[Commit]:
+    """
+        Runs `Commit.checkout_and_get_data` on every commit in `commits` (which contains `total` commits)
+        and yields each commit as soon as its data is ready, not necessarily in the same order
+
+        At most `2 * jobs` commits are analysed at the same time and `commits` is consumed only
+        when there's room for another one, so it can be a generator.
+        The other parameters have the same meaning of `collect_commits_data`
+    """
+    bar = progressbar.ProgressBar(maxval=total).start()
+    if jobs <= 1:
+        for index, commit in enumerate(commits):
+            commit.checkout_and_get_data(cache=cache, counter=counter)
+            bar.update(index + 1)
+            yield commit
+        bar.finish()
+        return
+
+    scratch_dirs = queue.Queue()
+    for _ in range(jobs):
+        scratch_dirs.put(tempfile.mkdtemp(prefix='repo_plotter_'))
+
+    def analyse(commit: Commit) -> Commit:
+        scratch_dir = scratch_dirs.get()
+        try:
+            commit.checkout_and_get_data(
+                scratch_dir=scratch_dir, cache=cache, counter=counter)
+        finally:
+            scratch_dirs.put(scratch_dir)
+        return commit
+
+    try:
+        # the heavy work is done by the `cloc` subprocesses, so threads are enough to keep all the cores busy
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            pending = set()
+            done = 0
+            for commit in commits:
+                pending.add(executor.submit(analyse, commit))
+                if len(pending) < 2 * jobs:
+                    continue
+                finished, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    done += 1
+                    bar.update(done)
+                    yield future.result()
+            for future in concurrent.futures.as_completed(pending):
+                done += 1
+                bar.update(done)
+                yield future.result()
+        bar.finish()
+    finally:
+        while not scratch_dirs.empty():
+            shutil.rmtree(scratch_dirs.get(), ignore_errors=True)
+
+
+class RunningCounts(object):
+    """
+        Keeps the `cloc` data of every file of the repository while the history is walked,
+        together with the totals of each language
+
+        Like `cloc`, the files with the same blob are counted once: the totals include only the
+        first path added of each blob, and another one of its paths when that one is removed
+    """
+
+    def __init__(self):
+        # path -> (blob, data)
+        self.files = {}
+        # blob -> {path: data}, the first path is the one counted
+        self.blobs = {}
+        self.languages = {}
+
+    def add_totals(self, data: map, sign: int):
+        if data['language'] not in self.languages:
+            self.languages[data['language']] = {
+                'nFiles': 0, 'blank': 0, 'comment': 0, 'code': 0}
+        totals = self.languages[data['language']]
+        totals['nFiles'] += sign
+        for field in ['blank', 'comment', 'code']:
+            totals[field] += sign * data[field]
+        if totals['nFiles'] == 0:
+            del self.languages[data['language']]
+
+    def remove_file(self, path: str):
+        if path not in self.files:
+            return
+        blob, data = self.files.pop(path)
+        paths = self.blobs[blob]
+        counted = next(iter(paths)) == path
+        del paths[path]
+        if counted:
+            self.add_totals(data, -1)
+            if len(paths) > 0:
+                self.add_totals(next(iter(paths.values())), 1)
+        if len(paths) == 0:
+            del self.blobs[blob]
+
+    def set_file(self, path: str, blob: str, data: map):
+        self.remove_file(path)
+        self.files[path] = (blob, data)
+        paths = self.blobs.setdefault(blob, {})
+        paths[path] = data
+        if len(paths) == 1:
+            self.add_totals(data, 1)
+
+    def get_file_data(self) -> typing.List[FileData]:
+        return [FileData(self.languages[lang], lang=lang) for lang in self.languages]
+
+    def get_aggregated_data(self) -> AggregatedData:
+        aggregated = AggregatedData(
+            {'blank': 0, 'comment': 0, 'code': 0, 'nFiles': 0})
+        for lang in self.languages:
+            aggregated.add(AggregatedData(self.languages[lang]))
+        return aggregated
+
+
+def collect_commits_data_incrementally(commits: typing.List[Commit], cache=None, counter=None, on_commit_done=None):
+    """
+        Sets the `cloc` data of every commit in `commits` walking the history from the oldest commit
+
+        For each commit only the files changed since the previous one (found with `git diff-tree`)
+        are counted again (or taken from `cache`), while the others are taken from a `RunningCounts` table.
+        `commits` must be in `git log` order (newest first) and they are updated in place.
+        `counter` and `on_commit_done` have the same meaning of `collect_commits_data`
+    """
+    for commit in iterate_commits_data_incrementally(reversed(commits), len(commits), cache=cache, counter=counter):
+        if on_commit_done is not None:
+            on_commit_done(commit)
+
+
+def iterate_commits_data_incrementally(commits: typing.Iterable[Commit], total: int, cache=None, counter=None) -> typing.Iterator[Commit]:
+    """
+        Same of `collect_commits_data_incrementally`, but `commits` must be ordered from the oldest
+        to the newest (and it can be a generator of `total` commits) and each commit is yielded
+        as soon as its data is ready
+    """
+    counts = RunningCounts()
+    previous = get_empty_tree_hash()
+    bar = progressbar.ProgressBar(maxval=total).start()
+    for index, commit in enumerate(commits):
+        with PROFILER.commit(commit.commitHash) as details:
+            changed = get_changed_files(previous, commit.commitHash)
+            to_count = []
+            for status, path, blob in changed:
+                counts.remove_file(path)
+                if status != 'D':
+                    to_count.append((path, blob))
+            details['changed'] = len(changed)
+
+            counted = get_cloc_data_from_blobs(
+                commit.commitHash, to_count, cache=cache, counter=counter)
+            for path, blob in to_count:
+                if path in counted:
+                    counts.set_file(path, blob, counted[path])
+
+            commit.__set_file_data__(counts.get_file_data())
+            commit.__set_aggregated_data__(counts.get_aggregated_data())
+        previous = commit.commitHash
+        bar.update(index + 1)
+        yield commit
+    bar.finish()
@@ -0,0 +1,26 @@
+from absl import app, flags
+
+from .model.src.repo_history import parse_repo_history
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('json_file', None,
+                    'The `repo_history.json` file written by an old execution')
+flags.DEFINE_string('output_file', None,
+                    'The binary file to write, that can be passed to `--input_file`')
+flags.mark_flag_as_required('json_file')
+flags.mark_flag_as_required('output_file')
+
+
+def main(args):
+    """
+        Converts a history written as JSON to the binary format
+    """
+    repo_history = parse_repo_history(FLAGS.json_file)
+    repo_history.write_binary(FLAGS.output_file)
+    print(
+        f"Wrote {len(repo_history.get_columnar())} commits to {FLAGS.output_file}")
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,157 @@
+import collections
+import fnmatch
+import os
+import typing
+
+from .git_reader import SUBMODULE_MODE, SYMLINK_MODE, TREE_MODE, get_git_reader
+from .model.src.filedata import FileData
+from .profiler import PROFILER
+from .utilities import get_cloc_data_from_blobs
+
+# order of the values of the totals kept for each language
+TOTAL_FIELDS = ['nFiles', 'blank', 'comment', 'code']
+
+
+def split_pattern(pattern: str) -> typing.List[str]:
+    """
+        Returns the components of the directory pattern `pattern` (e.g. `services/*`)
+    """
+    return [part for part in pattern.strip('/').split('/') if part != '']
+
+
+def matches_pattern(parts: typing.Sequence[str], pattern: typing.List[str]) -> bool:
+    """
+        Checks if the directory made of the components `parts` matches the components of `pattern`,
+        where each `*` matches a single component only
+    """
+    return len(parts) == len(pattern) and all(fnmatch.fnmatchcase(part, pattern_part)
+                                              for part, pattern_part in zip(parts, pattern))
+
+
+class DirectoryCounter(object):
+    """
+        Counts the lines of the directories of a commit whose path matches one of `patterns`
+        (e.g. `services/*` for each directory inside `services`), in the repository in the current directory
+
+        The totals of every tree are remembered by the hash of the tree, which depends only on its
+        content: a directory that didn't change since an already counted commit is never walked again,
+        and inside a changed one only the changed subtrees are walked.
+        The directories matching the patterns are remembered the same way (see `find_directories`).
+        The files are counted by `counter` through `cache`, like `get_cloc_data_from_blobs` does, and the
+        data of each `(blob, name)` pair is also kept in memory, so it's counted once per run.
+        Only the last `max_cached_trees` trees are remembered
+    """
+
+    def __init__(self, patterns: typing.List[str], cache=None, counter=None, max_cached_trees=100000):
+        self.patterns = [split_pattern(pattern) for pattern in patterns]
+        self.depth = max([len(pattern) for pattern in self.patterns], default=0)
+        self.cache = cache
+        self.counter = counter
+        self.max_cached_trees = max_cached_trees
+        # tree hash -> {language: [nFiles, blank, comment, code]}
+        self.tree_totals = collections.OrderedDict()
+        # (tree hash, path components) -> ((path, tree), ...) of the matching directories inside it
+        self.tree_directories = collections.OrderedDict()
+        # (blob, name) -> (language, blank, comment, code), `None` if the file isn't counted
+        self.files = {}
+
+    def find_directories(self, reader, tree: str, parts: typing.Tuple[str, ...] = ()) -> typing.Tuple[typing.Tuple[str, str], ...]:
+        """
+            Returns the `(path, tree)` pairs of the directories inside `tree` that match one of the patterns,
+            where `parts` are the components of the path of `tree`
+
+            The pairs are remembered by the hash of the tree and its path, so the trees that didn't change
+            since an already counted commit (the root one included) aren't read again
+        """
+        key = (tree, parts)
+        if key in self.tree_directories:
+            self.tree_directories.move_to_end(key)
+            return self.tree_directories[key]
+
+        directories = []
+        for mode, name, object_hash in reader.read_tree(tree):
+            if mode != TREE_MODE:
+                continue
+            subtree_parts = parts + (name,)
+            if any(matches_pattern(subtree_parts, pattern) for pattern in self.patterns):
+                directories.append(('/'.join(subtree_parts), object_hash))
+            if len(subtree_parts) < self.depth:
+                directories += self.find_directories(
+                    reader, object_hash, subtree_parts)
+
+        directories = tuple(directories)
+        self.tree_directories[key] = directories
+        if len(self.tree_directories) > self.max_cached_trees:
+            self.tree_directories.popitem(last=False)
+        return directories
+
+    def find_new_files(self, reader, tree: str, prefix: str, files: typing.List[typing.Tuple[str, str]]):
+        """
+            Adds to `files` the `(path, blob)` pairs inside `tree` that have never been counted,
+            skipping the subtrees whose totals are already known
+        """
+        if tree in self.tree_totals:
+            return
+        for mode, name, object_hash in reader.read_tree(tree):
+            if mode == TREE_MODE:
+                self.find_new_files(reader, object_hash,
+                                    f"{prefix}{name}/", files)
+            elif mode not in [SYMLINK_MODE, SUBMODULE_MODE] and (object_hash, name) not in self.files:
+                files.append((f"{prefix}{name}", object_hash))
+
+    def get_tree_totals(self, reader, tree: str) -> typing.Dict[str, typing.List[int]]:
+        """
+            Returns the totals of each language inside `tree`, whose files must have been counted
+        """
+        if tree in self.tree_totals:
+            self.tree_totals.move_to_end(tree)
+            return self.tree_totals[tree]
+
+        totals = {}
+        for mode, name, object_hash in reader.read_tree(tree):
+            if mode == TREE_MODE:
+                for lang, values in self.get_tree_totals(reader, object_hash).items():
+                    lang_totals = totals.setdefault(lang, [0] * len(TOTAL_FIELDS))
+                    for index, value in enumerate(values):
+                        lang_totals[index] += value
+            elif mode not in [SYMLINK_MODE, SUBMODULE_MODE]:
+                data = self.files.get((object_hash, name))
+                if data is None:
+                    continue
+                lang, blank, comment, code = data
+                lang_totals = totals.setdefault(lang, [0] * len(TOTAL_FIELDS))
+                lang_totals[0] += 1
+                lang_totals[1] += blank
+                lang_totals[2] += comment
+                lang_totals[3] += code
+
+        self.tree_totals[tree] = totals
+        if len(self.tree_totals) > self.max_cached_trees:
+            self.tree_totals.popitem(last=False)
+        return totals
+
+    def count(self, commit_id: str) -> typing.Dict[str, typing.List[FileData]]:
+        """
+            Returns the data of each language of each directory of `commit_id` that matches the patterns,
+            keyed by the path of the directory
+        """
+        with PROFILER.stage('directories') as details:
+            reader = get_git_reader()
+            directories = self.find_directories(
+                reader, reader.get_tree_hash(commit_id))
+
+            files = []
+            for path, tree in directories:
+                self.find_new_files(reader, tree, f"{path}/", files)
+            details['files'] = len(files)
+            if len(files) > 0:
+                counted = get_cloc_data_from_blobs(
+                    commit_id, files, cache=self.cache, counter=self.counter)
+                for path, blob in files:
+                    data = counted.get(path)
+                    self.files[(blob, os.path.basename(path))] = None if data is None else (
+                        data['language'], data['blank'], data['comment'], data['code'])
+
+            return {path: [FileData(dict(zip(TOTAL_FIELDS, values)), lang=lang)
+                           for lang, values in self.get_tree_totals(reader, tree).items()]
+                    for path, tree in directories}
@@ -0,0 +1,91 @@
+import numpy as np
+
+METHODS = ['lttb', 'minmax']
+
+
+def get_numeric_x(x_values: np.ndarray) -> np.ndarray:
+    """
+        Returns `x_values` as floats, converting the dates to seconds
+    """
+    if np.issubdtype(x_values.dtype, np.datetime64):
+        return x_values.astype('datetime64[s]').astype(np.int64).astype(float)
+    return x_values.astype(float)
+
+
+def lttb(x_values: np.ndarray, y_values: np.ndarray, points: int) -> np.ndarray:
+    """
+        Picks `points` points of the series with the largest-triangle-three-buckets algorithm:
+        the first and the last points are kept, the others are split in `points - 2` buckets and from
+        each bucket it keeps the point that makes the largest triangle with the point kept from the
+        previous bucket and the average of the next one
+
+        Returns the sorted indexes of the points to keep
+    """
+    length = len(y_values)
+    if points >= length or points < 3:
+        return np.arange(length)
+    x = get_numeric_x(x_values)
+    y = y_values.astype(float)
+    edges = np.linspace(1, length - 1, points - 1).astype(np.int64)
+
+    indexes = np.empty(points, dtype=np.int64)
+    indexes[0] = 0
+    indexes[-1] = length - 1
+    selected = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else length
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        areas = np.abs((x[selected] - next_x) * (y[start:end] - y[selected]) -
+                       (x[selected] - x[start:end]) * (next_y - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indexes[bucket + 1] = selected
+    return indexes
+
+
+def first_index_of_groups(mask: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+        Returns, for every group that has one, the index of the first `True` value of `mask` in it.
+        The items of the same group must be consecutive
+    """
+    candidates = np.flatnonzero(mask)
+    candidate_groups = groups[candidates]
+    return candidates[np.append(True, candidate_groups[1:] != candidate_groups[:-1])]
+
+
+def min_max_envelope(x_values: np.ndarray, y_values: np.ndarray, points: int) -> np.ndarray:
+    """
+        Splits the range of `x_values` (which must be sorted) in `points // 2` columns of the same width
+        and keeps the minimum and the maximum of each column, plus the first and the last points,
+        so that every spike of the series is still visible
+
+        Returns the sorted indexes of the points to keep
+    """
+    length = len(y_values)
+    if points >= length or points < 2:
+        return np.arange(length)
+    x = get_numeric_x(x_values)
+    columns = points // 2
+    width = max(x[-1] - x[0], 1)
+    groups = np.minimum(((x - x[0]) / width * columns).astype(np.int64), columns - 1)
+    starts = np.flatnonzero(np.append(True, groups[1:] != groups[:-1]))
+    sizes = np.diff(np.append(starts, length))
+
+    minimums = np.repeat(np.minimum.reduceat(y_values, starts), sizes)
+    maximums = np.repeat(np.maximum.reduceat(y_values, starts), sizes)
+    return np.unique(np.concatenate([[0, length - 1],
+                                     first_index_of_groups(y_values == minimums, groups),
+                                     first_index_of_groups(y_values == maximums, groups)]))
+
+
+def downsample(x_values: np.ndarray, y_values: np.ndarray, points: int, method='lttb') -> np.ndarray:
+    """
+        Returns the sorted indexes of about `points` points of the series that keep its shape,
+        picked with `method` (`lttb` or `minmax`). If `points` is 0 all the points are kept
+    """
+    if points == 0:
+        return np.arange(len(y_values))
+    if method == 'minmax':
+        return min_max_envelope(x_values, y_values, points)
+    return lttb(x_values, y_values, points)
@@ -0,0 +1,190 @@
+import collections
+import os
+import subprocess
+import threading
+import typing
+
+# modes of the tree entries that are not regular files
+TREE_MODE = '40000'
+SYMLINK_MODE = '120000'
+SUBMODULE_MODE = '160000'
+
+
+class GitObjectReader(object):
+    """
+        Reads the objects of the repository in `folder` through a single `git cat-file --batch`
+        process that stays open until `close` is called
+
+        Trees are parsed in python, so listing the files of a commit or comparing two commits
+        doesn't spawn any other process. The file lists of the last `max_cached_trees` subtrees
+        are kept in memory, since most of them don't change between two commits
+    """
+
+    def __init__(self, folder: str = None, max_cached_trees=4096):
+        self.process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=folder,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.max_cached_trees = max_cached_trees
+        self.cached_trees = collections.OrderedDict()
+
+    def read_object(self, object_id: str) -> typing.Tuple[str, str, bytes]:
+        """
+            Reads the object `object_id`, which can be any revision understood by git
+
+            Returns the `(hash, type, content)` tuple of the object, or `None` if it doesn't exist
+        """
+        self.process.stdin.write(f"{object_id}\n".encode('utf-8'))
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().decode('utf-8').split()
+        if len(header) != 3:
+            # the object is missing
+            return None
+        content = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1)
+        return (header[0], header[1], content)
+
+    def read_blobs(self, blobs: typing.List[str]) -> typing.Dict[str, bytes]:
+        """
+            Returns a map that has the hash of each blob in `blobs` as key and its content as value
+        """
+        contents = {}
+        for blob in blobs:
+            if blob in contents:
+                continue
+            read = self.read_object(blob)
+            if read is not None:
+                contents[blob] = read[2]
+        return contents
+
+    def get_tree_hash(self, commit_id: str) -> str:
+        """
+            Returns the hash of the root tree of `commit_id`
+
+            Raises `ValueError` if `commit_id` doesn't exist
+        """
+        read = self.read_object(f"{commit_id}^{{tree}}")
+        if read is None:
+            raise ValueError(f"Commit {commit_id} not found")
+        return read[0]
+
+    def read_tree(self, tree: str) -> typing.List[typing.Tuple[str, str, str]]:
+        """
+            Returns the `(mode, name, hash)` entries of the tree object `tree`
+
+            Raises `ValueError` if `tree` doesn't exist
+        """
+        read = self.read_object(tree)
+        if read is None:
+            raise ValueError(f"Tree {tree} not found")
+        object_id, _, content = read
+        hash_length = len(object_id) // 2
+        entries = []
+        position = 0
+        while position < len(content):
+            space = content.index(b' ', position)
+            end_of_name = content.index(b'\0', space)
+            mode = content[position:space].decode('utf-8')
+            name = content[space + 1:end_of_name].decode('utf-8',
+                                                         errors='surrogateescape')
+            object_hash = content[end_of_name + 1:end_of_name + 1 + hash_length].hex()
+            entries.append((mode, name, object_hash))
+            position = end_of_name + 1 + hash_length
+        return entries
+
+    def list_files(self, tree: str) -> typing.Tuple[typing.Tuple[str, str], ...]:
+        """
+            Returns the `(path, blob)` pairs of all the files contained in the tree `tree`,
+            with the paths relative to it. Symbolic links and submodules are ignored
+
+            The tuple returned is the one that is cached, so it can't be changed by the callers
+        """
+        if tree in self.cached_trees:
+            self.cached_trees.move_to_end(tree)
+            return self.cached_trees[tree]
+
+        files = []
+        for mode, name, object_hash in self.read_tree(tree):
+            if mode == TREE_MODE:
+                files += [(f"{name}/{path}", blob)
+                          for path, blob in self.list_files(object_hash)]
+            elif mode not in [SYMLINK_MODE, SUBMODULE_MODE]:
+                files.append((name, object_hash))
+
+        files = tuple(files)
+        self.cached_trees[tree] = files
+        if len(self.cached_trees) > self.max_cached_trees:
+            self.cached_trees.popitem(last=False)
+        return files
+
+    def diff_trees(self, old_tree: str, new_tree: str, prefix='') -> typing.List[typing.Tuple[str, str, str]]:
+        """
+            Compares the trees `old_tree` and `new_tree` (any of them can be `None`), skipping
+            the subtrees with the same hash
+
+            Returns the same `(status, path, blob)` tuples of `plotter.utilities.get_changed_files`
+        """
+        if old_tree == new_tree:
+            return []
+        old_entries = {} if old_tree is None else {
+            name: (mode, object_hash) for mode, name, object_hash in self.read_tree(old_tree)}
+        new_entries = {} if new_tree is None else {
+            name: (mode, object_hash) for mode, name, object_hash in self.read_tree(new_tree)}
+
+        changed = []
+        for name in sorted(set(old_entries).union(new_entries)):
+            old_mode, old_hash = old_entries.get(name, (None, None))
+            new_mode, new_hash = new_entries.get(name, (None, None))
+            if old_hash == new_hash and old_mode == new_mode:
+                continue
+            path = f"{prefix}{name}"
+            old_subtree = old_hash if old_mode == TREE_MODE else None
+            new_subtree = new_hash if new_mode == TREE_MODE else None
+            if old_subtree is not None or new_subtree is not None:
+                changed += self.diff_trees(old_subtree,
+                                           new_subtree, prefix=f"{path}/")
+            old_is_file = old_mode is not None and old_mode not in [
+                TREE_MODE, SYMLINK_MODE, SUBMODULE_MODE]
+            new_is_file = new_mode is not None and new_mode not in [
+                TREE_MODE, SYMLINK_MODE, SUBMODULE_MODE]
+            if new_is_file:
+                changed.append(('M' if old_is_file else 'A', path, new_hash))
+            elif old_is_file:
+                changed.append(('D', path, old_hash))
+        return changed
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+
+
+local_readers = threading.local()
+open_readers = []
+open_readers_lock = threading.Lock()
+
+
+def get_git_reader() -> GitObjectReader:
+    """
+        Returns the `GitObjectReader` of the current thread for the repository in the current directory,
+        creating it the first time it's requested
+    """
+    folder = os.getcwd()
+    if not hasattr(local_readers, 'readers'):
+        local_readers.readers = {}
+    if folder not in local_readers.readers or local_readers.readers[folder].process.poll() is not None:
+        reader = GitObjectReader(folder)
+        local_readers.readers[folder] = reader
+        with open_readers_lock:
+            open_readers.append(reader)
+    return local_readers.readers[folder]
+
+
+def close_git_readers():
+    """
+        Closes the `git cat-file` processes of all the readers created by `get_git_reader`
+    """
+    with open_readers_lock:
+        for reader in open_readers:
+            reader.close()
+        open_readers.clear()
+    if hasattr(local_readers, 'readers'):
+        local_readers.readers = {}
@@ -0,0 +1,163 @@
+import os
+import typing
+
+
+class Language(object):
+    """
+        Describes how to count the lines of a language
+
+        `line_comments` are the markers that start a comment that ends with the line,
+        `block_comments` are the `(start, end)` markers of the comments that can span multiple lines
+    """
+
+    def __init__(self, name: str, extensions=[], filenames=[], line_comments=[], block_comments=[]):
+        self.name = name
+        self.extensions = extensions
+        self.filenames = filenames
+        self.line_comments = line_comments
+        self.block_comments = block_comments
+
+
+C_STYLE = {'line_comments': ['//'], 'block_comments': [('/*', '*/')]}
+HASH_STYLE = {'line_comments': ['#']}
+XML_STYLE = {'block_comments': [('<!--', '-->')]}
+
+# the names are the same used by `cloc`, so that the two counters can be compared
+LANGUAGES = [
+    Language('Python', ['py', 'pyw', 'pyi'], line_comments=['#'],
+             block_comments=[('"""', '"""'), ("'''", "'''")]),
+    Language('C', ['c'], **C_STYLE),
+    Language('C/C++ Header', ['h'], **C_STYLE),
+    Language('C++', ['cpp', 'cc', 'cxx', 'c++', 'hpp', 'hh', 'hxx'], **C_STYLE),
+    Language('C#', ['cs'], **C_STYLE),
+    Language('Objective-C', ['m'], **C_STYLE),
+    Language('Java', ['java'], **C_STYLE),
+    Language('Kotlin', ['kt', 'kts'], **C_STYLE),
+    Language('Scala', ['scala'], **C_STYLE),
+    Language('Swift', ['swift'], **C_STYLE),
+    Language('Dart', ['dart'], **C_STYLE),
+    Language('Go', ['go'], **C_STYLE),
+    Language('Rust', ['rs'], **C_STYLE),
+    Language('JavaScript', ['js', 'mjs', 'cjs'], **C_STYLE),
+    Language('JSX', ['jsx'], **C_STYLE),
+    Language('TypeScript', ['ts', 'tsx'], **C_STYLE),
+    Language('PHP', ['php'], line_comments=['//', '#'],
+             block_comments=[('/*', '*/')]),
+    Language('CSS', ['css'], block_comments=[('/*', '*/')]),
+    Language('SCSS', ['scss'], **C_STYLE),
+    Language('Sass', ['sass'], **C_STYLE),
+    Language('Less', ['less'], **C_STYLE),
+    Language('Groovy', ['groovy', 'gradle'], **C_STYLE),
+    Language('Protocol Buffers', ['proto'], **C_STYLE),
+    Language('Ruby', ['rb', 'rake'], filenames=['Rakefile', 'Gemfile'], line_comments=['#'],
+             block_comments=[('=begin', '=end')]),
+    Language('Perl', ['pl', 'pm'], **HASH_STYLE),
+    Language('Bourne Shell', ['sh'], **HASH_STYLE),
+    Language('Bourne Again Shell', ['bash'], **HASH_STYLE),
+    Language('zsh', ['zsh'], **HASH_STYLE),
+    Language('PowerShell', ['ps1', 'psm1'], line_comments=['#'],
+             block_comments=[('<#', '#>')]),
+    Language('R', ['r', 'R'], **HASH_STYLE),
+    Language('Elixir', ['ex', 'exs'], **HASH_STYLE),
+    Language('YAML', ['yml', 'yaml'], **HASH_STYLE),
+    Language('TOML', ['toml'], **HASH_STYLE),
+    Language('INI', ['ini'], line_comments=[';', '#']),
+    Language('CMake', ['cmake'], filenames=[
+             'CMakeLists.txt'], **HASH_STYLE),
+    Language('make', ['mk', 'mak'], filenames=[
+             'Makefile', 'makefile', 'GNUmakefile'], **HASH_STYLE),
+    Language('Dockerfile', ['dockerfile'], filenames=[
+             'Dockerfile'], **HASH_STYLE),
+    Language('Erlang', ['erl', 'hrl'], line_comments=['%']),
+    Language('Haskell', ['hs'], line_comments=['--'],
+             block_comments=[('{-', '-}')]),
+    Language('Lua', ['lua'], line_comments=['--'],
+             block_comments=[('--[[', ']]')]),
+    Language('SQL', ['sql'], line_comments=['--'],
+             block_comments=[('/*', '*/')]),
+    Language('HTML', ['html', 'htm'], **XML_STYLE),
+    Language('XML', ['xml'], **XML_STYLE),
+    Language('Vuejs Component', ['vue'], line_comments=['//'],
+             block_comments=[('<!--', '-->'), ('/*', '*/')]),
+    Language('Markdown', ['md', 'markdown'], **XML_STYLE),
+    Language('JSON', ['json']),
+]
+
+LANGUAGES_BY_EXTENSION = {
+    extension: language for language in LANGUAGES for extension in language.extensions}
+LANGUAGES_BY_FILENAME = {
+    filename: language for language in LANGUAGES for filename in language.filenames}
+
+
+def get_language(path: str) -> Language:
+    """
+        Returns the `Language` of the file `path`, based on its name or on its extension
+
+        If the language is not known, returns `None`
+    """
+    name = os.path.basename(path)
+    if name in LANGUAGES_BY_FILENAME:
+        return LANGUAGES_BY_FILENAME[name]
+    extension = os.path.splitext(name)[1][1:]
+    if extension in LANGUAGES_BY_EXTENSION:
+        return LANGUAGES_BY_EXTENSION[extension]
+    return LANGUAGES_BY_EXTENSION.get(extension.lower())
+
+
+def count_lines(content: str, language: Language) -> typing.Tuple[int, int, int]:
+    """
+        Counts the lines of `content`, written in `language`
+
+        A line is a comment line if it contains only comments, a code line if it contains any code.
+        Comment markers inside strings are not recognized
+
+        Returns the `(blank, comment, code)` tuple
+    """
+    blank = comment = code = 0
+    block_end = None
+    for line in content.splitlines():
+        line = line.strip()
+        if len(line) == 0:
+            if block_end is None:
+                blank += 1
+            else:
+                comment += 1
+            continue
+
+        has_code = False
+        while len(line) > 0:
+            if block_end is not None:
+                end = line.find(block_end)
+                if end == -1:
+                    line = ''
+                else:
+                    line = line[end + len(block_end):].strip()
+                    block_end = None
+                continue
+
+            if any(line.startswith(marker) for marker in language.line_comments) and \
+                    not any(line.startswith(start) for start, _ in language.block_comments):
+                line = ''
+                continue
+
+            for start, end in language.block_comments:
+                if line.startswith(start):
+                    block_end = end
+                    line = line[len(start):]
+                    break
+            else:
+                # the line contains some code, so only a block comment opened after it matters
+                has_code = True
+                opened = [(line.find(start), start, end) for start, end in language.block_comments
+                          if line.find(start) != -1]
+                if len(opened) == 0:
+                    line = ''
+                else:
+                    index, start, end = min(opened)
+                    line = line[index:]
+
+        if has_code:
+            code += 1
+        else:
+            comment += 1
+    return (blank, comment, code)
@@ -0,0 +1,203 @@
+import collections
+import queue
+import threading
+import time
+import typing
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from .collector import iterate_commits_data
+from .model.src.commit import Commit
+from .plot import FIELD_LABELS, label_axes
+from .sampling import interpolate_unmeasured, is_measured
+
+
+def get_coarse_to_fine_order(count: int) -> typing.List[int]:
+    """
+        Returns the indexes from `0` to `count - 1` from coarse to fine: the two endpoints, then the
+        midpoint, then the quarter-points and so on, so that the first indexes of the order are
+        always spread over the whole range
+    """
+    if count <= 2:
+        return list(range(count))
+    order = [0, count - 1]
+    intervals = collections.deque([(0, count - 1)])
+    while len(intervals) > 0:
+        start, end = intervals.popleft()
+        if end - start < 2:
+            continue
+        middle = (start + end) // 2
+        order.append(middle)
+        intervals.append((start, middle))
+        intervals.append((middle, end))
+    return order
+
+
+class LivePlot(object):
+    """
+        Window with the chart of the lines of code of all the languages of a history that is still
+        being collected, where `dates` are the dates of all its commits, sorted
+
+        The line and the status text are animated: each `update` redraws only them over a copy of
+        the rest of the chart (blitting), and the whole chart is drawn again only when the values
+        don't fit the y axis anymore, which grows by `headroom` each time.
+        The collection should stop once `stopped` is set, when the user presses `q` or `escape`
+        or closes the window
+    """
+
+    def __init__(self, dates: np.ndarray, headroom=1.2):
+        self.headroom = headroom
+        self.stopped = False
+        self.closed = False
+        self.background = None
+        self.figure, self.axes = plt.subplots(figsize=(12, 6))
+        self.canvas = self.figure.canvas
+        self.line, = self.axes.plot([], [], linestyle='dashed', marker='.', label='All', animated=True)
+        self.status = self.axes.text(0.01, 0.98, '', transform=self.axes.transAxes,
+                                     verticalalignment='top', animated=True)
+        if len(dates) > 1 and dates[-1] > dates[0]:
+            self.axes.set_xlim(dates[0], dates[-1])
+        self.axes.set_ylim(0, 1)
+        label_axes(self.axes, dates, FIELD_LABELS['code'])
+
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.canvas.mpl_connect('key_press_event', self.on_key_press)
+        self.canvas.mpl_connect('close_event', self.on_close)
+        plt.show(block=False)
+        self.canvas.draw()
+
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_animated()
+
+    def on_key_press(self, event):
+        if event.key in ['q', 'escape']:
+            self.stopped = True
+
+    def on_close(self, event):
+        self.stopped = True
+        self.closed = True
+
+    def draw_animated(self):
+        self.axes.draw_artist(self.line)
+        self.axes.draw_artist(self.status)
+
+    def update(self, dates: np.ndarray, values: np.ndarray, status: str):
+        """
+            Draws the line through the `values` (`nan` for the commits not counted yet) of `dates`
+            and shows `status`
+        """
+        if self.closed:
+            return
+        counted = ~np.isnan(values)
+        self.line.set_data(dates[counted], values[counted])
+        self.status.set_text(status)
+        top = np.max(values[counted], initial=0)
+        if top > self.axes.get_ylim()[1]:
+            self.axes.set_ylim(0, top * self.headroom)
+            self.canvas.draw()
+        elif self.background is not None:
+            self.canvas.restore_region(self.background)
+            self.draw_animated()
+            self.canvas.blit(self.figure.bbox)
+        self.canvas.flush_events()
+
+    def wait(self, seconds: float):
+        """
+            Handles the events of the window for `seconds`
+        """
+        if self.closed:
+            time.sleep(seconds)
+        else:
+            self.canvas.start_event_loop(seconds)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            plt.close(self.figure)
+
+
+def collect_commits_data_live(commits: typing.List[Commit], jobs=1, cache=None, counter=None,
+                              on_commit_done=None, refresh_interval=0.2) -> typing.List[int]:
+    """
+        Calculates the data of `commits` while their history is drawn in a `LivePlot`, refined
+        every `refresh_interval` seconds with the commits counted meanwhile
+
+        The commits are counted from coarse to fine (see `get_coarse_to_fine_order`) by a background
+        thread, with `iterate_commits_data`, so the shape of the whole history appears after a few
+        commits and then gets more detailed. The collection stops when every commit is counted or,
+        earlier, when the user stops it from the window or with Ctrl+C: the commits already being
+        counted are finished, then the ones not counted are interpolated (see `interpolate_unmeasured`).
+        The commits already measured (e.g. taken from the commit store) are drawn from the start.
+
+        `commits` must be in `git log` order (newest first) and they are updated in place.
+        `on_commit_done` is called with each commit counted, in the calling thread.
+        The other parameters have the same meaning of `collect_commits_data`.
+        Returns the indexes of the commits of `commits` that have data, in `git log` order
+    """
+    if len(commits) == 0:
+        return []
+    ordered = list(reversed(commits))
+    indexes = {commit.commitHash: index for index, commit in enumerate(ordered)}
+    dates = np.array([commit.date for commit in ordered], dtype='datetime64[s]')
+    values = np.array([commit.aggregated.code if is_measured(commit) else np.nan for commit in ordered],
+                      dtype=np.float64)
+    to_count = [index for index in get_coarse_to_fine_order(len(ordered))
+                if not is_measured(ordered[index])]
+
+    results = queue.Queue()
+    stop = threading.Event()
+    errors = []
+
+    def collect():
+        try:
+            # no commit is started once `stop` is set, the ones already started are still yielded
+            for commit in iterate_commits_data((ordered[index] for index in to_count if not stop.is_set()),
+                                               len(to_count), jobs=jobs, cache=cache, counter=counter):
+                results.put(commit)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            results.put(None)
+
+    plot = LivePlot(dates)
+    collector = threading.Thread(target=collect, daemon=True)
+    collector.start()
+    counted = 0
+    finished = False
+    try:
+        while not finished:
+            try:
+                plot.wait(refresh_interval)
+            except KeyboardInterrupt:
+                plot.stopped = True
+            if plot.stopped:
+                stop.set()
+            while True:
+                try:
+                    commit = results.get_nowait()
+                except queue.Empty:
+                    break
+                if commit is None:
+                    finished = True
+                    break
+                values[indexes[commit.commitHash]] = commit.aggregated.code
+                if on_commit_done is not None:
+                    on_commit_done(commit)
+                counted += 1
+            state = "stopping" if stop.is_set() else "press q or close the window to stop"
+            plot.update(dates, values, f"{counted} of {len(to_count)} commits counted, {state}")
+    finally:
+        stop.set()
+        collector.join()
+        plot.close()
+    if len(errors) > 0:
+        raise errors[0]
+
+    measured = interpolate_unmeasured(ordered)
+    print(f"Measured {len(measured)} of {len(ordered)} commits")
+    if len(measured) == 0:
+        return []
+    # `ordered` is reversed, and only the commits between the first and the last measured ones have data
+    return list(range(len(ordered) - 1 - measured[-1], len(ordered) - measured[0]))
@@ -0,0 +1,39 @@
+import os
+
+from absl import app, flags
+
+from .__main__ import write_repo_history
+from .shards import merge_shards, read_shards
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string('shards_dir', None,
+                    'The folder that contains the shards written with `--shard` or `--commit_range`')
+flags.mark_flag_as_required('shards_dir')
+
+
+def main(args):
+    if FLAGS.output_folder is None:
+        print("The merge writes the history to the folder defined with --output_folder flag")
+        exit(-1)
+    if not os.path.exists(FLAGS.shards_dir):
+        print(f"Folder {FLAGS.shards_dir} doesn't exists")
+        exit(-1)
+    if not os.path.exists(FLAGS.output_folder):
+        os.makedirs(FLAGS.output_folder)
+
+    shards = read_shards(FLAGS.shards_dir)
+    print(f"Read {len(shards)} shards")
+    repo_history, problems = merge_shards(shards)
+    if len(problems) > 0:
+        print("The shards can't be merged:")
+        for problem in problems:
+            print(f"- {problem}")
+        exit(-1)
+
+    write_repo_history(repo_history, FLAGS.output_folder, 'repo_history')
+    print(f"Merged {len(repo_history.commits)} commits into {FLAGS.output_folder}")
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+
+def get_repository_name(repository: str) -> str:
+    """
+        Returns the name of `repository`, the last part of its URL or path without the `.git` suffix
+    """
+    name = os.path.basename(repository.rstrip('/'))
+    if name.endswith('.git'):
+        name = name[:-len('.git')]
+    return name
+
+
+def get_mirror_path(repository: str, mirror_dir: str) -> str:
+    """
+        Returns the folder inside `mirror_dir` of the mirror of `repository`
+
+        The name is made of the last part of the URL, to be readable, and of a hash of the whole URL,
+        so that two repositories with the same name don't share the same mirror
+    """
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', get_repository_name(repository))
+    digest = hashlib.sha1(repository.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(os.path.abspath(os.path.expanduser(mirror_dir)), f"{name}-{digest}.git")
+
+
+def update_mirror(repository: str, mirror_dir: str) -> str:
+    """
+        Makes sure that `mirror_dir` contains an up-to-date bare mirror of `repository`: the mirror is
+        cloned the first time and then it only fetches the new objects and refs
+
+        Returns the folder of the mirror, or `None` if it can't be cloned. If it exists but it can't
+        be updated, the old refs are kept
+    """
+    path = get_mirror_path(repository, mirror_dir)
+    if os.path.exists(path):
+        print("Updating mirror...")
+        if subprocess.call(['git', '--git-dir', path, 'fetch', '--prune', '--quiet']) != 0:
+            print("Failed to update the mirror, continuing with the local commits")
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    print("Cloning repository...")
+    # clones into a temporary folder of its own first, so an interrupted clone doesn't leave a broken mirror
+    # and the processes cloning the same repository at the same time (e.g. the shards) don't share it
+    partial = tempfile.mkdtemp(prefix=f"{os.path.basename(path)}.", suffix='.partial',
+                               dir=os.path.dirname(path))
+    try:
+        if subprocess.call(['git', 'clone', '--mirror', '--quiet', repository, partial]) != 0:
+            return path if os.path.exists(path) else None
+        try:
+            os.rename(partial, path)
+        except OSError:
+            if not os.path.exists(path):
+                raise
+            # another process created the mirror first, its clone is used instead
+    finally:
+        if os.path.exists(partial):
+            shutil.rmtree(partial, ignore_errors=True)
+    return path
+
+
+def resolve_branch(branch: str, folder: str = None) -> str:
+    """
+        Returns the hash of the commit that `branch` points to in the repository in `folder`
+        (the current directory by default), or `None` if it doesn't exist
+
+        Besides the names understood by git, it also looks for `branch` among the branches of
+        `origin`, so that the branches of a clone can be used without checking them out
+    """
+    for ref in [branch, f"refs/remotes/origin/{branch}"]:
+        p = subprocess.Popen(['git', 'rev-parse', '--verify', '--quiet', f"{ref}^{{commit}}"], cwd=folder,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, _ = p.communicate()
+        if p.returncode == 0:
+            return output.decode('utf-8').strip()
+    return None
@@ -0,0 +1,84 @@
+import json
+import struct
+import typing
+
+import numpy as np
+
+from .columnar import FIELDS, ColumnarHistory
+
+MAGIC = b'RPLTHIST'
+VERSION = 1
+# magic, version, number of commits, number of languages, width of the hashes, length of the metadata
+HEADER = struct.Struct('<8sIQIII')
+
+
+def is_binary_history(path: str) -> bool:
+    """
+        Checks if the file `path` has been written by `write_binary_history`
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_binary_history(path: str, columnar: ColumnarHistory, metadata: map):
+    """
+        Writes `columnar` to the file `path`
+
+        The file contains a fixed size header, the JSON encoded `metadata` (together with the languages)
+        and then the arrays of the commits one after the other, each one aligned to 8 bytes:
+        - the timestamps, as `int64` seconds since epoch
+        - the counts, as `int32` with shape `commits x languages x fields`
+        - the measured flags, as `uint8`
+        - the hashes, as fixed width ASCII strings
+    """
+    encoded_metadata = json.dumps(
+        dict(metadata, languages=columnar.languages, fields=FIELDS)).encode('utf-8')
+    encoded_metadata += b' ' * (-(HEADER.size + len(encoded_metadata)) % 8)
+    hash_width = max(columnar.hashes.dtype.itemsize, 1)
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(columnar), len(columnar.languages),
+                            hash_width, len(encoded_metadata)))
+        f.write(encoded_metadata)
+        f.write(columnar.timestamps.astype('<i8').tobytes())
+        f.write(columnar.counts.astype('<i4').tobytes())
+        measured = columnar.measured.astype(np.uint8).tobytes()
+        f.write(measured + b'\0' * (-len(measured) % 8))
+        f.write(columnar.hashes.astype(f'S{hash_width}').tobytes())
+
+
+def read_binary_history(path: str) -> typing.Tuple[ColumnarHistory, map]:
+    """
+        Reads a file written by `write_binary_history`
+
+        The arrays are memory-mapped, so they are read from disk only when they are accessed
+
+        Returns the `ColumnarHistory` and the metadata stored in the file
+    """
+    with open(path, 'rb') as f:
+        magic, version, commits, languages, hash_width, metadata_length = HEADER.unpack(
+            f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise Exception(f"{path} is not a supported binary history")
+        metadata = json.loads(f.read(metadata_length).decode('utf-8'))
+
+    offset = HEADER.size + metadata_length
+
+    def map_array(dtype, shape):
+        nonlocal offset
+        if np.prod(shape) == 0:
+            array = np.zeros(shape, dtype=dtype)
+        else:
+            array = np.memmap(path, dtype=dtype, mode='r',
+                              offset=offset, shape=shape)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset += size + (-size % 8)
+        return array
+
+    timestamps = map_array('<i8', (commits,)).view('datetime64[s]')
+    counts = map_array('<i4', (commits, languages, len(FIELDS)))
+    measured = map_array(np.bool_, (commits,))
+    hashes = map_array(f'S{hash_width}', (commits,))
+    columnar = ColumnarHistory(
+        timestamps, hashes, metadata['languages'], counts, measured)
+    return (columnar, metadata)
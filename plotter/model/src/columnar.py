@@ -0,0 +1,208 @@
+import array
+import datetime
+import typing
+
+import numpy as np
+
+from .aggregated import AggregatedData
+from .commit import Commit
+from .filedata import FileData
+
+FIELDS = ['nFiles', 'blank', 'comment', 'code']
+FIELD_INDEX = {field: index for index, field in enumerate(FIELDS)}
+ALL_LANGUAGES = 'All'
+
+
+class ColumnarHistory(object):
+    """
+        Stores the data of a list of commits in numpy arrays
+
+        - `timestamps` are the dates of the commits, as `datetime64[s]`
+        - `hashes` are the hashes of the commits, as fixed width bytes
+        - `counts` is a `commits x languages x fields` integer array, where the fields are the ones in `FIELDS`
+        - `measured` tells which commits have been counted and which ones have been interpolated
+
+        `language_index` maps each language to its index in the second dimension of `counts`
+    """
+
+    def __init__(self, timestamps: np.ndarray, hashes: np.ndarray, languages: typing.List[str], counts: np.ndarray, measured: np.ndarray):
+        self.timestamps = timestamps
+        self.hashes = hashes
+        self.languages = languages
+        self.language_index = {lang: index for index,
+                               lang in enumerate(languages)}
+        self.counts = counts
+        self.measured = measured
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def get_series(self, language: str, field='code') -> np.ndarray:
+        """
+            Returns the values of `field` for `language` at each commit, without copying them
+
+            If `language` is `ALL_LANGUAGES` returns the sum of all the languages,
+            if the language is not known returns an array of zeros
+        """
+        if language == ALL_LANGUAGES:
+            return self.get_total(field)
+        if language not in self.language_index:
+            return np.zeros(len(self), dtype=self.counts.dtype)
+        return self.counts[:, self.language_index[language], FIELD_INDEX[field]]
+
+    def get_total(self, field='code') -> np.ndarray:
+        """
+            Returns the sum of `field` over all the languages at each commit
+        """
+        return self.counts[:, :, FIELD_INDEX[field]].sum(axis=1)
+
+    def sum_languages(self, languages: typing.List[str], field='code') -> np.ndarray:
+        """
+            Returns the sum of `field` over `languages` at each commit
+        """
+        indexes = [self.language_index[lang]
+                   for lang in languages if lang in self.language_index]
+        return self.counts[:, indexes, FIELD_INDEX[field]].sum(axis=1)
+
+    def select(self, indexes) -> 'ColumnarHistory':
+        """
+            Returns a new `ColumnarHistory` with only the commits in `indexes`,
+            which can be a slice, a list of indexes or a boolean mask
+        """
+        return ColumnarHistory(self.timestamps[indexes], self.hashes[indexes], self.languages,
+                               self.counts[indexes], self.measured[indexes])
+
+    def between(self, start: datetime.datetime = None, end: datetime.datetime = None) -> 'ColumnarHistory':
+        """
+            Returns the commits done between `start` and `end` (both included, both optional)
+
+            The commits must be sorted by date
+        """
+        first = 0 if start is None else np.searchsorted(
+            self.timestamps, np.datetime64(to_utc(start), 's'), side='left')
+        last = len(self) if end is None else np.searchsorted(
+            self.timestamps, np.datetime64(to_utc(end), 's'), side='right')
+        return self.select(slice(first, last))
+
+    def get_dates(self) -> typing.List[datetime.datetime]:
+        return self.timestamps.astype(datetime.datetime).tolist()
+
+
+def to_utc(value: datetime.datetime) -> datetime.datetime:
+    """
+        Returns `value` as a datetime without timezone in UTC, like the dates of the commits,
+        converting it if it has a timezone
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def get_map_timestamp(data: map) -> int:
+    """
+        Returns the date of the commit map `data` (see `Commit.as_map`) as seconds since epoch,
+        the same value of its `datetime64[s]` timestamp
+    """
+    year, month, day = data['date'].split("-")
+    hour, minute, second = data['time'].split(":")
+    return int(datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+               .replace(tzinfo=datetime.timezone.utc).timestamp())
+
+
+def get_directory_totals(directories: typing.Dict[str, typing.List[map]]) -> typing.Dict[str, typing.List[int]]:
+    """
+        Sums the languages of each directory in `directories` (with the shape written by `Commit.as_map`),
+        returning the values of `FIELDS` of each directory
+    """
+    return {path: [sum(item[field] for item in directories[path]) for field in FIELDS]
+            for path in directories}
+
+
+def columnar_from_commits(commits: typing.List[Commit], directories=False) -> ColumnarHistory:
+    """
+        Builds a `ColumnarHistory` from a list of `Commit` objects, keeping their order
+
+        If `directories` is `True`, the directories of the commits (see `Commit.directoryData`) take
+        the place of the languages, each one with the sum of all its languages
+    """
+    if directories:
+        rows = [get_directory_totals({path: [data.as_map() for data in commit.directoryData[path]]
+                                      for path in commit.directoryData or {}})
+                for commit in commits]
+    else:
+        rows = [{data.lang: [data.numFiles, data.blank, data.comment, data.code]
+                 for data in commit.langData} for commit in commits]
+    languages = sorted(set(lang for row in rows for lang in row))
+    language_index = {lang: index for index, lang in enumerate(languages)}
+
+    counts = np.zeros((len(commits), len(languages), len(FIELDS)), dtype=np.int32)
+    for commit_index, row in enumerate(rows):
+        for lang in row:
+            counts[commit_index, language_index[lang]] = row[lang]
+
+    timestamps = np.array([commit.date for commit in commits],
+                          dtype='datetime64[s]')
+    hashes = np.array([commit.commitHash.encode('ascii')
+                      for commit in commits], dtype=np.bytes_)
+    measured = np.array([commit.measured for commit in commits], dtype=bool)
+    return ColumnarHistory(timestamps, hashes, languages, counts, measured)
+
+
+def columnar_from_maps(maps: typing.Iterable[map], directories=False) -> ColumnarHistory:
+    """
+        Builds a `ColumnarHistory` from the maps returned by `Commit.as_map`, keeping their order
+
+        The maps are consumed one at a time and only their numbers are kept, so `maps` can be
+        a generator over a file bigger than the memory.
+        If `directories` is `True`, the directories take the place of the languages like in `columnar_from_commits`
+    """
+    languages = {}
+    timestamps = array.array('q')
+    hashes = []
+    measured = array.array('b')
+    # (commit, language, nFiles, blank, comment, code) for every language of every commit
+    rows = array.array('q')
+    for data in maps:
+        commit = len(timestamps)
+        timestamps.append(get_map_timestamp(data))
+        hashes.append(data['hash'].encode('ascii'))
+        measured.append(data.get('measured', True))
+        if directories:
+            values = get_directory_totals(data.get('directories', {}))
+        else:
+            values = {item['lang']: [item[field] for field in FIELDS]
+                      for item in data['fileData']}
+        for lang in values:
+            if lang not in languages:
+                languages[lang] = len(languages)
+            rows.extend([commit, languages[lang]] + values[lang])
+
+    rows = np.frombuffer(rows, dtype=np.int64).reshape(-1, 2 + len(FIELDS))
+    counts = np.zeros((len(timestamps), len(languages), len(FIELDS)), dtype=np.int32)
+    counts[rows[:, 0], rows[:, 1]] = rows[:, 2:]
+    return ColumnarHistory(np.frombuffer(timestamps, dtype=np.int64).astype('datetime64[s]'),
+                           np.array(hashes, dtype=np.bytes_), list(languages.keys()), counts,
+                           np.frombuffer(measured, dtype=np.int8).astype(bool))
+
+
+def commits_from_columnar(columnar: ColumnarHistory) -> typing.List[Commit]:
+    """
+        Builds the `Commit` objects stored in `columnar`
+
+        Each commit gets a `FileData` for every language whose counts are not all zero
+    """
+    commits = []
+    for index, date in enumerate(columnar.get_dates()):
+        commit = Commit(
+            f"{columnar.hashes[index].decode('ascii')} {date.strftime('%Y-%m-%d %H:%M:%S')}")
+        file_data = []
+        for lang_index, lang in enumerate(columnar.languages):
+            values = columnar.counts[index, lang_index].tolist()
+            if any(values):
+                file_data.append(FileData(dict(zip(FIELDS, values)), lang=lang))
+        commit.__set_file_data__(file_data)
+        commit.__set_aggregated_data__(AggregatedData(
+            dict(zip(FIELDS, columnar.counts[index].sum(axis=0).tolist()))))
+        commit.__set_measured__(bool(columnar.measured[index]))
+        commits.append(commit)
+    return commits
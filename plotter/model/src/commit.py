@@ -6,21 +6,39 @@ import typing
 
 from plotter.model.src.aggregated import AggregatedData
 from plotter.model.src.filedata import FileData
+from plotter.profiler import PROFILER
 from plotter.utilities import get_cloc_data_from_commit
 
+# format of the dates that `git log` prints for `Commit`, the same in every command that lists the commits
+GIT_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+# option of `git log` that prints the dates in `GIT_DATE_FORMAT`, in the timezone of `get_git_log_env`
+GIT_DATE_OPTION = f'--date=format-local:{GIT_DATE_FORMAT}'
+
+
+def get_git_log_env() -> map:
+    """
+        Returns the environment of the `git log` commands that print the dates with `GIT_DATE_OPTION`,
+        so that the dates of all the commits are in UTC instead of in the timezone of each author
+    """
+    return dict(os.environ, TZ='UTC')
+
 
 class Commit(object):
 
     """
         Class that contains the info regarding a single commit
 
-        It contains the `hash` of the commit, its date and its `cloc` data
+        It contains the `hash` of the commit, its date and its `cloc` data.
+        If `measured` is `False` the data has been interpolated from the nearest commits instead of being counted.
+        `directoryData`, if set, has the data of each language of some directories, keyed by their path
     """
 
     def __init__(self, data: str):
         commit, date, time = data.replace('"', '').split(" ")
         self.commitHash = commit
         self.squashed_hashes = []
+        self.measured = True
+        self.directoryData = None
         year, month, day = date.split("-")
         hour, minute, second = time.strip().split(":")
         self.date = datetime.datetime(
@@ -47,6 +65,12 @@ class Commit(object):
     def __set_aggregated_data__(self, data: AggregatedData):
         self.aggregated = data
 
+    def __set_measured__(self, measured: bool):
+        self.measured = measured
+
+    def __set_directory_data__(self, data: typing.Dict[str, typing.List[FileData]]):
+        self.directoryData = data
+
     def __get_data_for_lang__(self, lang: str) -> FileData:
         """
             Gets the `FileData` object for the language `lang`
@@ -88,14 +112,19 @@ class Commit(object):
         self.langData = new_lang_data
         self.aggregated.add(other_commit.aggregated)
 
-    def checkout_and_get_data(self):
+    def checkout_and_get_data(self, scratch_dir: str = None, cache=None, counter=None):
         """
             Moves into `directory` (which is the same of `--dir` flag), checkouts to `self.commit` and gets the data calculated by cloc
 
+            `scratch_dir` is the folder that `cloc` will use to extract the commit, `cache` is the
+            `BlobCache` to look up before counting the files and `counter` is the backend that counts them
+
             Sets `self.langData` and `self.aggregated` to the values calculated
         """
-        self.langData, self.aggregated = get_cloc_data_from_commit(
-            self.commitHash)
+        with PROFILER.commit(self.commitHash) as details:
+            self.langData, self.aggregated = get_cloc_data_from_commit(
+                self.commitHash, scratch_dir=scratch_dir, cache=cache, counter=counter)
+            details['files'] = self.aggregated.nFiles
 
     def to_string(self):
         return f"Commit {self.commitHash} done on {self.date}"
@@ -104,14 +133,19 @@ class Commit(object):
         """
             Returns a map that represents this object
         """
-        return {
+        data = {
             'hash': self.commitHash,
             'date': f"{self.date.year}-{self.date.month}-{self.date.day}",
             'time': f"{self.date.hour}:{self.date.minute}:{self.date.second}",
             'aggregated': self.aggregated.as_map(),
             'squashed_hashes': self.squashed_hashes,
+            'measured': self.measured,
             'fileData': [item.as_map() for item in self.langData]
         }
+        if self.directoryData is not None:
+            data['directories'] = {path: [item.as_map() for item in self.directoryData[path]]
+                                   for path in self.directoryData}
+        return data
 
 
 def parse_commit(data: map) -> Commit:
@@ -119,4 +153,8 @@ def parse_commit(data: map) -> Commit:
     commit.__set_aggregated_data__(AggregatedData(data['aggregated']))
     fileData = [FileData(item) for item in data['fileData']]
     commit.__set_file_data__(fileData)
+    commit.__set_measured__(data.get('measured', True))
+    if 'directories' in data:
+        commit.__set_directory_data__({path: [FileData(item) for item in data['directories'][path]]
+                                       for path in data['directories']})
     return commit
@@ -7,14 +7,25 @@ import numpy as np
 from plotter.model.src import filedata
 from plotter.model.src.aggregated import AggregatedData
 from plotter.model.src.filedata import FileData
-from plotter.utilities import flatten_list
+from plotter.store import read_json_lines
 
+from .binary_history import (is_binary_history, read_binary_history,
+                             write_binary_history)
+from .columnar import (ColumnarHistory, columnar_from_commits,
+                       columnar_from_maps, commits_from_columnar)
 from .commit import Commit, parse_commit
+from .resample import resample
+from .sqlite_history import SqliteHistory, is_sqlite_history
 
 
 class RepoHistory(object):
     """
         Contains all the history of the repository
+
+        The data of the commits is also kept in a `ColumnarHistory`, built the first time
+        it's requested and rebuilt after the commits change.
+        A history loaded from a binary file starts with the `ColumnarHistory` only, and the
+        `Commit` objects are built the first time `commits` is accessed
     """
 
     def __init__(self,  commits=[]):
@@ -24,6 +35,17 @@ class RepoHistory(object):
         self.preprocessed = False
         self.languages = []
 
+    @property
+    def commits(self) -> typing.List[Commit]:
+        if self.commit_list is None:
+            self.commit_list = commits_from_columnar(self.columnar)
+        return self.commit_list
+
+    @commits.setter
+    def commits(self, commits: typing.List[Commit]):
+        self.commit_list = commits
+        self.columnar = None
+
     def __set_preprocessed__(self, preprocessed: bool):
         self.preprocessed = preprocessed
 
@@ -35,10 +57,26 @@ class RepoHistory(object):
 
     def add_commit(self, commit: Commit):
         self.commits.append(commit)
+        self.columnar = None
 
     def __set_commits__(self, commits: typing.List[Commit]):
         self.commits = commits
 
+    def __set_columnar__(self, columnar: ColumnarHistory):
+        """
+            Replaces the commits with the ones stored in `columnar`, without building the `Commit` objects
+        """
+        self.commit_list = None
+        self.columnar = columnar
+
+    def get_columnar(self) -> ColumnarHistory:
+        """
+            Returns the `ColumnarHistory` of the commits
+        """
+        if self.columnar is None:
+            self.columnar = columnar_from_commits(self.commits)
+        return self.columnar
+
     def as_map(self):
         if self.initialDate != None and self.finalDate != None:
             return {
@@ -56,89 +94,218 @@ class RepoHistory(object):
                 'commits': [commit.as_map() for commit in self.commits],
             }
 
-    def get_commit_dates(self) -> typing.List[datetime.datetime]:
+    def get_directory_history(self) -> 'RepoHistory':
+        """
+            Returns a new `RepoHistory` where the directories of the commits (see `Commit.directoryData`)
+            take the place of the languages, each one with the sum of all its languages
+        """
+        repo_history = RepoHistory()
+        repo_history.__set_columnar__(
+            columnar_from_commits(self.commits, directories=True))
+        return repo_history
+
+    def get_commit_dates(self) -> np.ndarray:
         """
             if `self.preprocessed` is `True`
-                Returns all the dates of the preprocessed commits
+                Returns all the dates of the preprocessed commits, as `datetime64`
             else:
-                Returns a list of integers
+                Returns an array of integers
         """
         print("Getting preprocessed data:", self.preprocessed)
         if self.preprocessed:
-            return [item.date for item in self.commits]
+            return self.get_columnar().timestamps
         else:
-            return list(range(len(self.commits)))
+            return np.arange(len(self.get_columnar()))
 
-    def get_commit_data(self, languages=[], field='code') -> typing.List[typing.List[FileData]]:
+    def get_measured_indexes(self) -> typing.List[int]:
+        """
+            Returns the indexes of the commits whose data has been counted, not interpolated
         """
-        returns a list of list of FileData
+        return np.flatnonzero(self.get_columnar().measured).tolist()
+
+    def get_commit_data(self, languages=[], field='code') -> typing.List[np.ndarray]:
+        """
+        returns a list of arrays with the values of `field` at each commit
 
         First level has the same dimension of parameter `languages` and each index refers the the
-        language in the same index in `languages`
+        language in the same index in `languages`. The commits without a language have 0 as value,
+        while the language `All` is the sum of all of them
         """
-        to_return = [[] for _ in languages]
-        for commit in self.commits:
-            for data in commit.langData:
-                if data.lang in languages:
-                    index = languages.index(data.lang)
-                    to_return[index].append(data.get_field(field))
-        return to_return
+        columnar = self.get_columnar()
+        return [columnar.get_series(lang, field=field) for lang in languages]
 
-    def preprocess_commits(self, not_preprocessing: bool):
+    def preprocess_commits(self, not_preprocessing: bool, bucket='day', aggregation='last'):
         """
             Prepares the repo history to be plotted
 
             If not_preprocessing is `False` it will:
-                - squash the commits done on same days on a single fake commit that sums all the stats
+                - group the commits in buckets of time (`hour`, `day`, `week` or `month`) or of a number
+                  of commits, replacing each bucket with a single commit whose stats are the `aggregation`
+                  (`last`, `max`, `mean` or `min`) of the ones in it (see `resample`)
 
             In very case it will:
+                - sort the commits by date
                 - calculate the initial and final dates
                 - get all languages used in the commits
         """
-        commits = self.commits
-        starting_commits = len(self.commits)
-        commits.sort(key=lambda x: x.date)
-        self.initialDate = commits[0].date
-        self.finalDate = commits[-1].date
+        if self.commit_list is not None:
+            self.commits.sort(key=lambda x: x.date)
+        columnar = self.get_columnar()
+        starting_commits = len(columnar)
+        order = np.argsort(columnar.timestamps, kind='stable')
+        if np.any(order != np.arange(starting_commits)):
+            columnar = columnar.select(order)
+            self.__set_columnar__(columnar)
+        self.initialDate = columnar.timestamps[0].astype(datetime.datetime)
+        self.finalDate = columnar.timestamps[-1].astype(datetime.datetime)
+        self.languages = [lang for index, lang in enumerate(columnar.languages)
+                          if columnar.counts[:, index].any()]
         if not not_preprocessing:
-            new_commits = []
+            self.__set_columnar__(resample(columnar, bucket, aggregation))
+            print(
+                f"Reduced from {starting_commits} to {len(self.columnar)} total commits.\nThe plot will start in {self.initialDate} and will end on {self.finalDate}")
+            self.preprocessed = True
+
+    def write_binary(self, path: str):
+        """
+            Writes the history to `path` in the format of `write_binary_history`
+        """
+        write_binary_history(path, self.get_columnar(), {
+            'initialDate': None if self.initialDate is None else self.initialDate.isoformat(),
+            'finalDate': None if self.finalDate is None else self.finalDate.isoformat(),
+            'preprocessed': self.preprocessed,
+        })
 
-            grouped_commits = {}
-            for commit in commits:
-                date = commit.date.date()
-                if date not in grouped_commits:
-                    grouped_commits[date] = []
-                grouped_commits[date].append(commit)
+    def write_sqlite(self, path: str, repository: str):
+        """
+            Writes the history to the `SqliteHistory` in `path` as `repository`, replacing the commits
+            already stored for it
+        """
+        history = SqliteHistory(path)
+        try:
+            history.write_history(repository, (commit.as_map() for commit in self.commits),
+                                  preprocessed=self.preprocessed)
+        finally:
+            history.close()
 
-            for date in grouped_commits:
-                temp_commits = grouped_commits[date]
-                temp_commits.sort(key=lambda x: x.date.date())
-                new_commits.append(temp_commits[-1])
 
-            print(
-                f"Reduced from {starting_commits} to {len(new_commits)} total commits.\nThe plot will start in {self.initialDate} and will end on {self.finalDate}")
-            self.commits = new_commits
-            self.preprocessed = True
-        self.languages = flatten_list(
-            [commit.get_languages() for commit in commits], asSet=True)
+def parse_date(date: str) -> datetime.datetime:
+    """
+        Parses a date written by `RepoHistory.as_map` (`year-month-day`), which can be `None`
+    """
+    if date is None:
+        return None
+    year, month, day = date.split("-")
+    return datetime.datetime(year=int(year), month=int(month), day=int(day))
+
 
+def parse_repo_history(input_file: str, directories=False, repository: str = None, start: datetime.datetime = None,
+                       end: datetime.datetime = None, languages: typing.List[str] = None) -> RepoHistory:
+    """
+        Reads a history written during an old execution, either as JSON, as JSON Lines
+        (`.jsonl`, see `parse_streamed_repo_history`), in the binary format or in a sqlite database
+        (see `parse_sqlite_repo_history`, that uses the other parameters)
 
-def parse_repo_history(input_file: str) -> RepoHistory:
+        If `directories` is `True`, returns the history of the directories (see `RepoHistory.get_directory_history`),
+        which isn't kept by the binary format and by sqlite
+    """
 
     if not os.path.exists(input_file):
         print(f"File {input_file} doesn't exists")
         exit(-1)
 
+    if is_binary_history(input_file):
+        if directories:
+            print("The binary format doesn't keep the data of the directories")
+            exit(-1)
+        return parse_binary_repo_history(input_file)
+    if is_sqlite_history(input_file):
+        if directories:
+            print("The sqlite histories don't keep the data of the directories")
+            exit(-1)
+        return parse_sqlite_repo_history(input_file, repository=repository, start=start, end=end,
+                                         languages=languages)
+    if input_file.endswith('.jsonl'):
+        return parse_streamed_repo_history(input_file, directories=directories)
+
     with open(input_file, 'r') as f:
         data = json.loads(f.read())
 
     repo_history = RepoHistory()
-    repo_history.__set_initial_date__(data['initialDate'])
-    repo_history.__set_final_date__(data['finalDate'])
+    repo_history.__set_initial_date__(parse_date(data['initialDate']))
+    repo_history.__set_final_date__(parse_date(data['finalDate']))
     repo_history.__set_preprocessed__(data['preprocessed'])
 
     commits = data['commits']
     parsed_commits = [parse_commit(item) for item in commits]
     repo_history.__set_commits__(parsed_commits)
 
+    if directories:
+        return repo_history.get_directory_history()
     return repo_history
+
+
+def parse_binary_repo_history(input_file: str) -> RepoHistory:
+    """
+        Reads a history written by `RepoHistory.write_binary`
+
+        The commits stay memory-mapped in a `ColumnarHistory`, no `Commit` object is built
+    """
+    columnar, metadata = read_binary_history(input_file)
+    repo_history = RepoHistory()
+    if metadata['initialDate'] is not None:
+        repo_history.__set_initial_date__(
+            datetime.datetime.fromisoformat(metadata['initialDate']))
+    if metadata['finalDate'] is not None:
+        repo_history.__set_final_date__(
+            datetime.datetime.fromisoformat(metadata['finalDate']))
+    repo_history.__set_preprocessed__(metadata['preprocessed'])
+    repo_history.__set_columnar__(columnar)
+    return repo_history
+
+
+def parse_streamed_repo_history(input_file: str, directories=False) -> RepoHistory:
+    """
+        Reads a history streamed one commit per line during the collection (see `JsonLinesWriter`),
+        which can be partial if the collection didn't finish
+
+        The commits are read one at a time into a `ColumnarHistory`, no `Commit` object is built.
+        If `directories` is `True`, the directories take the place of the languages (see `columnar_from_maps`)
+    """
+    repo_history = RepoHistory()
+    repo_history.__set_columnar__(columnar_from_maps(
+        (data for _, data in read_json_lines(input_file)), directories=directories))
+    return repo_history
+
+
+def parse_sqlite_repo_history(input_file: str, repository: str = None, start: datetime.datetime = None,
+                              end: datetime.datetime = None, languages: typing.List[str] = None) -> RepoHistory:
+    """
+        Reads the history of `repository` from the `SqliteHistory` in `input_file`, with only the commits
+        done between `start` and `end` (both included, both optional) and the data of `languages` (all of them
+        if `None`), without reading the other rows
+
+        If `repository` is `None`, it reads the only repository stored, or `repo_history` if there are more
+    """
+    history = SqliteHistory(input_file)
+    try:
+        if repository is None:
+            repositories = history.get_repositories()
+            if len(repositories) == 1:
+                repository = repositories[0]
+            elif 'repo_history' in repositories:
+                repository = 'repo_history'
+            else:
+                print(f"File {input_file} contains the repositories {', '.join(repositories)}, pick one with --repo_name")
+                exit(-1)
+        columnar = history.load_columnar(
+            repository, start=start, end=end, languages=languages)
+        if columnar is None:
+            print(f"File {input_file} doesn't contain the repository {repository}")
+            exit(-1)
+        repo_history = RepoHistory()
+        repo_history.__set_preprocessed__(history.is_preprocessed(repository))
+        repo_history.__set_columnar__(columnar)
+        return repo_history
+    finally:
+        history.close()
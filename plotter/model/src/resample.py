@@ -0,0 +1,90 @@
+import numpy as np
+
+from .columnar import ColumnarHistory
+
+TIME_BUCKETS = ['hour', 'day', 'week', 'month']
+AGGREGATIONS = ['last', 'max', 'mean', 'min']
+
+
+def is_valid_bucket(bucket: str) -> bool:
+    """
+        Checks if `bucket` is one of `TIME_BUCKETS` or a positive number of commits
+    """
+    return bucket in TIME_BUCKETS or (bucket.isdigit() and int(bucket) > 0)
+
+
+def get_bucket_keys(timestamps: np.ndarray, bucket: str) -> np.ndarray:
+    """
+        Returns the start of the bucket of each timestamp, as `datetime64`
+
+        Weeks start on monday, while 1970-01-01 (the start of `datetime64[W]`) was a thursday
+    """
+    if bucket == 'hour':
+        return timestamps.astype('datetime64[h]')
+    if bucket == 'day':
+        return timestamps.astype('datetime64[D]')
+    if bucket == 'week':
+        days = timestamps.astype('datetime64[D]').astype(np.int64)
+        return ((days + 3) // 7 * 7 - 3).astype('datetime64[D]')
+    return timestamps.astype('datetime64[M]')
+
+
+def get_all_buckets(first: np.datetime64, last: np.datetime64, bucket: str) -> np.ndarray:
+    """
+        Returns the starts of all the buckets from the one of `first` to the one of `last`, included
+    """
+    step = 7 if bucket == 'week' else 1
+    return np.arange(first, last + step, step, dtype=first.dtype)
+
+
+def aggregate_groups(counts: np.ndarray, starts: np.ndarray, aggregation: str) -> np.ndarray:
+    """
+        Aggregates the rows of `counts` in groups of consecutive rows, each one starting at
+        the corresponding index of `starts`
+    """
+    if aggregation == 'last':
+        return counts[np.append(starts[1:], len(counts)) - 1]
+    if aggregation == 'max':
+        return np.maximum.reduceat(counts, starts, axis=0)
+    if aggregation == 'min':
+        return np.minimum.reduceat(counts, starts, axis=0)
+    sizes = np.diff(np.append(starts, len(counts)))
+    sums = np.add.reduceat(counts, starts, axis=0, dtype=np.int64)
+    return np.rint(sums / sizes[:, None, None]).astype(counts.dtype)
+
+
+def resample(columnar: ColumnarHistory, bucket='day', aggregation='last') -> ColumnarHistory:
+    """
+        Groups the commits of `columnar` (which must be sorted by date) in buckets, replacing
+        each bucket with a single commit whose counts are the `aggregation` of the commits in it
+
+        `bucket` is either one of `TIME_BUCKETS` or a number of consecutive commits.
+        With a time bucket the result has a commit at the start of every bucket between the first
+        and the last commit, so the series are evenly spaced: the buckets without commits repeat
+        the values of the previous one and they are marked as not measured.
+        With a number of commits each bucket takes the date of its last commit.
+        The hash of each bucket is the one of its last commit
+    """
+    if len(columnar) == 0:
+        return columnar
+    if bucket in TIME_BUCKETS:
+        keys = get_bucket_keys(columnar.timestamps, bucket)
+    else:
+        keys = np.arange(len(columnar)) // int(bucket)
+    starts = np.flatnonzero(np.append(True, keys[1:] != keys[:-1]))
+    ends = np.append(starts[1:], len(columnar)) - 1
+
+    counts = aggregate_groups(columnar.counts, starts, aggregation)
+    hashes = columnar.hashes[ends]
+    measured = np.logical_or.reduceat(columnar.measured, starts)
+    if bucket not in TIME_BUCKETS:
+        return ColumnarHistory(columnar.timestamps[ends], hashes, columnar.languages, counts, measured)
+
+    buckets = get_all_buckets(keys[0], keys[-1], bucket)
+    positions = np.searchsorted(buckets, keys[starts])
+    # index of the last group started at or before each bucket
+    present = np.zeros(len(buckets), dtype=bool)
+    present[positions] = True
+    group = np.cumsum(present) - 1
+    return ColumnarHistory(buckets.astype('datetime64[s]'), hashes[group], columnar.languages,
+                           counts[group], measured[group] & present)
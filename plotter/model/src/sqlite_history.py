@@ -0,0 +1,236 @@
+import datetime
+import os
+import sqlite3
+import typing
+
+import numpy as np
+
+from .columnar import FIELDS, ColumnarHistory, get_map_timestamp, to_utc
+
+MAGIC = b'SQLite format 3\0'
+
+
+def is_sqlite_history(path: str) -> bool:
+    """
+        Checks if the file `path` is a sqlite database, like the ones written by `SqliteHistory`
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class SqliteHistory(object):
+    """
+        Stores the histories of many repositories in the sqlite database `path`, keyed by the name of
+        each repository
+
+        Each commit has a row in `commits`, the data of each of its languages a row in `counts` and each
+        of its squashed hashes a row in `squashed`. The commits are indexed by repository and date, and the
+        counts also by repository and language, so a date range or some languages of a repository
+        are read without reading the rest of the database
+    """
+
+    def __init__(self, path: str):
+        folder = os.path.dirname(path)
+        if folder != '' and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS repositories (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                preprocessed INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS commits (
+                repository INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                measured INTEGER NOT NULL,
+                PRIMARY KEY (repository, hash)
+            );
+            CREATE INDEX IF NOT EXISTS commits_repository_timestamp ON commits (repository, timestamp);
+            CREATE TABLE IF NOT EXISTS counts (
+                repository INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                language TEXT NOT NULL,
+                nFiles INTEGER NOT NULL,
+                blank INTEGER NOT NULL,
+                comment INTEGER NOT NULL,
+                code INTEGER NOT NULL,
+                PRIMARY KEY (repository, hash, language)
+            );
+            CREATE INDEX IF NOT EXISTS counts_repository_timestamp ON counts (repository, timestamp);
+            CREATE INDEX IF NOT EXISTS counts_repository_language ON counts (repository, language, timestamp);
+            CREATE TABLE IF NOT EXISTS squashed (
+                repository INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                squashed_hash TEXT NOT NULL,
+                PRIMARY KEY (repository, hash, squashed_hash)
+            );
+        ''')
+        self.connection.commit()
+
+    def get_repositories(self) -> typing.List[str]:
+        """
+            Returns the names of the repositories stored
+        """
+        return [row[0] for row in self.connection.execute('SELECT name FROM repositories ORDER BY name')]
+
+    def get_repository_id(self, repository: str, create=False) -> int:
+        """
+            Returns the id of `repository`, adding it if `create` is `True`, otherwise `None` if it's not stored
+        """
+        row = self.connection.execute(
+            'SELECT id FROM repositories WHERE name = ?', (repository,)).fetchone()
+        if row is not None:
+            return row[0]
+        if not create:
+            return None
+        return self.connection.execute('INSERT INTO repositories (name) VALUES (?)', (repository,)).lastrowid
+
+    def is_preprocessed(self, repository: str) -> bool:
+        row = self.connection.execute(
+            'SELECT preprocessed FROM repositories WHERE name = ?', (repository,)).fetchone()
+        return row is not None and bool(row[0])
+
+    def delete_repository(self, repository: str, commit=True):
+        """
+            Removes `repository` and all its commits
+
+            If `commit` is `False` the transaction is left open, so that it can be committed together
+            with the next changes
+        """
+        repository_id = self.get_repository_id(repository)
+        if repository_id is None:
+            return
+        for table in ['commits', 'counts', 'squashed']:
+            self.connection.execute(
+                f'DELETE FROM {table} WHERE repository = ?', (repository_id,))
+        self.connection.execute(
+            'DELETE FROM repositories WHERE id = ?', (repository_id,))
+        if commit:
+            self.connection.commit()
+
+    def add_commits(self, repository: str, commits: typing.Iterable[map], preprocessed=False, replace=False):
+        """
+            Adds the commit maps `commits` (see `Commit.as_map`) to `repository`, replacing the ones
+            already stored with the same hash, in a single transaction
+
+            If `replace` is `True` all the commits already stored for `repository` are removed in the
+            same transaction, so the readers see either the old commits or all the new ones
+        """
+        try:
+            if replace:
+                self.delete_repository(repository, commit=False)
+            self.insert_commits(repository, commits, preprocessed)
+        except BaseException:
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+
+    def insert_commits(self, repository: str, commits: typing.Iterable[map], preprocessed: bool):
+        """
+            Implements `add_commits`, without committing the transaction
+        """
+        repository_id = self.get_repository_id(repository, create=True)
+        self.connection.execute('UPDATE repositories SET preprocessed = ? WHERE id = ?',
+                                (int(preprocessed), repository_id))
+        for data in commits:
+            timestamp = get_map_timestamp(data)
+            self.connection.execute('DELETE FROM counts WHERE repository = ? AND hash = ?',
+                                    (repository_id, data['hash']))
+            self.connection.execute('INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?)',
+                                    (repository_id, data['hash'], timestamp, int(data.get('measured', True))))
+            self.connection.executemany('INSERT INTO counts VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [
+                (repository_id, data['hash'], timestamp, item['lang'], item['nFiles'],
+                 item['blank'], item['comment'], item['code']) for item in data['fileData']])
+            self.connection.executemany('INSERT OR IGNORE INTO squashed VALUES (?, ?, ?)', [
+                (repository_id, data['hash'], squashed_hash) for squashed_hash in data.get('squashed_hashes', [])])
+
+    def write_history(self, repository: str, commits: typing.Iterable[map], preprocessed=False):
+        """
+            Replaces all the commits of `repository` with the commit maps `commits`, in a single transaction
+        """
+        self.add_commits(repository, commits, preprocessed=preprocessed, replace=True)
+
+    def get_squashed_hashes(self, repository: str, commit_hash: str) -> typing.List[str]:
+        """
+            Returns the hashes squashed into the commit `commit_hash` of `repository`
+        """
+        return [row[0] for row in self.connection.execute(
+            'SELECT squashed_hash FROM squashed JOIN repositories ON repositories.id = squashed.repository '
+            'WHERE repositories.name = ? AND hash = ?', (repository, commit_hash))]
+
+    def load_columnar(self, repository: str, start: datetime.datetime = None, end: datetime.datetime = None,
+                      languages: typing.List[str] = None) -> ColumnarHistory:
+        """
+            Reads the commits of `repository` done between `start` and `end` (both included, both optional),
+            sorted by date, with only the data of `languages` (all of them if `None`)
+
+            Returns `None` if `repository` is not stored
+        """
+        repository_id = self.get_repository_id(repository)
+        if repository_id is None:
+            return None
+        conditions = 'repository = ?'
+        parameters = [repository_id]
+        for value, condition in [(start, 'timestamp >= ?'), (end, 'timestamp <= ?')]:
+            if value is not None:
+                conditions += f' AND {condition}'
+                parameters.append(int(to_utc(value).replace(
+                    tzinfo=datetime.timezone.utc).timestamp()))
+
+        commits = self.connection.execute(
+            f'SELECT hash, timestamp, measured FROM commits WHERE {conditions} ORDER BY timestamp',
+            parameters).fetchall()
+        if languages is not None:
+            conditions += f" AND language IN ({', '.join('?' * len(languages))})"
+            parameters += languages
+        counts = self.connection.execute(
+            f"SELECT hash, language, {', '.join(FIELDS)} FROM counts WHERE {conditions}", parameters).fetchall()
+
+        commit_index = {row[0]: index for index, row in enumerate(commits)}
+        language_names = sorted(set(row[1] for row in counts))
+        language_index = {lang: index for index, lang in enumerate(language_names)}
+        values = np.zeros((len(commits), len(language_names), len(FIELDS)), dtype=np.int32)
+        for row in counts:
+            values[commit_index[row[0]], language_index[row[1]]] = row[2:]
+        return ColumnarHistory(np.array([row[1] for row in commits], dtype=np.int64).astype('datetime64[s]'),
+                               np.array([row[0].encode('ascii') for row in commits], dtype=np.bytes_),
+                               language_names, values,
+                               np.array([bool(row[2]) for row in commits], dtype=bool))
+
+    def close(self):
+        self.connection.close()
+
+
+class SqliteHistoryWriter(object):
+    """
+        Adds the commit maps of `repository` to the `SqliteHistory` in `path` one at a time, like
+        `JsonLinesWriter` does, committing every `commit_every` commits
+
+        Unless `append` is `True`, the commits already stored for `repository` are removed in the
+        same transaction that adds the first ones
+    """
+
+    def __init__(self, path: str, repository: str, append=True, commit_every=100):
+        self.history = SqliteHistory(path)
+        self.repository = repository
+        self.commit_every = commit_every
+        self.pending = []
+        self.replace = not append
+
+    def write(self, data: map):
+        self.pending.append(data)
+        if len(self.pending) >= self.commit_every:
+            self.flush()
+
+    def flush(self):
+        self.history.add_commits(
+            self.repository, self.pending, replace=self.replace)
+        self.replace = False
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.history.close()
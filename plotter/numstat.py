@@ -0,0 +1,178 @@
+import subprocess
+import typing
+
+from .git_reader import SUBMODULE_MODE, SYMLINK_MODE, TREE_MODE, get_git_reader
+from .languages import get_language
+from .model.src.aggregated import AggregatedData
+from .model.src.commit import GIT_DATE_OPTION, Commit, get_git_log_env
+from .model.src.filedata import FileData
+from .utilities import NativeCounter, get_cloc_data_from_commit
+
+# the modes of the entries that aren't counted as files: symbolic links and submodules
+NON_FILE_MODES = [SYMLINK_MODE, SUBMODULE_MODE]
+
+
+class NumstatTotals(object):
+    """
+        Keeps the totals of each language while the output of `git log --numstat` is read
+
+        The totals start from a full count of the root commit, done with `NativeCounter` so that
+        its languages are the same ones `get_language` picks for the later changes, then the lines added and removed
+        by each commit are added to (and removed from) the `code` of the language of the file,
+        while `nFiles` follows the files created and deleted. `blank` and `comment` keep the
+        values of the root commit, since `git` doesn't classify the lines.
+        Symbolic links and submodules (`non_files`, starting from the ones of the root commit)
+        are ignored like `NativeCounter` does: since `--summary` reports the modes after the
+        numstat lines, the lines of a commit are only counted by `end_commit`
+    """
+
+    def __init__(self, root_data: typing.List[FileData], non_files: typing.Iterable[str] = ()):
+        self.languages = {}
+        for data in root_data:
+            self.languages[data.lang] = data.as_map()
+        self.non_files = set(non_files)
+        self.changed_lines = []
+        self.changed_modes = {}
+
+    def get_language_totals(self, path: str) -> map:
+        language = get_language(path)
+        if language is None:
+            return None
+        if language.name not in self.languages:
+            self.languages[language.name] = {
+                'lang': language.name, 'nFiles': 0, 'blank': 0, 'comment': 0, 'code': 0}
+        return self.languages[language.name]
+
+    def add_lines(self, path: str, added: int, removed: int):
+        self.changed_lines.append((path, added, removed))
+
+    def change_mode(self, path: str, old_mode: str, new_mode: str):
+        """
+            Follows the entry `path` whose mode changed from `old_mode` to `new_mode`,
+            where `None` means that it was created or deleted
+        """
+        was_file = old_mode is not None and old_mode not in NON_FILE_MODES
+        is_file = new_mode is not None and new_mode not in NON_FILE_MODES
+        if is_file != was_file:
+            totals = self.get_language_totals(path)
+            if totals is not None:
+                totals['nFiles'] += 1 if is_file else -1
+        if new_mode in NON_FILE_MODES:
+            self.non_files.add(path)
+        else:
+            self.non_files.discard(path)
+        self.changed_modes[path] = (was_file, is_file)
+
+    def end_commit(self):
+        """
+            Counts the lines changed by the current commit, once all its modes are known.
+            When a file becomes a symbolic link (or the opposite) the numstat line counts
+            both, so only the side that is a file is kept
+        """
+        for path, added, removed in self.changed_lines:
+            if path in self.changed_modes:
+                was_file, is_file = self.changed_modes[path]
+            else:
+                was_file = is_file = path not in self.non_files
+            totals = self.get_language_totals(path)
+            if totals is not None:
+                totals['code'] += (added if is_file else 0) - (removed if was_file else 0)
+        self.changed_lines = []
+        self.changed_modes = {}
+
+    def set_commit_data(self, commit: Commit):
+        """
+            Sets the current totals as the data of `commit`, ignoring the languages without files.
+            Values that became negative (more lines removed than the ones counted) are shown as 0
+        """
+        self.end_commit()
+        file_data = []
+        aggregated = AggregatedData(
+            {'blank': 0, 'comment': 0, 'code': 0, 'nFiles': 0})
+        for lang in self.languages:
+            totals = self.languages[lang]
+            if totals['nFiles'] <= 0:
+                continue
+            data = FileData({field: max(totals[field], 0) for field in [
+                            'nFiles', 'blank', 'comment', 'code']}, lang=lang)
+            file_data.append(data)
+            aggregated.add(AggregatedData(data.as_map()))
+        commit.__set_file_data__(file_data)
+        commit.__set_aggregated_data__(aggregated)
+
+
+def get_non_file_paths(tree: str, prefix='') -> typing.List[str]:
+    """
+        Returns the paths of the symbolic links and of the submodules contained in the tree `tree`
+    """
+    paths = []
+    for mode, name, object_hash in get_git_reader().read_tree(tree):
+        if mode == TREE_MODE:
+            paths += get_non_file_paths(object_hash, prefix=f"{prefix}{name}/")
+        elif mode in NON_FILE_MODES:
+            paths.append(f"{prefix}{name}")
+    return paths
+
+
+def get_numstat_commits(branch: str = None) -> typing.List[Commit]:
+    """
+        Gets the commits of `branch` (the current one by default) of the repository in the
+        current directory from a single `git log --numstat` pass
+
+        Only the first parent of each merge is followed, so that the changes of every commit are
+        the ones made to the previous commit in the list. The root commit is counted by `NativeCounter`,
+        then the totals are updated as explained in `NumstatTotals`.
+
+        Returns the commits in `git log` order (newest first)
+    """
+    command = ['git', '-c', 'core.quotePath=false', 'log', '--first-parent', '-m', '--reverse',
+               '--numstat', '--summary', '--no-renames', '--format=%x01%H %ad',
+               GIT_DATE_OPTION]
+    if branch is not None:
+        command.append(branch)
+    p = subprocess.Popen(command, env=get_git_log_env(), stdout=subprocess.PIPE,
+                         stderr=subprocess.DEVNULL)
+
+    commits = []
+    totals = None
+    commit = None
+    for line in p.stdout:
+        line = line.decode('utf-8', errors='replace').rstrip('\n')
+        if line.startswith('\x01'):
+            if commit is not None:
+                totals.set_commit_data(commit)
+            commit = Commit(line[1:])
+            commits.append(commit)
+            if totals is None:
+                # `cloc` would name some languages differently and count languages whose
+                # changes can't be followed, leaving them frozen at their root values
+                file_data, _ = get_cloc_data_from_commit(
+                    commit.commitHash, counter=NativeCounter())
+                root_tree = get_git_reader().get_tree_hash(commit.commitHash)
+                totals = NumstatTotals(file_data, get_non_file_paths(root_tree))
+            continue
+        if len(commits) == 1 or len(line.strip()) == 0:
+            # the root commit has already been counted
+            continue
+
+        if line.startswith(' create mode '):
+            _, _, _, mode, path = line.split(' ', 4)
+            totals.change_mode(path, None, mode)
+        elif line.startswith(' delete mode '):
+            _, _, _, mode, path = line.split(' ', 4)
+            totals.change_mode(path, mode, None)
+        elif line.startswith(' mode change '):
+            # ` mode change 100644 => 120000 path`
+            _, _, _, old_mode, _, new_mode, path = line.split(' ', 6)
+            totals.change_mode(path, old_mode, new_mode)
+        elif '\t' in line:
+            added, removed, path = line.split('\t', 2)
+            if added != '-':
+                # binary files are reported with `-`
+                totals.add_lines(path, int(added), int(removed))
+    p.wait()
+
+    if commit is not None:
+        totals.set_commit_data(commit)
+    commits.reverse()
+    return commits
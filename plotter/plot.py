@@ -1,15 +1,110 @@
-from datetime import datetime
+import re
+import typing
+
 import matplotlib.pyplot as plt
+import numpy as np
 
+from .downsample import downsample
 from .model.src.repo_history import RepoHistory
 
+# (field, label) of the fields that can be plotted
+FIELDS = [('code', 'Lines of code'), ('nFiles', 'Number of files'),
+          ('blank', 'Blank lines'), ('comment', 'Comment lines')]
+FIELD_LABELS = dict(FIELDS)
+
+
+def draw_series(axes, x_values: np.ndarray, values: np.ndarray, is_measured: np.ndarray, label: str,
+                points=0, method='lttb'):
+    """
+        Draws on `axes` the line of `values`, named `label`. Only the points where `is_measured`
+        is `True` get a marker
+
+        If `points` is not 0 the series is downsampled to about `points` points with `method`
+        (see `plotter.downsample.downsample`) before being drawn, so the time needed to draw it
+        doesn't depend on the length of the history
+    """
+    indexes = downsample(x_values, values, points, method=method)
+    axes.plot(x_values[indexes], values[indexes], linestyle='dashed', marker='s',
+              markevery=np.flatnonzero(is_measured[indexes]).tolist(), label=label)
+
+
+def label_axes(axes, x_values: np.ndarray, field_label: str):
+    """
+        Adds the legend and the labels of the axes to `axes`, where `x_values` are the values of the x axis
+    """
+    axes.legend()
+    if np.issubdtype(x_values.dtype, np.datetime64):
+        axes.set_xlabel("Commit dates")
+    else:
+        axes.set_xlabel("Commit number")
+    axes.set_ylabel(field_label)
+
+
+def draw_history(axes, x_values: np.ndarray, y_values: list, labels: typing.List[str], measured: typing.List[int],
+                 field_label: str, points=0, method='lttb'):
+    """
+        Draws on `axes` a line for each series in `y_values`, named after the label in the same index
+        of `labels`. Only the points in `measured` get a marker
+
+        `points` and `method` set the downsampling of each series, see `draw_series`
+    """
+    is_measured = np.zeros(len(x_values), dtype=bool)
+    is_measured[measured] = True
+    for values, label in zip(y_values, labels):
+        draw_series(axes, x_values, values, is_measured, label,
+                    points=points, method=method)
+    label_axes(axes, x_values, field_label)
+
+
+def draw_branches(axes, repo_histories: typing.Dict[str, RepoHistory], languages: typing.List[str], field: str,
+                  points=0, method='lttb'):
+    """
+        Draws on `axes` a line for each language in `languages` of each history in `repo_histories`,
+        which maps the name of each branch to its history, so that the branches can be compared
+
+        `points` and `method` set the downsampling of each series, see `draw_series`
+    """
+    for branch, repo_history in repo_histories.items():
+        x_values = repo_history.get_commit_dates()
+        is_measured = np.zeros(len(x_values), dtype=bool)
+        is_measured[repo_history.get_measured_indexes()] = True
+        for values, language in zip(repo_history.get_commit_data(languages, field=field), languages):
+            label = branch if len(languages) == 1 else f"{branch}: {language}"
+            draw_series(axes, x_values, values, is_measured, label,
+                        points=points, method=method)
+    label_axes(axes, x_values, FIELD_LABELS[field])
+
+
+def get_safe_file_name(name: str) -> str:
+    """
+        Replaces the characters of `name` that are not safe in a file name
+    """
+    return re.sub(r'[^A-Za-z0-9+_-]', '_', name)
+
+
+def get_plot_file_name(language: str, field: str, image_format: str) -> str:
+    """
+        Returns the name of the file of the plot of `field` for `language`,
+        replacing the characters of the language that are not safe in a file name
+    """
+    return f"{get_safe_file_name(language)}_{field}.{image_format}"
+
 
 class Plotter(object):
-    def __init__(self, repo_history):
-        if not isinstance(repo_history, RepoHistory):
+    def __init__(self, repo_history, points=0, method='lttb'):
+        """
+            `repo_history` can also be a map with the history of each branch, which are plotted on the
+            same chart (see `draw_branches`).
+            `points` and `method` set the downsampling of the plotted series, see `draw_history`
+        """
+        histories = repo_history.values() if isinstance(
+            repo_history, dict) else [repo_history]
+        if not all(isinstance(item, RepoHistory) for item in histories):
             raise Exception(
                 "Plotter class must be initialized with a RepoHistory object")
         self.repo_history = repo_history
+        self.points = points
+        self.method = method
 
     def plot(self, languages=[]):
         """
@@ -17,12 +112,9 @@ class Plotter(object):
 
             if `languages` is empty, it will plot the aggregated data
         """
-        x_values = [
-            f"{date.day}/{date.month}/{date.year}" if isinstance(date, datetime) else date for date in self.repo_history.get_commit_dates()]
-
         print("Which field you want to plot?")
-        available_fields = [(0, 'code', 'Lines of code'), (1, 'nFiles', 'Number of files'),
-                            (2, 'blank', 'Blank lines'), (3, 'comment', 'Comment lines')]
+        available_fields = [(index, field, label)
+                            for index, (field, label) in enumerate(FIELDS)]
         ok = False
         while not ok:
             ok = True
@@ -38,26 +130,18 @@ class Plotter(object):
         field, for_label = available_fields[int(
             field)][1], available_fields[int(field)][2]
 
+        if isinstance(self.repo_history, dict):
+            draw_branches(plt.gca(), self.repo_history, languages, field,
+                          points=self.points, method=self.method)
+            plt.show()
+            return
+
+        x_values = self.repo_history.get_commit_dates()
         y_values = self.repo_history.get_commit_data(languages, field=field)
+        # only the measured commits get a marker, the interpolated ones are just part of the line
+        measured = self.repo_history.get_measured_indexes()
 
-        for y_value_index in range(len(y_values)):
-            values = y_values[y_value_index]
-            if len(values) == 0:
-                value_to_repeat = 0
-            else:
-                value_to_repeat = values[-1]
-            while len(values) != len(x_values):
-                values.append(value_to_repeat)
-
-            plt.plot(x_values, values, linestyle='dashed', marker='s',
-                     label=languages[y_value_index])
-
-        plt.legend()
-        if isinstance(x_values[0], datetime):
-            plt.xlabel("Commit dates")
-        else:
-            plt.xlabel("Commit number")
-
-        plt.ylabel(for_label)
+        draw_history(plt.gca(), x_values, y_values, languages, measured, for_label,
+                     points=self.points, method=self.method)
 
         plt.show()
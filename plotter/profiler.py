@@ -0,0 +1,115 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import typing
+
+import numpy as np
+
+
+class Profiler(object):
+    """
+        Measures how long each stage of the script takes
+
+        Every `stage` (and every `commit`, which is the stage `commit` that also remembers the hash of
+        the commit) is recorded as an event with its start, duration and thread. Until `enable` is called
+        nothing is recorded, so the instrumented code costs only a function call
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        # (name, start, duration, thread, args) of every recorded stage
+        self.events = []
+
+    def enable(self):
+        self.enabled = True
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name: str, **args):
+        """
+            Records the time spent inside the `with` block as the stage `name`, with the extra `args`
+
+            The `args` map is returned by the `with` statement, so that the block can add the details
+            that it finds out while it runs
+        """
+        if not self.enabled:
+            yield args
+            return
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            duration = time.perf_counter() - start
+            with self.lock:
+                self.events.append(
+                    (name, start - self.start, duration, threading.get_ident(), args))
+
+    def commit(self, commit_hash: str, **args):
+        """
+            Records the time spent counting the commit `commit_hash` inside the `with` block
+        """
+        return self.stage('commit', hash=commit_hash, **args)
+
+    def get_durations(self) -> typing.Dict[str, np.ndarray]:
+        """
+            Returns the durations of each stage, in seconds
+        """
+        durations = {}
+        for name, _, duration, _, _ in self.events:
+            durations.setdefault(name, []).append(duration)
+        return {name: np.array(durations[name]) for name in durations}
+
+    def get_slowest_commits(self, count: int) -> typing.List[typing.Tuple[float, str, map]]:
+        """
+            Returns the `(duration, hash, args)` of the `count` commits that took the longest
+        """
+        commits = [(duration, args['hash'], args)
+                   for name, _, duration, _, args in self.events if name == 'commit']
+        commits.sort(key=lambda item: item[0], reverse=True)
+        return commits[:count]
+
+    def get_summary(self, slowest=10) -> str:
+        """
+            Returns a report with the total time and the percentiles of each stage, slowest first,
+            and the `slowest` commits that took the longest
+        """
+        durations = self.get_durations()
+        lines = [f"{'stage':<24}{'calls':>9}{'total s':>10}{'mean ms':>10}{'p50 ms':>10}"
+                 f"{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for name in sorted(durations, key=lambda name: durations[name].sum(), reverse=True):
+            values = durations[name] * 1000
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            lines.append(f"{name:<24}{len(values):>9}{values.sum() / 1000:>10.3f}{values.mean():>10.2f}"
+                         f"{p50:>10.2f}{p90:>10.2f}{p99:>10.2f}{values.max():>10.2f}")
+
+        commits = self.get_slowest_commits(slowest)
+        if len(commits) > 0:
+            lines.append(f"Slowest {len(commits)} commits:")
+            for duration, commit_hash, args in commits:
+                details = ', '.join(f"{key}={args[key]}" for key in args if key != 'hash')
+                lines.append(f"- {commit_hash} {duration * 1000:.2f} ms {details}".rstrip())
+        return '\n'.join(lines)
+
+    def write_trace(self, path: str):
+        """
+            Writes the recorded events to `path` in the Trace Event Format, which can be opened
+            with `chrome://tracing` or Perfetto
+        """
+        events = [{
+            'name': name,
+            'ph': 'X',
+            'ts': start * 1e6,
+            'dur': duration * 1e6,
+            'pid': os.getpid(),
+            'tid': thread,
+            'args': args,
+        } for name, start, duration, thread, args in self.events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+PROFILER = Profiler()
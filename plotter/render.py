@@ -0,0 +1,85 @@
+import concurrent.futures
+import os
+import typing
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from .model.src.repo_history import RepoHistory
+from .plot import (FIELD_LABELS, draw_branches, draw_history,
+                   get_plot_file_name)
+
+
+def render_plot(path: str, x_values: np.ndarray, values: np.ndarray, language: str, measured: typing.List[int],
+                field_label: str, points=0, method='lttb') -> str:
+    """
+        Renders the series `values` of `language` to the image `path`, whose format is picked from its extension
+
+        The figure is not attached to any GUI backend, so this can run without a display and in any process.
+        `points` and `method` set the downsampling of the series (see `draw_history`). Returns `path`
+    """
+    figure = Figure(figsize=(12, 6))
+    draw_history(figure.add_subplot(), x_values, [values], [language], measured, field_label,
+                 points=points, method=method)
+    figure.savefig(path)
+    return path
+
+
+def render_branches_plot(path: str, repo_histories: typing.Dict[str, RepoHistory], language: str, field: str,
+                         points=0, method='lttb') -> str:
+    """
+        Renders `field` of `language` of each branch in `repo_histories` on the same chart (see `draw_branches`)
+        to the image `path`, like `render_plot` does. Returns `path`
+    """
+    figure = Figure(figsize=(12, 6))
+    draw_branches(figure.add_subplot(), repo_histories, [language], field,
+                  points=points, method=method)
+    figure.savefig(path)
+    return path
+
+
+def render_plots(repo_history: RepoHistory, languages: typing.List[str], fields: typing.List[str],
+                 output_dir: str, image_format='png', jobs=1, points=0, method='lttb') -> typing.List[str]:
+    """
+        Renders a plot for every combination of `languages` and `fields` to `output_dir`
+        (see `get_plot_file_name`), spreading them over `jobs` processes.
+        Each series is downsampled to about `points` points with `method`, see `draw_history`
+
+        If `repo_history` is a map with the history of each branch, every plot has a line for each branch
+        (see `render_branches_plot`).
+
+        Returns the paths of the rendered images
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    if isinstance(repo_history, dict):
+        tasks = [(os.path.join(output_dir, get_plot_file_name(language, field, image_format)),
+                  repo_history, language, field, points, method) for field in fields for language in languages]
+        return run_tasks(render_branches_plot, tasks, jobs)
+
+    x_values = repo_history.get_commit_dates()
+    measured = repo_history.get_measured_indexes()
+
+    tasks = []
+    for field in fields:
+        series = repo_history.get_commit_data(languages, field=field)
+        for language, values in zip(languages, series):
+            path = os.path.join(output_dir, get_plot_file_name(
+                language, field, image_format))
+            tasks.append((path, x_values, values, language,
+                         measured, FIELD_LABELS[field], points, method))
+
+    return run_tasks(render_plot, tasks, jobs)
+
+
+def run_tasks(function: typing.Callable, tasks: typing.List[tuple], jobs=1) -> list:
+    """
+        Calls `function` with the arguments of each item of `tasks`, spreading them over `jobs` processes
+
+        Returns the values returned by `function`, in the same order of `tasks`
+    """
+    if jobs == 1:
+        return [function(*task) for task in tasks]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(function, *task) for task in tasks]
+        return [future.result() for future in futures]
@@ -0,0 +1,114 @@
+import typing
+
+from .model.src.aggregated import AggregatedData
+from .model.src.commit import Commit
+from .model.src.filedata import FileData
+
+FIELDS = ['nFiles', 'blank', 'comment', 'code']
+
+
+def is_measured(commit: Commit) -> bool:
+    """
+        Checks if the data of `commit` has already been calculated
+    """
+    return hasattr(commit, 'langData') and commit.measured
+
+
+def needs_bisection(before: Commit, after: Commit, tolerance: float) -> bool:
+    """
+        Checks if the lines of code of any language differ between `before` and `after` by more
+        than `tolerance` (a fraction of the total lines of code of the biggest commit)
+    """
+    total = max(before.aggregated.code, after.aggregated.code, 1)
+    for lang in set(before.get_languages()).union(after.get_languages()):
+        before_data = before.__get_data_for_lang__(lang)
+        after_data = after.__get_data_for_lang__(lang)
+        before_code = 0 if before_data is None else before_data.code
+        after_code = 0 if after_data is None else after_data.code
+        if abs(after_code - before_code) > tolerance * total:
+            return True
+    return False
+
+
+def interpolate_commit(commit: Commit, before: Commit, after: Commit, weight: float):
+    """
+        Sets the data of `commit` interpolating linearly the data of `before` and `after`
+
+        `weight` is the position of `commit` between them, from 0 (`before`) to 1 (`after`).
+        The commit is marked as not measured
+    """
+    def interpolate(before_value, after_value):
+        return int(round(before_value + (after_value - before_value) * weight))
+
+    file_data = []
+    for lang in sorted(set(before.get_languages()).union(after.get_languages())):
+        before_data = before.__get_data_for_lang__(lang)
+        after_data = after.__get_data_for_lang__(lang)
+        values = {'lang': lang}
+        for field in FIELDS:
+            values[field] = interpolate(0 if before_data is None else before_data.get_field(field),
+                                        0 if after_data is None else after_data.get_field(field))
+        file_data.append(FileData(values))
+
+    aggregated = {}
+    for field in FIELDS:
+        aggregated[field] = interpolate(getattr(before.aggregated, field),
+                                        getattr(after.aggregated, field))
+
+    commit.__set_file_data__(file_data)
+    commit.__set_aggregated_data__(AggregatedData(aggregated))
+    commit.__set_measured__(False)
+
+
+def collect_commits_data_sampled(commits: typing.List[Commit], measure: typing.Callable[[typing.List[Commit]], None],
+                                 initial_points=50, tolerance=0.01):
+    """
+        Calculates the data of only the commits needed to draw the history of `commits`
+
+        First `initial_points` evenly spaced commits are measured, then every interval whose
+        endpoints differ by more than `tolerance` (see `needs_bisection`) is split in half
+        measuring its middle commit, until all the intervals are resolved.
+        The commits that were not measured are interpolated from the nearest measured ones.
+
+        `commits` must be in `git log` order (newest first) and they are updated in place.
+        `measure` is called with the batches of commits to measure, in the same order
+    """
+    if len(commits) == 0:
+        return
+    ordered = list(reversed(commits))
+    last = len(ordered) - 1
+    points = max(min(initial_points, len(ordered)), 2)
+    to_measure = sorted(set(round(index * last / (points - 1))
+                        for index in range(points)))
+
+    while len(to_measure) > 0:
+        batch = [ordered[index]
+                 for index in to_measure if not is_measured(ordered[index])]
+        measure(list(reversed(batch)))
+        measured = [index for index in range(
+            len(ordered)) if is_measured(ordered[index])]
+
+        to_measure = []
+        for before, after in zip(measured, measured[1:]):
+            if after - before > 1 and needs_bisection(ordered[before], ordered[after], tolerance):
+                to_measure.append((before + after) // 2)
+
+    measured = interpolate_unmeasured(ordered)
+    print(f"Measured {len(measured)} of {len(ordered)} commits")
+
+
+def interpolate_unmeasured(commits: typing.List[Commit]) -> typing.List[int]:
+    """
+        Interpolates each commit of `commits` that is not measured from the nearest measured commits
+        before and after it (see `interpolate_commit`). The commits before the first measured one
+        and after the last one are left without data
+
+        Returns the indexes of the measured commits
+    """
+    measured = [index for index in range(len(commits))
+                if is_measured(commits[index])]
+    for before, after in zip(measured, measured[1:]):
+        for index in range(before + 1, after):
+            interpolate_commit(commits[index], commits[before], commits[after],
+                               (index - before) / (after - before))
+    return measured
@@ -0,0 +1,338 @@
+import collections
+import datetime
+import io
+import json
+import os
+import threading
+import time
+import typing
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from absl import app, flags
+from matplotlib.figure import Figure
+
+from .__main__ import FLAGS, parse_iso_date
+from .downsample import METHODS, downsample
+from .model.src.columnar import FIELDS, ColumnarHistory
+from .model.src.repo_history import RepoHistory, parse_repo_history
+from .model.src.resample import AGGREGATIONS, is_valid_bucket, resample
+from .plot import FIELD_LABELS, draw_history
+
+flags.DEFINE_string('histories_dir', None,
+                    'The folder with the histories served, each one named after its file without the extension')
+flags.DEFINE_string('host', '127.0.0.1',
+                    'Specifies the address the server listens on')
+flags.DEFINE_integer('port', 8080,
+                     'Specifies the port the server listens on', lower_bound=0)
+flags.DEFINE_integer('server_cache_size', 256,
+                     'Specifies how many computed series and rendered images the server keeps, the least recently used are removed first', lower_bound=1)
+flags.mark_flag_as_required('histories_dir')
+
+# extensions of the files of `--histories_dir` that are served
+HISTORY_EXTENSIONS = ['.json', '.jsonl', '.rph']
+# value of `bucket` that keeps every commit
+NO_BUCKET = 'commit'
+
+
+class QueryError(Exception):
+    """
+        Raised when a query can't be answered, with the HTTP status to return
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class LRUCache(object):
+    """
+        Keeps the last `max_entries` values used, dropping the least recently used first
+
+        The keys are tuples whose first item is the name of the history they were computed from,
+        so that all the values of a history can be removed with `invalidate`
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key: tuple, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, name: str):
+        """
+            Removes all the values computed from the history `name`
+        """
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == name]:
+                del self.entries[key]
+
+
+class HistoryStore(object):
+    """
+        Keeps in memory the histories of the files in `folder`, sorted by date
+
+        Each history has a version, the modification time and the size of its file: a file is read again
+        only when its version changes, and then the values cached from the old version are removed from `cache`
+    """
+
+    def __init__(self, folder: str, cache: LRUCache):
+        self.folder = folder
+        self.cache = cache
+        self.lock = threading.Lock()
+        # name -> (version, history)
+        self.histories = {}
+
+    def get_paths(self) -> typing.Dict[str, str]:
+        """
+            Returns the path of the file of each history in the folder, keyed by its name
+        """
+        paths = {}
+        for file_name in sorted(os.listdir(self.folder)):
+            name, extension = os.path.splitext(file_name)
+            if extension in HISTORY_EXTENSIONS:
+                paths[name] = os.path.join(self.folder, file_name)
+        return paths
+
+    def get(self, name: str) -> typing.Tuple[str, RepoHistory]:
+        """
+            Returns the version and the history `name`, reading it again if its file changed
+        """
+        path = self.get_paths().get(name)
+        if path is None:
+            raise QueryError(404, f"Unknown history {name}")
+        stat = os.stat(path)
+        version = f"{stat.st_mtime_ns}-{stat.st_size}"
+        with self.lock:
+            if name in self.histories and self.histories[name][0] == version:
+                return self.histories[name]
+            try:
+                repo_history = parse_repo_history(path)
+            except (Exception, SystemExit):
+                # e.g. a file that is still being written
+                raise QueryError(500, f"History {name} can't be read")
+            if len(repo_history.get_columnar()) == 0:
+                raise QueryError(404, f"History {name} has no commits")
+            # sorts the commits by date, without grouping them
+            repo_history.preprocess_commits(True)
+            self.histories[name] = (version, repo_history)
+        self.cache.invalidate(name)
+        return self.histories[name]
+
+
+def parse_date(value: str, end_of_day=False) -> datetime.datetime:
+    """
+        Parses the ISO date `value` of a query, which can be `None` (see `parse_iso_date`)
+    """
+    try:
+        return parse_iso_date(value, end_of_day=end_of_day)
+    except ValueError:
+        raise QueryError(400, f"Invalid date {value}")
+
+
+def parse_query(query: str) -> map:
+    """
+        Parses the query string `query` of a series request, filling the missing parameters with
+        their default values, and checks it
+    """
+    parameters = {key: values[-1]
+                  for key, values in urllib.parse.parse_qs(query).items()}
+    if 'repo' not in parameters:
+        raise QueryError(400, "Missing `repo` parameter")
+    parsed = {
+        'repo': parameters['repo'],
+        'languages': tuple(parameters.get('languages', 'All').split(',')),
+        'field': parameters.get('field', 'code'),
+        'start': parse_date(parameters.get('start')),
+        'end': parse_date(parameters.get('end'), end_of_day=True),
+        'bucket': parameters.get('bucket', 'day'),
+        'aggregation': parameters.get('aggregation', 'last'),
+        'points': parameters.get('points', str(FLAGS.plot_points)),
+        'method': parameters.get('method', FLAGS.downsampling),
+    }
+    if parsed['field'] not in FIELDS:
+        raise QueryError(400, f"`field` must be one of {', '.join(FIELDS)}")
+    if parsed['bucket'] != NO_BUCKET and not is_valid_bucket(parsed['bucket']):
+        raise QueryError(400, f"`bucket` must be `{NO_BUCKET}`, `hour`, `day`, `week`, `month` or a number of commits")
+    if parsed['aggregation'] not in AGGREGATIONS:
+        raise QueryError(400, f"`aggregation` must be one of {', '.join(AGGREGATIONS)}")
+    if not parsed['points'].isdigit():
+        raise QueryError(400, "`points` must be a number")
+    parsed['points'] = int(parsed['points'])
+    if parsed['method'] not in METHODS:
+        raise QueryError(400, f"`method` must be one of {', '.join(METHODS)}")
+    return parsed
+
+
+class QueryEngine(object):
+    """
+        Answers the series queries over the histories of `store`, caching in `cache` the commits of each range
+        and bucket, and the answers, keyed by the query and the version of the history
+    """
+
+    def __init__(self, store: HistoryStore, cache: LRUCache):
+        self.store = store
+        self.cache = cache
+
+    def get_columnar(self, query: map) -> ColumnarHistory:
+        """
+            Returns the commits of the history of `query` in its date range, grouped in its bucket
+        """
+        version, repo_history = self.store.get(query['repo'])
+        key = (query['repo'], version, 'columnar', query['start'], query['end'],
+               query['bucket'], query['aggregation'])
+        columnar = self.cache.get(key)
+        if columnar is None:
+            columnar = repo_history.get_columnar().between(query['start'], query['end'])
+            if query['bucket'] != NO_BUCKET and len(columnar) > 0:
+                columnar = resample(columnar, query['bucket'], query['aggregation'])
+            self.cache.put(key, columnar)
+        return columnar
+
+    def get_cached(self, kind: str, query: map, compute: typing.Callable[[ColumnarHistory], bytes]) -> bytes:
+        """
+            Returns the answer `kind` of `query`, computing it from the commits of the query with `compute`
+            if it's not cached
+        """
+        version, _ = self.store.get(query['repo'])
+        key = (query['repo'], version, kind) + tuple(query[name] for name in sorted(query))
+        answer = self.cache.get(key)
+        if answer is None:
+            answer = compute(self.get_columnar(query))
+            self.cache.put(key, answer)
+        return answer
+
+    def get_series(self, query: map) -> bytes:
+        """
+            Returns the JSON with the dates, the measured flags and the values of each language of `query`,
+            downsampled to about `points` points (0 keeps all of them). The points are picked on the first
+            language, so that all the languages share the same dates
+        """
+        def compute(columnar: ColumnarHistory) -> bytes:
+            indexes = np.arange(len(columnar))
+            if len(columnar) > 0:
+                indexes = downsample(columnar.timestamps, columnar.get_series(query['languages'][0], field=query['field']),
+                                     query['points'], method=query['method'])
+            series = {language: columnar.get_series(language, field=query['field'])[indexes].tolist()
+                      for language in query['languages']}
+            return json.dumps({
+                'repo': query['repo'],
+                'field': query['field'],
+                'dates': [str(date) for date in columnar.timestamps[indexes]],
+                'measured': columnar.measured[indexes].tolist(),
+                'series': series,
+            }).encode('utf-8')
+        return self.get_cached('json', query, compute)
+
+    def get_image(self, query: map) -> bytes:
+        """
+            Returns the PNG image of the chart of `query`, drawn like `render_plot` does
+        """
+        def compute(columnar: ColumnarHistory) -> bytes:
+            figure = Figure(figsize=(12, 6))
+            draw_history(figure.add_subplot(), columnar.timestamps,
+                         [columnar.get_series(language, field=query['field'])
+                          for language in query['languages']],
+                         list(query['languages']), np.flatnonzero(columnar.measured),
+                         FIELD_LABELS[query['field']], points=query['points'], method=query['method'])
+            output = io.BytesIO()
+            figure.savefig(output, format='png')
+            return output.getvalue()
+        return self.get_cached('png', query, compute)
+
+    def get_repositories(self) -> bytes:
+        """
+            Returns the JSON with the name, the version, the languages and the dates of each history
+        """
+        repositories = []
+        for name in self.store.get_paths():
+            try:
+                version, repo_history = self.store.get(name)
+            except QueryError:
+                continue
+            repositories.append({
+                'repo': name,
+                'version': version,
+                'languages': repo_history.languages,
+                'initialDate': str(repo_history.initialDate),
+                'finalDate': str(repo_history.finalDate),
+            })
+        return json.dumps(repositories).encode('utf-8')
+
+
+def get_request_handler(engine: QueryEngine):
+    """
+        Returns the request handler class of the server, which answers with `engine`:
+
+        - `/repos`: the histories served
+        - `/series`: the series of a query, as JSON
+        - `/plot.png`: the chart of a query
+    """
+    class RequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            start = time.perf_counter()
+            url = urllib.parse.urlparse(self.path)
+            try:
+                if url.path == '/repos':
+                    self.send_answer(200, 'application/json', engine.get_repositories())
+                elif url.path == '/series':
+                    self.send_answer(200, 'application/json',
+                                     engine.get_series(parse_query(url.query)))
+                elif url.path == '/plot.png':
+                    self.send_answer(200, 'image/png',
+                                     engine.get_image(parse_query(url.query)))
+                else:
+                    raise QueryError(404, f"Unknown path {url.path}")
+            except QueryError as e:
+                self.send_answer(e.status, 'application/json',
+                                 json.dumps({'error': str(e)}).encode('utf-8'))
+            self.log_message('"%s" %.2f ms', self.path,
+                             (time.perf_counter() - start) * 1000)
+
+        def send_answer(self, status: int, content_type: str, body: bytes):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_request(self, code='-', size='-'):
+            # each request is logged once it's answered, with the time it took
+            pass
+
+    return RequestHandler
+
+
+def main(args):
+    if not os.path.exists(FLAGS.histories_dir):
+        print(f"Folder {FLAGS.histories_dir} doesn't exists")
+        exit(-1)
+    cache = LRUCache(max_entries=FLAGS.server_cache_size)
+    engine = QueryEngine(HistoryStore(FLAGS.histories_dir, cache), cache)
+    server = ThreadingHTTPServer((FLAGS.host, FLAGS.port),
+                                 get_request_handler(engine))
+    print(f"Serving the histories of {FLAGS.histories_dir} on http://{FLAGS.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    app.run(main)
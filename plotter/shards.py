@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import re
+import typing
+
+from .model.src.commit import Commit, parse_commit
+from .model.src.repo_history import RepoHistory
+
+SHARD_PATTERN = re.compile(r'^(\d+)/(\d+)$')
+
+
+def is_valid_shard(value: str) -> bool:
+    """
+        Checks if `value` is `None` or a shard `k/N`, with `1 <= k <= N`
+    """
+    if value is None:
+        return True
+    match = SHARD_PATTERN.match(value)
+    return match is not None and 1 <= int(match.group(1)) <= int(match.group(2))
+
+
+def parse_shard(value: str) -> typing.Tuple[int, int]:
+    """
+        Returns the `(index, count)` of the shard `k/N` in `value`, `1/1` if it's `None`
+    """
+    if value is None:
+        return (1, 1)
+    match = SHARD_PATTERN.match(value)
+    return (int(match.group(1)), int(match.group(2)))
+
+
+def is_valid_commit_range(value: str) -> bool:
+    """
+        Checks if `value` is `None` or a commit range `[start]..[end]`
+    """
+    return value is None or '..' in value
+
+
+def parse_commit_range(value: str) -> typing.Tuple[str, str]:
+    """
+        Returns the `(start, end)` revisions of the commit range `[start]..[end]` in `value`,
+        with `None` in place of the missing ones
+    """
+    start, _, end = value.partition('..')
+    return (start or None, end or None)
+
+
+def select_shard(lines: typing.List[str], index: int, count: int) -> typing.List[str]:
+    """
+        Returns the `git log` lines of `lines` that belong to the shard `index` of `count`
+
+        The commits are dealt to the shards in turn, so that every shard gets old and new commits
+        and they all take about the same time
+    """
+    return lines[index - 1::count]
+
+
+def get_history_digest(hashes: typing.List[str]) -> str:
+    """
+        Returns the digest of the commit hashes `hashes`, in `git log` order
+    """
+    return hashlib.sha1('\n'.join(hashes).encode('ascii')).hexdigest()
+
+
+def get_shard_file_name(metadata: map) -> str:
+    """
+        Returns the name of the file of the shard described by `metadata`
+    """
+    start = 'root' if metadata['start'] is None else metadata['start'][:12]
+    return f"shard-{start}-{metadata['end'][:12]}-{metadata['index']}-of-{metadata['count']}.json"
+
+
+def write_shard(commits: typing.List[Commit], lines: typing.List[str], start: str, end: str,
+                index: int, count: int, output_folder: str) -> str:
+    """
+        Writes to `output_folder` the partial history made of `commits`, the shard `index` of `count`
+        of the `git log` lines `lines` of the range between the commits `start` (`None` for the root
+        commit) and `end`
+
+        The file is a JSON history that can be read with `--input_file`, with an extra `shard` map
+        that describes the range, the shard and the position of each commit in `lines`, so that
+        `merge_shards` can verify that no commit is missing or duplicated. Returns its path
+    """
+    positions = {Commit(line).commitHash: position for position,
+                 line in enumerate(lines)}
+    data = RepoHistory(commits).as_map()
+    data['shard'] = {
+        'start': start,
+        'end': end,
+        'index': index,
+        'count': count,
+        'total': len(lines),
+        'digest': get_history_digest([Commit(line).commitHash for line in lines]),
+        'positions': [positions[commit.commitHash] for commit in commits],
+    }
+    path = os.path.join(output_folder, get_shard_file_name(data['shard']))
+    # the file appears only when it's complete, since `output_folder` may be read by `merge_shards` meanwhile
+    with open(f"{path}.partial", 'w') as f:
+        json.dump(data, f)
+    os.replace(f"{path}.partial", path)
+    return path
+
+
+def read_shards(folder: str) -> typing.List[map]:
+    """
+        Reads all the shards written by `write_shard` in `folder`
+    """
+    shards = []
+    for name in sorted(os.listdir(folder)):
+        if not name.startswith('shard-') or not name.endswith('.json'):
+            continue
+        with open(os.path.join(folder, name), 'r') as f:
+            data = json.load(f)
+        if 'shard' in data:
+            data['file'] = name
+            shards.append(data)
+    return shards
+
+
+def verify_range(shards: typing.List[map]) -> typing.List[str]:
+    """
+        Checks that `shards`, which have the same range, are all the shards of the range and that
+        together they contain each of its commits exactly once
+
+        Returns the problems found
+    """
+    first = shards[0]['shard']
+    name = f"{first['start'] or 'root'}..{first['end']}"
+    problems = []
+    if any(shard['shard']['count'] != first['count'] or shard['shard']['total'] != first['total']
+           or shard['shard']['digest'] != first['digest'] for shard in shards):
+        problems.append(f"the shards of {name} don't come from the same history or split it differently")
+        return problems
+
+    indexes = [shard['shard']['index'] for shard in shards]
+    for index in range(1, first['count'] + 1):
+        if indexes.count(index) == 0:
+            problems.append(f"shard {index}/{first['count']} of {name} is missing")
+        elif indexes.count(index) > 1:
+            problems.append(f"shard {index}/{first['count']} of {name} is present more than once")
+
+    hashes = [None] * first['total']
+    for shard in shards:
+        for position, commit in zip(shard['shard']['positions'], shard['commits']):
+            if hashes[position] is not None:
+                problems.append(f"commit {commit['hash']} of {name} is duplicated")
+            hashes[position] = commit['hash']
+    missing = hashes.count(None)
+    if missing > 0:
+        problems.append(f"{missing} commits of {name} are missing")
+    elif get_history_digest(hashes) != first['digest']:
+        problems.append(f"the commits of {name} don't match the history they were taken from")
+    return problems
+
+
+def sort_ranges(ranges: typing.Dict[typing.Tuple[str, str], typing.List[map]]) -> typing.Tuple[typing.List[typing.Tuple[str, str]], typing.List[str]]:
+    """
+        Orders the `(start, end)` keys of `ranges` from the one that starts at the root commit,
+        checking that each range starts where the previous one ends
+
+        Returns the ordered keys and the problems found
+    """
+    by_start = {}
+    for start, end in ranges:
+        by_start.setdefault(start, []).append((start, end))
+    problems = [f"more than one range starts at {start or 'the root commit'}"
+                for start in by_start if len(by_start[start]) > 1]
+    if len(problems) > 0:
+        return ([], problems)
+
+    ordered = []
+    start = None
+    while start in by_start and by_start[start][0] not in ordered:
+        ordered.append(by_start[start][0])
+        start = by_start[start][0][1]
+    for key in ranges:
+        if key not in ordered:
+            problems.append(f"no range ends at {key[0]}, the commits before the range "
+                            f"{key[0]}..{key[1]} are missing")
+    return (ordered, problems)
+
+
+def merge_shards(shards: typing.List[map]) -> typing.Tuple[RepoHistory, typing.List[str]]:
+    """
+        Merges the partial histories `shards` (see `read_shards`) into a single `RepoHistory`,
+        with the commits ordered by date
+
+        Returns the history and the problems found: the missing shards, the missing or duplicated
+        commits and the gaps between the ranges. The history is `None` if there is any problem
+    """
+    if len(shards) == 0:
+        return (None, ["there are no shards"])
+    ranges = {}
+    for shard in shards:
+        ranges.setdefault(
+            (shard['shard']['start'], shard['shard']['end']), []).append(shard)
+
+    ordered, problems = sort_ranges(ranges)
+    for key in ranges:
+        problems += verify_range(ranges[key])
+    seen = set()
+    for key in ordered:
+        # the commits duplicated inside a range are reported by `verify_range`
+        hashes = set(commit['hash'] for shard in ranges[key] for commit in shard['commits'])
+        for commit_hash in sorted(hashes & seen):
+            problems.append(f"commit {commit_hash} is in more than one range")
+        seen |= hashes
+    if len(problems) > 0:
+        return (None, problems)
+
+    commits = []
+    for key in ordered:
+        # `git log` prints the newest commits first
+        items = sorted(((position, commit) for shard in ranges[key]
+                        for position, commit in zip(shard['shard']['positions'], shard['commits'])),
+                       key=lambda item: item[0], reverse=True)
+        commits += [parse_commit(commit) for _, commit in items]
+    commits.sort(key=lambda commit: commit.date)
+    return (RepoHistory(commits), [])
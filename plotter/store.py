@@ -0,0 +1,181 @@
+import contextlib
+import datetime
+import fcntl
+import json
+import os
+import threading
+import typing
+
+from .model.src.commit import Commit, parse_commit
+
+
+class JsonLinesWriter(object):
+    """
+        Writes one JSON object per line to the file `path`
+
+        Every line is flushed as soon as it's written and the file is synced to disk every
+        `fsync_every` lines, so a crash loses at most the last line, which is left truncated.
+        If `append` is `False` the file is emptied first
+    """
+
+    def __init__(self, path: str, append=True, fsync_every=100):
+        folder = os.path.dirname(path)
+        if folder != '' and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.file = open(path, 'ab' if append else 'wb')
+        self.fsync_every = fsync_every
+        self.unsynced = 0
+        self.offset = 0
+        self.seek_end()
+
+    def seek_end(self):
+        """
+            Moves to the end of the file, which may have been extended by another writer
+        """
+        end = self.file.seek(0, os.SEEK_END)
+        changed = end != self.offset
+        self.offset = end
+        if changed and end > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset - 1)
+                truncated = f.read(1) != b'\n'
+            if truncated:
+                # keeps a truncated last line from being merged with the next one
+                self.write_line(b'')
+
+    def write_line(self, line: bytes) -> int:
+        offset = self.offset
+        self.file.write(line + b'\n')
+        self.file.flush()
+        self.offset += len(line) + 1
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+        return offset
+
+    def write(self, data: map) -> int:
+        """
+            Appends `data` to the file
+
+            Returns the offset of the line in the file
+        """
+        return self.write_line(json.dumps(data).encode('utf-8'))
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+def read_json_lines(path: str, start=0, end: int = None) -> typing.Iterator[typing.Tuple[int, map]]:
+    """
+        Reads a file written by `JsonLinesWriter`, yielding the offset and the content of each line
+        from the offset `start` to the offset `end` (the end of the file by default)
+
+        Empty lines and lines that can't be parsed (like the truncated line left by a crash) are skipped
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        offset = f.seek(start)
+        for line in f:
+            if end is not None and offset >= end:
+                break
+            line_offset = offset
+            offset += len(line)
+            if len(line.strip()) == 0:
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                continue
+            yield (line_offset, data)
+
+
+class CommitStore(object):
+    """
+        Remembers the data calculated for each commit, keyed by the commit hash
+
+        The commits are appended to a JSON Lines file as soon as they are calculated, so an
+        interrupted run can be resumed and a later run only has to calculate the new commits.
+        Only the position of each commit in the file is kept in memory, the commit is read back
+        when it's requested.
+
+        Several processes (like the shards of a repository, or the entries of a batch that share it)
+        can use the same store: the file is locked while a commit is appended, and the commits
+        appended meanwhile by the other processes are read first, so the offsets stay right and
+        each commit is stored once
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.offsets = {}
+        self.scanned = 0
+        self.writer = JsonLinesWriter(path)
+        self.reader = open(path, 'rb')
+        with self.lock:
+            with self.file_lock():
+                self.read_new_lines()
+
+    @contextlib.contextmanager
+    def file_lock(self):
+        """
+            Holds the exclusive lock of the file, shared with the other processes using the store
+        """
+        fcntl.flock(self.writer.file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.writer.file.fileno(), fcntl.LOCK_UN)
+
+    def read_new_lines(self):
+        """
+            Reads the commits appended to the file since it was last read, with the file locked
+        """
+        self.writer.seek_end()
+        for offset, data in read_json_lines(self.path, start=self.scanned, end=self.writer.offset):
+            self.offsets[data['hash']] = offset
+        self.scanned = self.writer.offset
+
+    def __contains__(self, commit_hash: str) -> bool:
+        return commit_hash in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get(self, commit_hash: str, date: datetime.datetime = None) -> Commit:
+        """
+            Returns the stored commit with hash `commit_hash`, or `None` if it's not stored
+
+            If `date` is defined it replaces the stored date, so that the commits stored by older
+            versions, which printed the dates differently, get the date `git log` prints now
+        """
+        if commit_hash not in self.offsets:
+            return None
+        with self.lock:
+            self.reader.seek(self.offsets[commit_hash])
+            line = self.reader.readline()
+        commit = parse_commit(json.loads(line))
+        if date is not None:
+            commit.__set_date__(date)
+        return commit
+
+    def add(self, commit: Commit):
+        """
+            Appends `commit` to the store
+        """
+        with self.lock:
+            with self.file_lock():
+                self.read_new_lines()
+                if commit.commitHash not in self.offsets:
+                    self.offsets[commit.commitHash] = self.writer.write(
+                        commit.as_map())
+                self.scanned = self.writer.offset
+
+    def close(self):
+        with self.lock:
+            self.writer.close()
+            self.reader.close()
@@ -1,9 +1,18 @@
+import functools
+import io
 import json
+import os
+import shutil
 import subprocess
+import tarfile
+import tempfile
 import typing
 
+from .git_reader import get_git_reader
+from .languages import count_lines, get_language
 from .model.src.aggregated import AggregatedData
 from .model.src.filedata import FileData
+from .profiler import PROFILER
 
 
 def get_cloc_data(folder: str) -> typing.Tuple[typing.List[FileData], AggregatedData]:
@@ -35,19 +44,45 @@ def get_cloc_data(folder: str) -> typing.Tuple[typing.List[FileData], Aggregated
     return (data, aggregated)
 
 
-def get_cloc_data_from_commit(commit_id: str) -> typing.Tuple[typing.List[FileData], AggregatedData]:
+def get_cloc_data_from_commit(commit_id: str, scratch_dir: str = None, cache=None, counter=None) -> typing.Tuple[typing.List[FileData], AggregatedData]:
     """
         Get the data of `folder` using the `cloc` utility
 
+        If `scratch_dir` is defined, `cloc` will extract the commit's tree inside it instead of
+        using the system's temporary directory, so that parallel calls don't share the same folder
+
+        If `cache` (a `BlobCache` object) is defined, the files of the commit are looked up in it
+        and only the ones that are missing are counted by `cloc`. The files with the same content are
+        counted once, like `cloc` does (see `get_unique_files_data`)
+
+        `counter` is the backend that counts the lines (see `get_counter`), `cloc` by default
+
         Returns the list of languages contained in the repository
     """
-    p = subprocess.Popen(['cloc', commit_id, '--json'],
-                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output_lines = p.stdout.readlines()
-    output = ""
-    for line in output_lines:
-        output += line.decode('utf-8')
+    if counter is None:
+        counter = ClocCounter()
+    if cache is not None or not isinstance(counter, ClocCounter):
+        tree_files = get_tree_files(commit_id)
+        files = get_cloc_data_from_blobs(
+            commit_id, tree_files, cache=cache, scratch_dir=scratch_dir, counter=counter)
+        return aggregate_files_data(get_unique_files_data(tree_files, files))
+
+    env = None
+    if scratch_dir is not None:
+        env = dict(os.environ, TMPDIR=scratch_dir)
+    with PROFILER.stage('cloc'):
+        p = subprocess.Popen(['cloc', commit_id, '--json'],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+        output, _ = p.communicate()
+    return parse_cloc_output(output)
+
+
+def parse_cloc_output(output: bytes) -> typing.Tuple[typing.List[FileData], AggregatedData]:
+    """
+        Parses the JSON printed by `cloc --json` for a whole folder or commit
 
+        Returns the same tuple of `get_cloc_data_from_commit`
+    """
     if len(output) == 0:
         return ([], AggregatedData({
             'blank': 0,
@@ -55,7 +90,8 @@ def get_cloc_data_from_commit(commit_id: str) -> typing.Tuple[typing.List[FileDa
             'code': 0,
             'nFiles': 0,
         }))
-    output = json.loads(output)
+    with PROFILER.stage('cloc_json'):
+        output = json.loads(output)
 
     languages = [lang for lang in output if lang != 'header']
     data = []
@@ -68,6 +104,260 @@ def get_cloc_data_from_commit(commit_id: str) -> typing.Tuple[typing.List[FileDa
     return (data, aggregated)
 
 
+def get_cloc_data_from_files(commit_id: str, paths: typing.List[str], scratch_dir: str = None) -> typing.Dict[str, map]:
+    """
+        Get the data of the files `paths` as they are in `commit_id` using the `cloc` utility
+
+        The files are extracted with `git archive` in a temporary folder created inside `scratch_dir`
+
+        Returns a map that has the path of each file recognized by `cloc` as key and a map with its
+        `language`, `blank`, `comment` and `code` fields as value
+    """
+    files = {}
+    if len(paths) == 0:
+        return files
+    folder = tempfile.mkdtemp(prefix='repo_plotter_files_', dir=scratch_dir)
+    try:
+        # the paths are passed to `git archive` in chunks to avoid exceeding the arguments' limit
+        for index in range(0, len(paths), 500):
+            with PROFILER.stage('git_archive'):
+                p = subprocess.Popen(['git', '--literal-pathspecs', 'archive', '--format=tar', commit_id, '--'] + paths[index:index + 500],
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                archive, _ = p.communicate()
+                with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+                    tar.extractall(folder)
+
+        with PROFILER.stage('cloc', files=len(paths)):
+            p = subprocess.Popen(['cloc', folder, '--by-file', '--skip-uniqueness', '--json'],
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            output, _ = p.communicate()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    if len(output) == 0:
+        return files
+    with PROFILER.stage('cloc_json'):
+        output = json.loads(output.decode('utf-8'))
+    for name in output:
+        if name in ['header', 'SUM']:
+            continue
+        files[os.path.relpath(name, folder)] = output[name]
+    return files
+
+
+def get_cloc_data_from_blobs(commit_id: str, files: typing.List[typing.Tuple[str, str]], cache=None, scratch_dir: str = None, counter=None) -> typing.Dict[str, map]:
+    """
+        Get the data of the `(path, blob)` pairs in `files` as they are in `commit_id`
+
+        If `cache` is defined, the pairs are first looked up in it using the blob hash and the
+        name of the file, then only the missing ones are counted by `counter` (`cloc` by default)
+        once for each blob and added to the cache
+
+        Returns a map with the same shape of `get_cloc_data_from_files`
+    """
+    if counter is None:
+        counter = ClocCounter()
+    keys = {}
+    for path, blob in files:
+        keys[path] = (blob, os.path.basename(path))
+
+    known = {}
+    if cache is not None:
+        with PROFILER.stage('cache_lookup'):
+            known = cache.get_many(list(set(keys.values())))
+
+    to_count = {}
+    for path in keys:
+        if keys[path] not in known and keys[path] not in to_count:
+            to_count[keys[path]] = path
+
+    if len(to_count) > 0:
+        with PROFILER.stage('count_files', files=len(to_count)):
+            counted = counter.count_files(
+                commit_id, [(to_count[key], key[0]) for key in to_count], scratch_dir=scratch_dir)
+        counted_keys = {key: counted.get(to_count[key]) for key in to_count}
+        if cache is not None:
+            with PROFILER.stage('cache_store'):
+                cache.put_many(counted_keys)
+        known.update(counted_keys)
+
+    return {path: known[keys[path]] for path in keys if known[keys[path]] is not None}
+
+
+def get_unique_files_data(files: typing.Iterable[typing.Tuple[str, str]], data: typing.Dict[str, map]) -> typing.List[map]:
+    """
+        Returns the data in `data` (keyed by path, like `get_cloc_data_from_blobs` returns it) of the
+        `(path, blob)` pairs in `files`, taking only the first of the files with the same blob
+
+        `cloc` counts the files with the same content only once, unless `--skip-uniqueness` is passed,
+        so the copies of a file (e.g. in a vendored folder) don't change the totals
+    """
+    seen = set()
+    unique = []
+    for path, blob in files:
+        if path in data and blob not in seen:
+            seen.add(blob)
+            unique.append(data[path])
+    return unique
+
+
+def aggregate_files_data(files: typing.Iterable[map]) -> typing.Tuple[typing.List[FileData], AggregatedData]:
+    """
+        Sums the data of single files (with the shape returned by `get_cloc_data_from_files`)
+        by language
+
+        Returns the same values of `get_cloc_data_from_commit`
+    """
+    languages = {}
+    for item in files:
+        if item['language'] not in languages:
+            languages[item['language']] = {
+                'nFiles': 0, 'blank': 0, 'comment': 0, 'code': 0}
+        totals = languages[item['language']]
+        totals['nFiles'] += 1
+        for field in ['blank', 'comment', 'code']:
+            totals[field] += item[field]
+
+    aggregated = AggregatedData(
+        {'blank': 0, 'comment': 0, 'code': 0, 'nFiles': 0})
+    data = []
+    for lang in languages:
+        data.append(FileData(languages[lang], lang=lang))
+        aggregated.add(AggregatedData(languages[lang]))
+    return (data, aggregated)
+
+
+@functools.lru_cache(maxsize=None)
+def get_cloc_version() -> str:
+    """
+        Returns the version of the installed `cloc` utility (e.g. `cloc-1.90`), used to
+        key the cached data
+    """
+    p = subprocess.Popen(['cloc', '--version'],
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, _ = p.communicate()
+    return f"cloc-{output.decode('utf-8').strip()}"
+
+
+def read_blobs(blobs: typing.List[str]) -> typing.Dict[str, bytes]:
+    """
+        Reads the content of the git objects `blobs` through the `git cat-file --batch` process
+        of the current thread (see `get_git_reader`)
+
+        Returns a map that has the hash of each blob as key and its content as value
+    """
+    with PROFILER.stage('read_blobs'):
+        return get_git_reader().read_blobs(blobs)
+
+
+class ClocCounter(object):
+    """
+        Counts the lines of the files with the `cloc` utility
+    """
+
+    def get_version(self) -> str:
+        return get_cloc_version()
+
+    def count_files(self, commit_id: str, files: typing.List[typing.Tuple[str, str]], scratch_dir: str = None) -> typing.Dict[str, map]:
+        """
+            Counts the `(path, blob)` pairs in `files` as they are in `commit_id`
+
+            Returns a map with the same shape of `get_cloc_data_from_files`
+        """
+        return get_cloc_data_from_files(commit_id, [path for path, _ in files], scratch_dir=scratch_dir)
+
+
+class NativeCounter(object):
+    """
+        Counts the lines of the files without spawning `cloc`, reading their content straight from git
+
+        The language is picked from the name of the file (see `plotter.languages`), the files of
+        unknown languages and the binary files are ignored
+    """
+
+    # must be increased at every change that modifies the results, since it's part of the cache keys
+    VERSION = 1
+
+    def get_version(self) -> str:
+        return f"native-{NativeCounter.VERSION}"
+
+    def count_files(self, commit_id: str, files: typing.List[typing.Tuple[str, str]], scratch_dir: str = None) -> typing.Dict[str, map]:
+        """
+            Counts the `(path, blob)` pairs in `files`
+
+            Returns a map with the same shape of `get_cloc_data_from_files`
+        """
+        languages = {path: get_language(path) for path, _ in files}
+        contents = read_blobs(
+            [blob for path, blob in files if languages[path] is not None])
+
+        counted = {}
+        for path, blob in files:
+            if languages[path] is None or blob not in contents:
+                continue
+            content = contents[blob]
+            if b'\0' in content[:8000]:
+                continue
+            blank, comment, code = count_lines(
+                content.decode('utf-8', errors='replace'), languages[path])
+            counted[path] = {
+                'language': languages[path].name,
+                'blank': blank,
+                'comment': comment,
+                'code': code,
+            }
+        return counted
+
+
+COUNTERS = {
+    'cloc': ClocCounter,
+    'native': NativeCounter,
+}
+
+
+def get_counter(name: str):
+    """
+        Returns the counter backend called `name`, one of the keys of `COUNTERS`
+    """
+    return COUNTERS[name]()
+
+
+def get_tree_files(commit_id: str) -> typing.Tuple[typing.Tuple[str, str], ...]:
+    """
+        Gets all the files contained in `commit_id`, reading its trees through the
+        `git cat-file --batch` process of the current thread
+
+        Returns a tuple of `(path, blob)` tuples. Symbolic links and submodules are ignored
+    """
+    with PROFILER.stage('list_files'):
+        reader = get_git_reader()
+        return reader.list_files(reader.get_tree_hash(commit_id))
+
+
+def get_empty_tree_hash() -> str:
+    """
+        Returns the hash of the empty tree of the repository in the current directory
+    """
+    p = subprocess.Popen(['git', 'hash-object', '-t', 'tree', '--stdin'],
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, _ = p.communicate(b'')
+    return output.decode('utf-8').strip()
+
+
+def get_changed_files(old_commit_id: str, new_commit_id: str) -> typing.List[typing.Tuple[str, str, str]]:
+    """
+        Gets the files that changed between `old_commit_id` and `new_commit_id`, comparing their
+        trees through the `git cat-file --batch` process of the current thread
+
+        Returns a list of `(status, path, blob)` tuples, where `status` is `A`dded, `M`odified
+        or `D`eleted and `blob` is the new hash of the file (the old one if it was deleted).
+        Symbolic links and submodules are ignored, like `get_tree_files` does
+    """
+    with PROFILER.stage('diff_trees'):
+        reader = get_git_reader()
+        return reader.diff_trees(reader.get_tree_hash(old_commit_id), reader.get_tree_hash(new_commit_id))
+
+
 def flatten_list(items: list, asSet=False) -> list:
     flattened = []
     for item in items:
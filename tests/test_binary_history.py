@@ -0,0 +1,100 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+from plotter.model.src.binary_history import (HEADER, MAGIC, VERSION, is_binary_history,
+                                              read_binary_history, write_binary_history)
+from plotter.model.src.columnar import FIELDS, ColumnarHistory
+
+
+def get_history(commits: int) -> ColumnarHistory:
+    """
+        Builds a history of `commits` commits with 3 languages, where every third commit is not measured
+    """
+    random = np.random.default_rng(3)
+    timestamps = np.sort(random.integers(1_000_000_000, 1_700_000_000, size=commits)).astype('datetime64[s]')
+    hashes = np.array([f'{index:040x}'.encode('ascii') for index in range(commits)], dtype='S40')
+    counts = random.integers(0, 100_000, size=(commits, 3, len(FIELDS)), dtype=np.int32)
+    measured = np.arange(commits) % 3 != 0
+    return ColumnarHistory(timestamps, hashes, ['C', 'Go', 'Python'], counts, measured)
+
+
+class BinaryHistoryTest(unittest.TestCase):
+    """
+        Checks that `read_binary_history` gives back what `write_binary_history` wrote
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='repo_plotter_test_')
+        self.path = os.path.join(self.folder, 'history.rph')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def assert_same_history(self, expected: ColumnarHistory, actual: ColumnarHistory):
+        self.assertEqual(actual.languages, expected.languages)
+        self.assertEqual(actual.timestamps.dtype, np.dtype('datetime64[s]'))
+        np.testing.assert_array_equal(actual.timestamps, expected.timestamps)
+        np.testing.assert_array_equal(actual.hashes, expected.hashes)
+        np.testing.assert_array_equal(actual.counts, expected.counts)
+        self.assertEqual(actual.measured.dtype, np.dtype(bool))
+        np.testing.assert_array_equal(actual.measured, expected.measured)
+        self.assertEqual(actual.get_dates(), expected.get_dates())
+
+    def test_round_trip(self):
+        # an odd number of commits, so the measured flags need padding
+        history = get_history(101)
+        write_binary_history(self.path, history, {'repository': 'test', 'branch': None})
+
+        self.assertTrue(is_binary_history(self.path))
+        columnar, metadata = read_binary_history(self.path)
+        self.assertIsInstance(columnar.counts, np.memmap)
+        self.assert_same_history(history, columnar)
+        self.assertEqual(metadata['repository'], 'test')
+        self.assertIsNone(metadata['branch'])
+        self.assertEqual(metadata['fields'], FIELDS)
+
+    def test_empty_history(self):
+        history = get_history(0)
+        write_binary_history(self.path, history, {})
+
+        columnar, _ = read_binary_history(self.path)
+        self.assertEqual(len(columnar), 0)
+        self.assert_same_history(history, columnar)
+
+    def test_wrong_magic(self):
+        write_binary_history(self.path, get_history(5), {})
+        with open(self.path, 'r+b') as f:
+            f.write(b'NOTAHIST')
+
+        self.assertFalse(is_binary_history(self.path))
+        with self.assertRaisesRegex(Exception, 'is not a supported binary history'):
+            read_binary_history(self.path)
+
+    def test_wrong_version(self):
+        write_binary_history(self.path, get_history(5), {})
+        with open(self.path, 'r+b') as f:
+            f.seek(len(MAGIC))
+            f.write(struct.pack('<I', VERSION + 1))
+
+        # the magic is still right, but the reader doesn't know the format
+        self.assertTrue(is_binary_history(self.path))
+        with self.assertRaisesRegex(Exception, 'is not a supported binary history'):
+            read_binary_history(self.path)
+
+    def test_header_layout(self):
+        write_binary_history(self.path, get_history(7), {})
+        with open(self.path, 'rb') as f:
+            magic, version, commits, languages, hash_width, metadata_length = HEADER.unpack(
+                f.read(HEADER.size))
+        self.assertEqual((magic, version, commits, languages, hash_width), (MAGIC, VERSION, 7, 3, 40))
+        # the arrays start aligned to 8 bytes
+        self.assertEqual((HEADER.size + metadata_length) % 8, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
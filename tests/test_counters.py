@@ -0,0 +1,76 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from plotter.benchmark.generator import GENERATED_LANGUAGES, SyntheticRepository
+from plotter.git_reader import close_git_readers
+from plotter.languages import LANGUAGES
+from plotter.utilities import ClocCounter, NativeCounter, get_cloc_data_from_commit
+
+# the fixture repositories, generated again identically at every run
+FIXTURES = {
+    # every language that can be generated, with a few files each
+    'languages': SyntheticRepository(commits=5, files=len(GENERATED_LANGUAGES) * 3,
+                                     languages=len(GENERATED_LANGUAGES), lines=40, seed=1),
+    # a longer history, with files changed, added and deleted
+    'history': SyntheticRepository(commits=60, files=30, languages=5, lines=80, churn=0.2, seed=2),
+}
+NATIVE_LANGUAGES = set(language.name for language in LANGUAGES)
+
+
+def get_commits(folder: str) -> list:
+    output = subprocess.run(['git', 'rev-list', 'master'], cwd=folder, check=True,
+                            stdout=subprocess.PIPE).stdout
+    return output.decode('utf-8').split()
+
+
+@unittest.skipIf(shutil.which('cloc') is None, "`cloc` is not installed")
+class CounterConformanceTest(unittest.TestCase):
+    """
+        Checks that `NativeCounter` gives the same results of `ClocCounter` on the languages of
+        the native table, at several commits of the fixture repositories
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.working_dir = os.getcwd()
+        cls.folder = tempfile.mkdtemp(prefix='repo_plotter_test_')
+        for name, repository in FIXTURES.items():
+            repository.generate(os.path.join(cls.folder, name))
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.working_dir)
+        close_git_readers()
+        shutil.rmtree(cls.folder, ignore_errors=True)
+
+    def assert_same_data(self, commit_id: str):
+        cloc_data, cloc_aggregated = get_cloc_data_from_commit(commit_id, counter=ClocCounter())
+        native_data, native_aggregated = get_cloc_data_from_commit(commit_id, counter=NativeCounter())
+        cloc_languages = {data.lang: data for data in cloc_data if data.lang in NATIVE_LANGUAGES}
+        native_languages = {data.lang: data for data in native_data}
+
+        self.assertEqual(sorted(cloc_languages), sorted(native_languages))
+        for lang in cloc_languages:
+            for field in ['nFiles', 'blank', 'comment', 'code']:
+                self.assertEqual(cloc_languages[lang].get_field(field), native_languages[lang].get_field(field),
+                                 f"{field} of {lang} at {commit_id}")
+        if len(cloc_languages) == len(cloc_data):
+            # all the files counted by `cloc` are in the native table
+            self.assertEqual(cloc_aggregated.as_map(), native_aggregated.as_map())
+
+    def test_fixtures(self):
+        for name in FIXTURES:
+            with self.subTest(fixture=name):
+                os.chdir(os.path.join(self.folder, name))
+                commits = get_commits('.')
+                # the newest, the middle and the root commit
+                for commit_id in sorted(set([commits[0], commits[len(commits) // 2], commits[-1]])):
+                    self.assert_same_data(commit_id)
+                close_git_readers()
+
+
+if __name__ == '__main__':
+    unittest.main()
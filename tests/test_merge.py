@@ -0,0 +1,175 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from plotter.shards import get_history_digest, merge_shards, read_shards
+
+# the commits of the fixture history in `git log` order (newest first), with their dates:
+# the third one was rebased, so its date is older than the one of its parent
+HISTORY = [(str(index) * 40, datetime.datetime(2024, 1, 1) + datetime.timedelta(days=days))
+           for index, days in [(8, 20), (7, 15), (6, 1), (5, 10), (4, 8), (3, 6), (2, 4), (1, 2), (0, 0)]]
+HASHES = [commit_hash for commit_hash, _ in HISTORY]
+# the commits of the first range, from the root commit to `MIDDLE`, and of the second one, from `MIDDLE` to `END`
+MIDDLE = HASHES[3]
+END = HASHES[0]
+FIRST_RANGE = HISTORY[3:]
+SECOND_RANGE = HISTORY[:3]
+
+
+def get_commit_map(commit_hash: str, date: datetime.datetime) -> map:
+    """
+        Returns the map of a commit, as written by `Commit.as_map`, with 10 lines of Python per day
+    """
+    code = (date - datetime.datetime(2024, 1, 1)).days * 10
+    return {
+        'hash': commit_hash,
+        'date': f"{date.year}-{date.month}-{date.day}",
+        'time': f"{date.hour}:{date.minute}:{date.second}",
+        'aggregated': {'nFiles': 1, 'blank': 0, 'comment': 0, 'code': code},
+        'squashed_hashes': [],
+        'measured': True,
+        'fileData': [{'lang': 'Python', 'nFiles': 1, 'blank': 0, 'comment': 0, 'code': code}],
+    }
+
+
+class MergeShardsTest(unittest.TestCase):
+    """
+        Checks the merge of shards written by hand, and each problem that stops it
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='repo_plotter_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write_shard(self, commits: list, index: int, count: int, start: str = None, end=END,
+                    positions: list = None, digest: str = None, suffix=''):
+        """
+            Writes the shard `index` of `count` of the range `start..end`, made of `commits`, the `git log`
+            lines of the range. Only the commits of the shard are kept, unless `positions` picks them
+        """
+        if positions is None:
+            positions = list(range(len(commits)))[index - 1::count]
+        data = {
+            'initialDate': None,
+            'finalDate': None,
+            'preprocessed': False,
+            'commits': [get_commit_map(*commits[position]) for position in positions],
+            'shard': {
+                'start': start,
+                'end': end,
+                'index': index,
+                'count': count,
+                'total': len(commits),
+                'digest': digest or get_history_digest([commit_hash for commit_hash, _ in commits]),
+                'positions': positions,
+            },
+        }
+        name = f"shard-{(start or 'root')[:12]}-{end[:12]}-{index}-of-{count}{suffix}.json"
+        with open(os.path.join(self.folder, name), 'w') as f:
+            json.dump(data, f)
+
+    def merge(self):
+        return merge_shards(read_shards(self.folder))
+
+    def assert_problems(self, *expected: str):
+        history, problems = self.merge()
+        self.assertIsNone(history)
+        self.assertEqual(sorted(problems), sorted(expected))
+
+    def test_merge_ordered_by_date(self):
+        self.write_shard(FIRST_RANGE, 1, 2, end=MIDDLE)
+        self.write_shard(FIRST_RANGE, 2, 2, end=MIDDLE)
+        self.write_shard(SECOND_RANGE, 1, 1, start=MIDDLE)
+
+        history, problems = self.merge()
+        self.assertEqual(problems, [])
+        self.assertEqual([commit.commitHash for commit in history.commits],
+                         [commit_hash for commit_hash, _ in sorted(HISTORY, key=lambda commit: commit[1])])
+        self.assertEqual([commit.date for commit in history.commits], sorted(date for _, date in HISTORY))
+        self.assertEqual([commit.aggregated.code for commit in history.commits],
+                         [0, 10, 20, 40, 60, 80, 100, 150, 200])
+
+    def test_no_shards(self):
+        self.assert_problems("there are no shards")
+
+    def test_missing_shard(self):
+        self.write_shard(HISTORY, 1, 3)
+        self.write_shard(HISTORY, 3, 3)
+
+        self.assert_problems(f"shard 2/3 of root..{END} is missing",
+                             f"3 commits of root..{END} are missing")
+
+    def test_duplicated_shard(self):
+        self.write_shard(HISTORY, 1, 2)
+        self.write_shard(HISTORY, 1, 2, suffix='-copy')
+        self.write_shard(HISTORY, 2, 2)
+
+        self.assert_problems(f"shard 1/2 of root..{END} is present more than once",
+                             *[f"commit {commit_hash} of root..{END} is duplicated" for commit_hash in HASHES[::2]])
+
+    def test_missing_commit(self):
+        self.write_shard(HISTORY, 1, 2, positions=[0, 2, 4, 6])
+        self.write_shard(HISTORY, 2, 2)
+
+        self.assert_problems(f"1 commits of root..{END} are missing")
+
+    def test_duplicated_commit(self):
+        self.write_shard(HISTORY, 1, 2, positions=[0, 1, 2, 4, 6, 8])
+        self.write_shard(HISTORY, 2, 2)
+
+        self.assert_problems(f"commit {HASHES[1]} of root..{END} is duplicated")
+
+    def test_commit_in_two_ranges(self):
+        self.write_shard(FIRST_RANGE, 1, 1, end=MIDDLE)
+        # the second range also contains `MIDDLE`, the last commit of the first one
+        self.write_shard(HISTORY[:4], 1, 1, start=MIDDLE)
+
+        self.assert_problems(f"commit {MIDDLE} is in more than one range")
+
+    def test_different_histories(self):
+        self.write_shard(HISTORY, 1, 2)
+        # the other shard was taken after the branch was rewritten
+        self.write_shard(HISTORY, 2, 2, digest=get_history_digest(list(reversed(HASHES))))
+
+        self.assert_problems(f"the shards of root..{END} don't come from the same history or split it differently")
+
+    def test_different_splits(self):
+        self.write_shard(HISTORY, 1, 2)
+        self.write_shard(HISTORY, 2, 3)
+        self.write_shard(HISTORY, 3, 3)
+
+        self.assert_problems(f"the shards of root..{END} don't come from the same history or split it differently")
+
+    def test_commits_not_matching_the_history(self):
+        # the same commits, at the wrong positions
+        self.write_shard(HISTORY, 1, 2, positions=[0, 2, 4, 6, 8])
+        self.write_shard(HISTORY, 2, 2, positions=[1, 3, 5, 7])
+        with open(os.path.join(self.folder, f"shard-root-{END[:12]}-2-of-2.json"), 'r+') as f:
+            data = json.load(f)
+            data['shard']['positions'] = [3, 1, 5, 7]
+            f.seek(0)
+            json.dump(data, f)
+            f.truncate()
+
+        self.assert_problems(f"the commits of root..{END} don't match the history they were taken from")
+
+    def test_ranges_not_chained(self):
+        # the range from the root commit to `MIDDLE` is missing
+        self.write_shard(SECOND_RANGE, 1, 1, start=MIDDLE)
+
+        self.assert_problems(f"no range ends at {MIDDLE}, the commits before the range {MIDDLE}..{END} are missing")
+
+    def test_ranges_with_the_same_start(self):
+        self.write_shard(FIRST_RANGE, 1, 1, end=MIDDLE)
+        self.write_shard(HISTORY, 1, 1)
+
+        self.assert_problems("more than one range starts at the root commit")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+
+import numpy as np
+
+from plotter.model.src.columnar import FIELD_INDEX, ColumnarHistory
+from plotter.model.src.resample import get_bucket_keys, is_valid_bucket, resample
+
+# the commits of the fixture history: date, code of C, code of Python, measured
+COMMITS = [
+    ('2024-01-01T10:00:00', 1, 10, True),
+    ('2024-01-01T15:30:00', 3, 20, True),
+    ('2024-01-03T09:00:00', 3, 6, False),
+    ('2024-01-08T12:00:00', 5, 40, True),
+    ('2024-02-02T00:00:00', 5, 30, True),
+]
+
+
+def get_hash(index: int) -> bytes:
+    return str(index).encode('ascii') * 40
+
+
+def get_history() -> ColumnarHistory:
+    """
+        Builds the history of `COMMITS`, where the hash of each commit is its index repeated 40 times
+    """
+    counts = np.zeros((len(COMMITS), 2, len(FIELD_INDEX)), dtype=np.int32)
+    for index, (_, c_code, python_code, _) in enumerate(COMMITS):
+        counts[index, 0, FIELD_INDEX['code']] = c_code
+        counts[index, 1, FIELD_INDEX['code']] = python_code
+        counts[index, :, FIELD_INDEX['nFiles']] = 1
+    return ColumnarHistory(np.array([commit[0] for commit in COMMITS], dtype='datetime64[s]'),
+                           np.array([get_hash(index) for index in range(len(COMMITS))], dtype=np.bytes_),
+                           ['C', 'Python'], counts,
+                           np.array([commit[3] for commit in COMMITS], dtype=bool))
+
+
+class ResampleTest(unittest.TestCase):
+    """
+        Checks the buckets of `resample` and the aggregation of the commits in each of them
+    """
+
+    def test_valid_buckets(self):
+        for bucket in ['hour', 'day', 'week', 'month', '1', '25']:
+            self.assertTrue(is_valid_bucket(bucket), bucket)
+        for bucket in ['year', '0', '-3', '2.5', '']:
+            self.assertFalse(is_valid_bucket(bucket), bucket)
+
+    def test_bucket_starts(self):
+        timestamps = np.array(['2024-01-03T09:45:12', '2024-01-07T23:59:59', '2024-01-08T00:00:00',
+                               '1969-12-31T12:00:00'], dtype='datetime64[s]')
+        expected = {
+            'hour': ['2024-01-03T09', '2024-01-07T23', '2024-01-08T00', '1969-12-31T12'],
+            'day': ['2024-01-03', '2024-01-07', '2024-01-08', '1969-12-31'],
+            # the weeks start on monday, also before 1970
+            'week': ['2024-01-01', '2024-01-01', '2024-01-08', '1969-12-29'],
+            'month': ['2024-01', '2024-01', '2024-01', '1969-12'],
+        }
+        for bucket in expected:
+            with self.subTest(bucket=bucket):
+                keys = get_bucket_keys(timestamps, bucket)
+                self.assertEqual(keys.tolist(), np.array(expected[bucket], dtype=keys.dtype).tolist())
+
+    def test_time_buckets_fill_the_gaps(self):
+        resampled = resample(get_history(), bucket='day')
+
+        # one commit for each day from the first to the last one
+        self.assertEqual(len(resampled), 33)
+        self.assertEqual(resampled.timestamps[0], np.datetime64('2024-01-01T00:00:00'))
+        self.assertEqual(resampled.timestamps[-1], np.datetime64('2024-02-02T00:00:00'))
+        self.assertTrue(np.all(np.diff(resampled.timestamps) == np.timedelta64(1, 'D')))
+
+        python = resampled.get_series('Python')
+        # the last commit of the first day
+        self.assertEqual(python[0], 20)
+        self.assertEqual(resampled.hashes[0], get_hash(1))
+        self.assertTrue(resampled.measured[0])
+        # the second day has no commits, so it repeats the first one without being measured
+        self.assertEqual(python[1], 20)
+        self.assertEqual(resampled.hashes[1], get_hash(1))
+        self.assertFalse(resampled.measured[1])
+        # the only commit of the third day was interpolated
+        self.assertEqual(python[2], 6)
+        self.assertFalse(resampled.measured[2])
+        self.assertEqual(python[7], 40)
+        self.assertTrue(resampled.measured[7])
+        self.assertEqual(python[8:32].tolist(), [40] * 24)
+        self.assertFalse(np.any(resampled.measured[8:32]))
+        self.assertEqual(python[32], 30)
+        self.assertEqual(resampled.get_total()[32], 35)
+
+    def test_week_and_month_buckets(self):
+        weeks = resample(get_history(), bucket='week')
+        self.assertEqual(weeks.timestamps.astype('datetime64[D]').tolist(),
+                         np.arange('2024-01-01', '2024-02-02', 7, dtype='datetime64[D]').tolist())
+        self.assertEqual(weeks.get_series('Python').tolist(), [6, 40, 40, 40, 30])
+        self.assertEqual(weeks.measured.tolist(), [True, True, False, False, True])
+
+        months = resample(get_history(), bucket='month')
+        self.assertEqual(months.timestamps.tolist(),
+                         np.array(['2024-01-01', '2024-02-01'], dtype='datetime64[s]').tolist())
+        self.assertEqual(months.get_series('C').tolist(), [5, 5])
+        self.assertEqual(months.hashes.tolist(), [get_hash(3), get_hash(4)])
+
+    def test_commit_buckets(self):
+        resampled = resample(get_history(), bucket='2')
+
+        # groups of 2 consecutive commits, each one with the date and hash of its last commit
+        self.assertEqual(resampled.timestamps.tolist(),
+                         np.array([COMMITS[1][0], COMMITS[3][0], COMMITS[4][0]], dtype='datetime64[s]').tolist())
+        self.assertEqual(resampled.hashes.tolist(), [get_hash(1), get_hash(3), get_hash(4)])
+        # a group is measured if any of its commits is
+        self.assertEqual(resampled.measured.tolist(), [True, True, True])
+        self.assertEqual(resampled.get_series('C', 'nFiles').tolist(), [1, 1, 1])
+
+    def test_aggregations(self):
+        expected = {
+            'last': ([3, 5, 5], [20, 40, 30]),
+            'max': ([3, 5, 5], [20, 40, 30]),
+            'min': ([1, 3, 5], [10, 6, 30]),
+            'mean': ([2, 4, 5], [15, 23, 30]),
+        }
+        for aggregation, (c_code, python_code) in expected.items():
+            with self.subTest(aggregation=aggregation):
+                resampled = resample(get_history(), bucket='2', aggregation=aggregation)
+                self.assertEqual(resampled.get_series('C').tolist(), c_code)
+                self.assertEqual(resampled.get_series('Python').tolist(), python_code)
+                self.assertEqual(resampled.counts.dtype, np.int32)
+
+    def test_empty_history(self):
+        history = get_history().select(slice(0, 0))
+        self.assertEqual(len(resample(history, bucket='day')), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()